@@ -0,0 +1,494 @@
+#!/usr/bin/python3
+# coding: utf-8
+
+"""
+    Benchmarks for PyQueex.
+
+    Usage: python3 benchmark.py [--json FILE] [--repeats N] [floodfill] [backends] [hotpaths] [scaling]
+
+    - Compares the scanline flood-fill of the playfield with the former
+      flood-fill, that pushed every single cell.
+    - Compares the playfield backends ("list", "numpy" and "bitboard")
+      on filling an area and on the tests of the Opponent and the
+      LineRunners, that are done every frame.
+
+    Both are done on an empty and on heavily fragmented boards, at the
+    normal size and at 10 times the normal size in both directions.
+
+    - Times the hot paths of the game several times each and prints
+      statistics: Building, filling, inverting and cleaning up the
+      playfield, repainting the playfield-sprite, the texts, and whole
+      frames of the game with different numbers of LineRunners, also
+      with hundreds of them in swarm mode.
+
+    - Shows, how the costs grow with the number of cells, from the normal
+      size up to 1600x1000: Capturing a small corner and half of the board,
+      erasing the Player's line, and whole frames of the game. Only
+      capturing half of the board and erasing the line (which gets longer
+      with the board) should grow.
+
+    All results are written to a JSON-file too, so that they can be
+    compared between versions.
+"""
+
+import os
+import sys
+import random
+import time
+import json
+import argparse
+import statistics
+import itertools
+
+# No window and no sound needed for the benchmarks:
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import pyqueex
+
+# The sounds and the joystick aren't needed either:
+pyqueex.SOUND = False
+pyqueex.JOYSTICKNUMBER = 0
+
+GRIDSIZES = ((160, 100), (1600, 1000))
+
+# Sizes for the hot paths. The game-window grows with them:
+HOTPATHSIZES = ((160, 100), (320, 200), (640, 400))
+LINERUNNERCOUNTS = (1, 6, 24)
+SWARMCOUNTS = (250, 1000)
+
+# Sizes for the scaling, drawn at one pixel per cell:
+SCALINGSIZES = ((160, 100), (400, 250), (800, 500), (1600, 1000))
+REPEATS = 20
+
+# All results, for the JSON-file:
+RESULTS = []
+
+BACKENDS = [("list", pyqueex.Playfield),
+            ("bitboard", pyqueex.BitboardPlayfield)]
+if pyqueex.importNumpy():
+    BACKENDS.insert(1, ("numpy", pyqueex.NumpyPlayfield))
+
+QUERIES = 1000
+
+def floodfillPerCell(playfield, coordinates, fromcolorname, tocolorname):
+    # The flood-fill of PyQueex 1.2, for comparison:
+    tofill = [coordinates]
+    while len(tofill) > 0:
+        (x, y) = tofill.pop()
+        if playfield.playfield[y][x] != pyqueex.COLORNRS[fromcolorname]:
+            continue
+        playfield.playfield[y][x] = pyqueex.COLORNRS[tocolorname]
+        tofill.append( (x - 1, y) )
+        tofill.append( (x + 1, y) )
+        tofill.append( (x, y - 1) )
+        tofill.append( (x, y + 1) )
+
+def getRows(playfield):
+    return [playfield.getRow(0, pyqueex.SCREENSIZE_X - 1, y) for y in range(pyqueex.SCREENSIZE_Y)]
+
+# The boards are built as lists of rows and loaded into the playfields:
+
+def makeEmptyBoard():
+    return getRows(pyqueex.Playfield())
+
+def makeCombBoard():
+    # Vertical walls on every second column, open alternately at the
+    # top and at the bottom. That makes one long snake of single cells:
+    rows = makeEmptyBoard()
+    for x in range(2, pyqueex.SCREENSIZE_X - 2, 2):
+        if x % 4 == 0:
+            ys = range(1, pyqueex.SCREENSIZE_Y - 2)
+        else:
+            ys = range(2, pyqueex.SCREENSIZE_Y - 1)
+        for y in ys:
+            rows[y][x] = pyqueex.COLORNRS["white"]
+    return rows
+
+def makeHalfBoard():
+    # A line, the Player has just drawn from the top to the bottom.
+    # Filling cuts off the right half:
+    rows = makeEmptyBoard()
+    for y in range(1, pyqueex.SCREENSIZE_Y - 1):
+        rows[y][pyqueex.SCREENSIZE_X // 2] = pyqueex.COLORNRS["magenta"]
+    return rows
+
+def makeNoiseBoard():
+    # About a third of the cells are walls, scattered randomly:
+    rows = makeEmptyBoard()
+    r = random.Random(1)
+    for y in range(2, pyqueex.SCREENSIZE_Y - 1):
+        for x in range(1, pyqueex.SCREENSIZE_X - 1):
+            if r.random() < 0.33:
+                rows[y][x] = pyqueex.COLORNRS["white"]
+    return rows
+
+BOARDS = (("empty", makeEmptyBoard),
+          ("comb",  makeCombBoard),
+          ("noise", makeNoiseBoard))
+
+FILLBOARDS = BOARDS + (("half", makeHalfBoard),)
+
+def makeTrailBoard():
+    # A long magenta line, zigzagging down the board, and its Trail:
+    rows = makeEmptyBoard()
+    trail = pyqueex.Trail()
+    x = 1
+    for y in range(1, pyqueex.SCREENSIZE_Y - 1):
+        for i in range(4):
+            rows[y][x] = pyqueex.COLORNRS["magenta"]
+            trail.add(x, y)
+            x = (x + 1) % (pyqueex.SCREENSIZE_X - 2) + 1
+    return (rows, trail)
+
+def makeCaptureBoard(cells):
+    # The Player's line through the cells, and its Trail:
+    rows = makeEmptyBoard()
+    trail = pyqueex.Trail()
+    for (x, y) in cells:
+        rows[y][x] = pyqueex.COLORNRS["magenta"]
+        trail.add(x, y)
+    return (rows, trail)
+
+def makeCornerCapture():
+    # Cuts off 40 x 25 cells in the upper left corner:
+    cells = [(40, y) for y in range(1, 26)]
+    cells += [(x, 25) for x in range(39, 0, -1)]
+    return makeCaptureBoard(cells)
+
+def makeHalfCapture():
+    cells = [(pyqueex.SCREENSIZE_X // 2, y) for y in range(1, pyqueex.SCREENSIZE_Y - 1)]
+    return makeCaptureBoard(cells)
+
+def runCapture(playfield, opponentposition, trail, parts):
+    # The whole capture, also the parts of it, that are done in the next
+    # frames. The time of the longest part goes into "parts":
+    times = [timeIt(lambda: playfield.fillArea(opponentposition, trail))]
+    while playfield.capture is not None:
+        times.append(timeIt(playfield.continueCapture))
+    parts.append(max(times))
+
+def timeIt(function):
+    starttime = time.perf_counter()
+    function()
+    return time.perf_counter() - starttime
+
+def getSizeName(size):
+    if size is None:
+        return "-"
+    return str(size[0]) + "x" + str(size[1])
+
+def measure(function, setup = None, repeats = REPEATS):
+    # Times "function" "repeats" times. "setup" runs untimed before each:
+    times = []
+    for i in range(repeats):
+        if setup:
+            setup()
+        times.append(timeIt(function))
+    return times
+
+def getStatistics(times):
+    # In milliseconds:
+    times = [i * 1000 for i in times]
+    stdev = 0.
+    if len(times) > 1:
+        stdev = statistics.stdev(times)
+    return {"runs"   : len(times),
+            "min"    : min(times),
+            "median" : statistics.median(times),
+            "mean"   : statistics.mean(times),
+            "max"    : max(times),
+            "stdev"  : stdev}
+
+def addResult(benchmark, name, size, times, **parameters):
+    result = {"benchmark"  : benchmark,
+              "name"       : name,
+              "size"       : getSizeName(size),
+              "parameters" : parameters,
+              "ms"         : getStatistics(times)}
+    RESULTS.append(result)
+    return result
+
+def benchmarkFloodfill():
+    print("Flood-fill (seconds):")
+    print("{0:>11}  {1:<6} {2:>10} {3:>10} {4:>8}".format("size", "board", "per cell", "scanline", "speedup"))
+    for size in GRIDSIZES:
+        pyqueex.setGridSize(*size)
+        playfield = pyqueex.Playfield()
+        for (boardname, makeboard) in BOARDS:
+            board = makeboard()
+            playfield.loadRows(board)
+            oldtime = timeIt(lambda: floodfillPerCell(playfield, (1, 1), "black", "grey"))
+            oldresult = getRows(playfield)
+            playfield.loadRows(board)
+            newtime = timeIt(lambda: playfield.floodfillPlayfield((1, 1), "black", "grey"))
+            if oldresult != getRows(playfield):
+                print("Error: Different results on board '" + boardname + "'.")
+            print("{0:>11}  {1:<6} {2:>10.4f} {3:>10.4f} {4:>7.1f}x".format(getSizeName(size), boardname,
+                                                                    oldtime, newtime, oldtime / newtime))
+            addResult("floodfill", "per cell", size, [oldtime], board = boardname)
+            addResult("floodfill", "scanline", size, [newtime], board = boardname)
+    print()
+
+def runOpponentQueries(playfield, positions):
+    # Like Opponent.collision_playfield():
+    walls = playfield.walldistances
+    for (x, y) in positions:
+        walls.isColumnFree(x, y, pyqueex.OPPONENTSIZE_Y)
+        walls.isRowFree(x, y, pyqueex.OPPONENTSIZE_X)
+
+def runLineRunnerQueries(playfield, positions):
+    linecolors = (pyqueex.COLORNRS["white"], pyqueex.COLORNRS["magenta"])
+    for (x, y) in positions:
+        playfield.getNeighbourDirections(x, y, linecolors)
+
+def benchmarkBackends():
+    print("Playfield backends (milliseconds; queries: " + str(QUERIES) + " calls):")
+    print("{0:>11}  {1:<6} {2:<9} {3:>10} {4:>13} {5:>13}".format("size", "board", "backend",
+                                                                  "fillArea", "edge queries", "neighbours"))
+    for size in GRIDSIZES:
+        pyqueex.setGridSize(*size)
+        r = random.Random(2)
+        positions = []
+        for i in range(QUERIES):
+            positions.append( (r.randrange(1, size[0] - pyqueex.OPPONENTSIZE_X),
+                               r.randrange(1, size[1] - pyqueex.OPPONENTSIZE_Y)) )
+        for (boardname, makeboard) in BOARDS:
+            board = makeboard()
+            results = []
+            for (backendname, backend) in BACKENDS:
+                playfield = backend()
+                playfield.loadRows(board)
+                filltime = timeIt(lambda: playfield.fillArea((1, 1)))
+                results.append(getRows(playfield))
+                edgetime = timeIt(lambda: runOpponentQueries(playfield, positions))
+                neighbourtime = timeIt(lambda: runLineRunnerQueries(playfield, positions))
+                print("{0:>11}  {1:<6} {2:<9} {3:>10.2f} {4:>13.2f} {5:>13.2f}".format(getSizeName(size),
+                        boardname, backendname, filltime * 1000, edgetime * 1000, neighbourtime * 1000))
+                addResult("backends", "fillArea", size, [filltime], board = boardname, backend = backendname)
+                addResult("backends", "edge queries", size, [edgetime], board = boardname, backend = backendname)
+                addResult("backends", "neighbours", size, [neighbourtime], board = boardname, backend = backendname)
+            for i in results[1:]:
+                if i != results[0]:
+                    print("Error: Different results of the backends on board '" + boardname + "'.")
+    print()
+
+def printHotPath(result):
+    parameters = " ".join([str(i) for i in result["parameters"].values()])
+    ms = result["ms"]
+    print("{0:<24} {1:>9}  {2:<16} {3:>9.3f} {4:>9.3f} {5:>9.3f} {6:>9.3f}".format(result["name"],
+            result["size"], parameters, ms["median"], ms["min"], ms["max"], ms["stdev"]))
+
+def benchmarkPlayfield(size, repeats):
+    for (backendname, backend) in BACKENDS:
+        playfield = backend()
+        printHotPath(addResult("hotpaths", "initPlayfield", size,
+                               measure(playfield.initPlayfield, repeats = repeats),
+                               backend = backendname))
+        for (boardname, makeboard) in FILLBOARDS:
+            board = makeboard()
+            printHotPath(addResult("hotpaths", "fillArea", size,
+                                   measure(lambda: playfield.fillArea((1, 1)),
+                                           lambda: playfield.loadRows(board), repeats),
+                                   backend = backendname, board = boardname))
+        board = makeNoiseBoard()
+        def floodfill():
+            playfield.loadRows(board)
+            playfield.floodfillPlayfield((1, 1), "black", "grey")
+        printHotPath(addResult("hotpaths", "inversePlayfield", size,
+                               measure(playfield.inversePlayfield, floodfill, repeats),
+                               backend = backendname, board = "noise"))
+        (board, trail) = makeTrailBoard()
+        printHotPath(addResult("hotpaths", "deleteMagenta (trail)", size,
+                               measure(lambda: playfield.deleteMagentaInPlayfield(trail),
+                                       lambda: playfield.loadRows(board), repeats),
+                               backend = backendname))
+        printHotPath(addResult("hotpaths", "deleteMagenta (scan)", size,
+                               measure(playfield.deleteMagentaInPlayfield,
+                                       lambda: playfield.loadRows(board), repeats),
+                               backend = backendname))
+
+def benchmarkPlayfieldSprite(size, repeats):
+    # At the window's resolution, and with NATIVERESOLUTION (--native-resolution):
+    nativeresolution = pyqueex.NATIVERESOLUTION
+    for resolution in ("window", "native"):
+        pyqueex.NATIVERESOLUTION = resolution == "native"
+        playfield = pyqueex.Playfield()
+        sprite = pyqueex.PlayfieldSprite(None, playfield)
+        def repaint(regions = None):
+            # With NATIVERESOLUTION, scaling to the window is part of it:
+            sprite.updatePlayfieldSprite(regions)
+            sprite.scaleImage()
+        for (boardname, makeboard) in (("comb", makeCombBoard), ("noise", makeNoiseBoard)):
+            playfield.loadRows(makeboard())
+            printHotPath(addResult("hotpaths", "updatePlayfieldSprite", size,
+                                   measure(repaint, repeats = repeats),
+                                   board = boardname, regions = "all", resolution = resolution))
+        # Only the regions changed by filling half of the board:
+        board = makeHalfBoard()
+        regions = []
+        def fill():
+            playfield.loadRows(board)
+            playfield.fillArea((1, 1))
+            regions[:] = playfield.popDirtyRegions()
+        printHotPath(addResult("hotpaths", "updatePlayfieldSprite", size,
+                               measure(lambda: repaint(regions), fill, repeats),
+                               board = "half", regions = "dirty", resolution = resolution))
+    pyqueex.NATIVERESOLUTION = nativeresolution
+
+def benchmarkTexts(repeats):
+    # Texts are drawn, when their image is used, so the image is taken too:
+    text = pyqueex.Text("Level 999", "cyan", 65, 10, 3)
+    levels = itertools.count(1)
+    def setText():
+        text.setText("Level " + str(next(levels)))
+        return text.image
+    printHotPath(addResult("hotpaths", "Text.setText", None,
+                           measure(setText, repeats = repeats)))
+    printHotPath(addResult("hotpaths", "MultilineText", None,
+                           measure(lambda: pyqueex.MultilineText(("The evil green-rectangle-mutant",
+                                                                  "wants to kill you, his creator!",
+                                                                  "Try to wall it in, before it gets you,",
+                                                                  "or you'll be chicken feed!"),
+                                                                 16, "green", 25, 30, 2).image, repeats = repeats)))
+
+def benchmarkGameFrames(size, repeats):
+    # With full redraws, and with DIRTYRENDERING (--dirty-rendering):
+    dirtyrendering = pyqueex.DIRTYRENDERING
+    for rendering in ("full", "dirty"):
+        pyqueex.DIRTYRENDERING = rendering == "dirty"
+        game = pyqueex.Game()
+        for linerunners in LINERUNNERCOUNTS:
+            game.reset(1)
+            while len(game.linerunners) < linerunners:
+                game.level += 1
+                game.addLineRunner()
+            game.linerunners.initPositions()
+            def keepPlaying():
+                # Frames of the running level. The Player can't lose:
+                game.state = "level"
+                game.player.lives = 99
+                game.clocktick = 1000 // pyqueex.FPS
+            printHotPath(addResult("hotpaths", "Game frame", size,
+                                   measure(game.frame, keepPlaying, repeats * 10),
+                                   linerunners = linerunners, rendering = rendering))
+    # In swarm mode, with many more LineRunners:
+    for count in SWARMCOUNTS:
+        pyqueex.LINERUNNERSWARM = count
+        game = pyqueex.Game()
+        game.reset(1)
+        def keepPlaying():
+            game.state = "level"
+            game.player.lives = 99
+            game.clocktick = 1000 // pyqueex.FPS
+        printHotPath(addResult("hotpaths", "Game frame (swarm)", size,
+                               measure(game.frame, keepPlaying, repeats * 10),
+                               linerunners = count, rendering = "dirty"))
+    pyqueex.LINERUNNERSWARM = 0
+    pyqueex.DIRTYRENDERING = dirtyrendering
+
+def benchmarkHotPaths(repeats):
+    print("Hot paths (milliseconds; " + str(repeats) + " runs, Game frames " + str(repeats * 10) + " runs):")
+    print("{0:<24} {1:>9}  {2:<16} {3:>9} {4:>9} {5:>9} {6:>9}".format("name", "size", "parameters",
+                                                                        "median", "min", "max", "stdev"))
+    pyqueex.pygame.init()
+    for size in HOTPATHSIZES:
+        pyqueex.setGridSize(*size)
+        pyqueex.pygame.display.set_mode(((size[0] + 2 * pyqueex.BORDER_X) * pyqueex.SCALEFACTOR,
+                                         (size[1] + 2 * pyqueex.BORDER_Y) * pyqueex.SCALEFACTOR))
+        # The texts don't depend on the size. They need a display though:
+        if size == HOTPATHSIZES[0]:
+            benchmarkTexts(repeats)
+        benchmarkPlayfield(size, repeats)
+        benchmarkPlayfieldSprite(size, repeats)
+        benchmarkGameFrames(size, repeats)
+    print()
+
+def benchmarkScaling(repeats):
+    print("Scaling (milliseconds, median of " + str(repeats) + " runs; Game frames with 6 LineRunners;")
+    print("the captures as a whole, and the longest frame of the half one):")
+    print("{0:>11} {1:>9}  {2:<9} {3:>9} {4:>9} {5:>9} {6:>9} {7:>9}".format("size", "cells", "backend",
+                                                                           "corner", "half", "part", "erase", "frame"))
+    pyqueex.pygame.init()
+    scalefactor = pyqueex.SCALEFACTOR
+    backend = pyqueex.PLAYFIELDBACKEND
+    dirtyrendering = pyqueex.DIRTYRENDERING
+    nativeresolution = pyqueex.NATIVERESOLUTION
+    pyqueex.SCALEFACTOR = 1
+    # The Game frames are drawn, as with --dirty-rendering --native-resolution:
+    pyqueex.DIRTYRENDERING = True
+    pyqueex.NATIVERESOLUTION = True
+    for size in SCALINGSIZES:
+        pyqueex.setGridSize(*size)
+        pyqueex.pygame.display.set_mode((size[0] + 2 * pyqueex.BORDER_X, size[1] + 2 * pyqueex.BORDER_Y))
+        # The opponent is put into the lower right part of the board:
+        opponentposition = (size[0] * 3 // 4, size[1] * 3 // 4)
+        for (backendname, backendclass) in BACKENDS:
+            pyqueex.PLAYFIELDBACKEND = backendname
+            playfield = backendclass()
+            results = []
+            for (name, makecapture) in (("corner", makeCornerCapture), ("half", makeHalfCapture)):
+                (board, trail) = makecapture()
+                parts = []
+                times = measure(lambda: runCapture(playfield, opponentposition, trail, parts),
+                                lambda: playfield.loadRows(board), repeats)
+                results.append(addResult("scaling", "capture " + name, size, times, backend = backendname))
+            results.append(addResult("scaling", "capture half part", size, parts, backend = backendname))
+            (board, trail) = makeTrailBoard()
+            results.append(addResult("scaling", "erase", size,
+                                     measure(lambda: playfield.deleteMagentaInPlayfield(trail),
+                                             lambda: playfield.loadRows(board), repeats),
+                                     backend = backendname))
+            game = pyqueex.Game()
+            game.reset(1)
+            while len(game.linerunners) < 6:
+                game.level += 1
+                game.addLineRunner()
+            game.linerunners.initPositions()
+            def keepPlaying():
+                game.state = "level"
+                game.player.lives = 99
+                game.clocktick = 1000 // pyqueex.FPS
+            results.append(addResult("scaling", "Game frame", size,
+                                     measure(game.frame, keepPlaying, repeats * 10),
+                                     backend = backendname))
+            print("{0:>11} {1:>9}  {2:<9} {3:>9.3f} {4:>9.3f} {5:>9.3f} {6:>9.3f} {7:>9.3f}".format(getSizeName(size),
+                    size[0] * size[1], backendname, *[i["ms"]["median"] for i in results]))
+    pyqueex.SCALEFACTOR = scalefactor
+    pyqueex.PLAYFIELDBACKEND = backend
+    pyqueex.DIRTYRENDERING = dirtyrendering
+    pyqueex.NATIVERESOLUTION = nativeresolution
+    print()
+
+def writeJSON(filename):
+    data = {"python"  : sys.version.split()[0],
+            "pygame"  : pyqueex.pygame.version.ver,
+            "numpy"   : pyqueex.numpy.__version__ if pyqueex.numpy is not None else None,
+            "results" : RESULTS}
+    with open(filename, "w") as fh:
+        json.dump(data, fh, indent = 1)
+    print("Results written to '" + filename + "'.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks for PyQueex.")
+    parser.add_argument("--json", metavar = "FILE", default = "benchmark.json",
+                        help = "write the results to FILE (default: benchmark.json)")
+    parser.add_argument("--repeats", metavar = "N", type = int, default = REPEATS,
+                        help = "runs of each hot path (default: " + str(REPEATS) + ")")
+    benchmarknames = ("floodfill", "backends", "hotpaths", "scaling")
+    parser.add_argument("benchmarks", nargs = "*", default = benchmarknames,
+                        help = "the benchmarks to run: " + ", ".join(benchmarknames) + " (default: all)")
+    args = parser.parse_args()
+    benchmarks = args.benchmarks
+    for i in benchmarks:
+        if i not in benchmarknames:
+            parser.error("unknown benchmark '" + i + "' (choose from " + ", ".join(benchmarknames) + ")")
+    if "floodfill" in benchmarks:
+        benchmarkFloodfill()
+    if "backends" in benchmarks:
+        benchmarkBackends()
+    if "hotpaths" in benchmarks:
+        benchmarkHotPaths(args.repeats)
+    if "scaling" in benchmarks:
+        benchmarkScaling(args.repeats)
+    writeJSON(args.json)
@@ -1,9 +1,26 @@
 #!/usr/bin/python3
 # coding: utf-8
 
+import time
+# For --startup-profile:
+STARTTIME = time.perf_counter()
+
 import pygame
 import random
 import os
+import itertools
+import bisect
+import argparse
+import collections
+import threading
+import struct
+import heapq
+import array
+import zlib
+
+# NumPy is only needed for the "numpy" playfield. Importing it takes longer than
+# starting the game, so it is imported by importNumpy(), when it's needed:
+numpy = None
 
 """
     PyQueex 1.2 - Clone of an ancient arcade game.
@@ -29,12 +46,22 @@ import os
 #####################################
 # Config:
 
+# The size of the playfield in cells, and of a cell in pixels. Can be
+# changed with setGridSize() or on the command line (see --help):
 SCREENSIZE_X      = 160
 SCREENSIZE_Y      = 100
 BORDER_X          = 10
 BORDER_Y          = 5
 SCALEFACTOR       = 5
 
+# The size of the "large board" (--large):
+LARGESIZE_X       = 1600
+LARGESIZE_Y       = 1000
+LARGESCALEFACTOR  = 1
+
+# Texts are placed in cells of this many pixels (at the normal size):
+TEXTLAYOUTSCALE   = 5
+
 SOUND             = True
 
 WINDOWPOSITION_X  = 185
@@ -45,6 +72,31 @@ JOYSTICKNUMBER    = 1
 
 FPS               = 60
 
+# In fixed-timestep mode, the game advances in ticks of exactly TICKLENGTH
+# milliseconds, however long a frame really took. So the game runs the same
+# on every computer. If the computer is too slow, at most MAXTICKSPERFRAME
+# ticks are caught up in one frame, the others are dropped:
+FIXEDTIMESTEP     = False
+TICKLENGTH        = 1000 / FPS
+MAXTICKSPERFRAME  = 4
+
+# In multi-rate mode, the keys are read and the game is advanced
+# SIMULATIONRATE times per second in ticks of the same length, and the window
+# is drawn RENDERRATE times per second, independently of each other. If the
+# drawing falls behind, frames are skipped. If the simulation falls behind,
+# at most MAXTICKSPERFRAME ticks are caught up at once, the others are
+# dropped. Not while recording or replaying a session:
+MULTIRATE         = False
+SIMULATIONRATE    = 120
+RENDERRATE        = 60
+
+# Seconds of the game, that can be gone back by holding Backspace (0 = off).
+# Not while recording or replaying a session:
+REWINDSECONDS     = 10
+
+# Seed of the random numbers of a game. None = a different seed every time:
+RANDOMSEED        = None
+
 WINNINGPERCENTAGE = 80
 
 GETREADYTIME      = 180
@@ -60,12 +112,45 @@ LINERUNNERSSPEED  = 0.05
 OPPONENTSIZE_X    = 28
 OPPONENTSIZE_Y    = 13
 OPPONENTCOLOR     = "green"
+# Cells the Opponent may move in one frame at most (for high speeds):
+OPPONENTMAXSTEPS  = 1
 
-# Up to 8:
 LINERUNNERSMAX    = 6
 
+# Number of LineRunners in swarm mode, instead of one more in each of the
+# first levels (0 = no swarm). The swarm keeps them in arrays and draws them
+# all at once, so that hundreds of them are possible:
+LINERUNNERSWARM   = 0
+
+# Size of the buckets of the spatial hash, in which the LineRunners are
+# looked up for collisions, in cells. Must be at least the size of a
+# LineRunner (3 cells):
+BUCKETSIZE        = 8
+
 EXTRALIFELEVEL    = 3
 
+# Storage of the playfield. Can be "list", "numpy" (needs NumPy) or "bitboard":
+PLAYFIELDBACKEND  = "list"
+
+# Work, that a capture of the Player's line may do in one frame, in rows of
+# the normal width of 160 cells. Wider rows cost more (see getCaptureWork()).
+# On the normal playfield, captures are done in the frame of the line. On
+# larger ones, the large captures go on in the next frames:
+CAPTUREWORK       = 1000
+
+# Show the frame times at the start. Can always be toggled with F3:
+PERFORMANCEHUD    = False
+
+# Draw only the parts of the window, that have changed, and update only these
+# (instead of redrawing and flipping the whole window every frame). Can be
+# switched on with --dirty-rendering:
+DIRTYRENDERING    = False
+
+# Draw the playfield with one pixel per cell, and scale the changed part of it
+# to the window once per frame (instead of drawing every cell SCALEFACTOR
+# times SCALEFACTOR pixels large). Can be switched on with --native-resolution:
+NATIVERESOLUTION  = False
+
 COLORS = {"black"         : (0, 0, 0),
           "blue"          : (0, 0, 197),
           "magenta"       : (192, 0, 192),
@@ -84,87 +169,1351 @@ COLORNRS = {}
 for i in COLORNAMES:
     COLORNRS[i] = COLORNAMES.index(i)
 
+def setGridSize(width, height, scalefactor = None):
+    """ Sets the size of the playfield to width x height cells, and
+        optionally the size of a cell in pixels. Has to be called before
+        the Simulation or the Game is created. The Opponent keeps its size
+        in relation to the playfield. """
+    global SCREENSIZE_X, SCREENSIZE_Y, SCALEFACTOR, OPPONENTSIZE_X, OPPONENTSIZE_Y
+    OPPONENTSIZE_X = max(1, OPPONENTSIZE_X * width // SCREENSIZE_X)
+    OPPONENTSIZE_Y = max(1, OPPONENTSIZE_Y * height // SCREENSIZE_Y)
+    SCREENSIZE_X   = width
+    SCREENSIZE_Y   = height
+    if scalefactor is not None:
+        SCALEFACTOR = scalefactor
+
 #####################################
 # Playfield:
 
 class Playfield:
 
     def __init__(self):
+        self.walldistances = self.createWallDistances((COLORNRS["white"], COLORNRS["blue"]))
+        self.linegraph     = LineGraph(self, (COLORNRS["white"], COLORNRS["magenta"]))
         self.initPlayfield()
 
     def initPlayfield(self):
-        self.filled = 0
-        # Build empty playfield with a white frame:
-        self.playfield = []
+        # Build empty playfield with a white frame. The inner rows are copies
+        # of one row:
+        row = [COLORNRS["white"]] + [COLORNRS["black"]] * (SCREENSIZE_X - 2) + [COLORNRS["white"]]
+        self.playfield = [[COLORNRS["white"]] * SCREENSIZE_X]
+        for y in range(1, SCREENSIZE_Y - 1):
+            self.playfield.append(row[:])
+        self.playfield.append([COLORNRS["white"]] * SCREENSIZE_X)
+        self.initCounts()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.clear()
+        self.linegraph.clear()
+
+    def createWallDistances(self, wallcolornrs):
+        # Where the Opponent looks up the walls:
+        return WallDistances(self, wallcolornrs)
+
+    def initCounts(self):
+        # Number of cells of every color. Kept up to date by every function,
+        # that writes to the playfield, so that statistics like the filled
+        # percentage never need a pass over the whole board:
+        self.counts = [0] * len(COLORNAMES)
+        self.counts[COLORNRS["white"]] = 2 * SCREENSIZE_X + 2 * (SCREENSIZE_Y - 2)
+        self.counts[COLORNRS["black"]] = (SCREENSIZE_X - 2) * (SCREENSIZE_Y - 2)
+
+    def markDirty(self, x0, y0, x1, y1):
+        # Remembers a rectangle of cells (x0, y0) to (x1, y1) inclusive,
+        # that has changed and has to be repainted by the PlayfieldSprite:
+        self.dirtyregions.append( (x0, y0, x1, y1) )
+
+    def markDirtyColors(self, colornrs):
+        # Marks the bounding box of all cells of the given colors as dirty.
+        # The searching is done by the list-methods, row by row:
+        x0 = SCREENSIZE_X
+        x1 = -1
+        y0 = None
         for y in range(SCREENSIZE_Y):
-            row = []
-            for x in range(SCREENSIZE_X):
-                if y == 0 or y == SCREENSIZE_Y - 1:
-                    row.append(COLORNRS["white"])
-                else:
-                    if x == 0 or x == SCREENSIZE_X - 1:
-                        row.append(COLORNRS["white"])
-                    else:
-                        row.append(COLORNRS["black"])
-            self.playfield.append(row)
+            row = self.playfield[y]
+            for colornr in colornrs:
+                if colornr not in row:
+                    continue
+                if y0 is None:
+                    y0 = y
+                y1 = y
+                x0 = min(x0, row.index(colornr))
+                x1 = max(x1, SCREENSIZE_X - 1 - row[::-1].index(colornr))
+        if y0 is not None:
+            self.markDirty(x0, y0, x1, y1)
+
+    def popDirtyRegions(self):
+        regions = self.dirtyregions
+        self.dirtyregions = []
+        return regions
+
+    def getRow(self, x0, x1, y):
+        return self.playfield[y][x0 : x1 + 1]
+
+    def copyCells(self, cells, region = None):
+        # Copies the colornrs of the region (x0, y0, x1, y1), or of all
+        # cells, into "cells", a NumPy array of SCREENSIZE_Y x SCREENSIZE_X:
+        (x0, y0, x1, y1) = region or (0, 0, SCREENSIZE_X - 1, SCREENSIZE_Y - 1)
+        rows = [bytes(self.getRow(x0, x1, y)) for y in range(y0, y1 + 1)]
+        cells[y0 : y1 + 1, x0 : x1 + 1] = numpy.frombuffer(b"".join(rows), dtype = numpy.uint8).reshape(y1 - y0 + 1, x1 - x0 + 1)
+
+    def setCells(self, region, cells):
+        # Sets the colornrs of the region (x0, y0, x1, y1) to "cells", a
+        # bytestring of them row by row:
+        (x0, y0, x1, y1) = region
+        width = x1 - x0 + 1
+        for y in range(y0, y1 + 1):
+            row = bytearray(self.getRow(0, SCREENSIZE_X - 1, y))
+            old = row[x0 : x1 + 1]
+            new = cells[(y - y0) * width : (y - y0 + 1) * width]
+            for colornr in range(len(COLORNAMES)):
+                self.counts[colornr] += new.count(colornr) - old.count(colornr)
+            row[x0 : x1 + 1] = new
+            self.setRow(y, row)
+        self.walldistances.updateCells(x0, y0, x1, y1)
+        self.linegraph.clear()
+        self.markDirty(x0, y0, x1, y1)
+
+    def loadRows(self, rows):
+        # Replaces the whole playfield by the given list of rows of colornrs:
+        self.playfield = [list(row) for row in rows]
+        self.countCells()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.rebuild()
+        self.linegraph.clear()
+
+    def countCells(self):
+        self.counts = [0] * len(COLORNAMES)
+        for y in range(SCREENSIZE_Y):
+            row = self.getRow(0, SCREENSIZE_X - 1, y)
+            for colornr in range(len(COLORNAMES)):
+                self.counts[colornr] += row.count(colornr)
 
     def insertIntoPlayfield(self, line):
-        self.playfield[line.spos_y][line.spos_x] = COLORNRS[line.colorname]
+        self.setColorNr(line.spos_x, line.spos_y, COLORNRS[line.colorname])
+
+    def getColorNr(self, x, y):
+        return self.playfield[y][x]
+
+    def setColorNr(self, x, y, colornr):
+        oldcolornr = self.playfield[y][x]
+        self.playfield[y][x] = colornr
+        self.cellChanged(x, y, oldcolornr, colornr)
+
+    def cellChanged(self, x, y, oldcolornr, colornr):
+        # Bookkeeping after a single cell has been set by setColorNr():
+        self.counts[oldcolornr] -= 1
+        self.counts[colornr] += 1
+        if self.walldistances.iswall[oldcolornr] != self.walldistances.iswall[colornr]:
+            self.walldistances.updateCells(x, y, x, y)
+        if self.linegraph.isline[oldcolornr] != self.linegraph.isline[colornr]:
+            self.linegraph.cellChanged(x, y)
+
+    def getNeighbourDirections(self, x, y, colornrs):
+        # Directions to the neighbour cells, that have one of the colors:
+        d = []
+        if x > 0 and self.playfield[y][x - 1] in colornrs:
+            d.append("left")
+        if x < SCREENSIZE_X - 1 and self.playfield[y][x + 1] in colornrs:
+            d.append("right")
+        if y > 0 and self.playfield[y - 1][x] in colornrs:
+            d.append("up")
+        if y < SCREENSIZE_Y - 1 and self.playfield[y + 1][x] in colornrs:
+            d.append("down")
+        return d
 
-    def fillArea(self, opponentposition):
+    def fillArea(self, opponentposition, trail = None):
         """ To fill the wanted area, we use a flood-fill on the position,
             where the opponent is, then "inverse" the playfield, that is, fill
-            the opposite areas. Following a suggestion at forum64.de. """
+            the opposite areas. Following a suggestion at forum64.de.
+            If the Trail of the Player's line is given, only the areas, that
+            the line has cut off, are filled (see Capture). Large captures
+            are spread over several frames, continueCapture() goes on with
+            them, until "self.capture" is None again. """
+        if trail is not None:
+            self.capture = Capture(self, opponentposition, trail)
+            self.continueCapture()
+            return
+        regions = len(self.dirtyregions)
         self.floodfillPlayfield(opponentposition, "black", "grey")
         self.inversePlayfield()
+        # Walls have only been added in the regions, that have changed.
+        # The lines stay where they are (magenta just becomes white), so the
+        # LineGraph doesn't change:
+        for region in self.dirtyregions[regions:]:
+            self.walldistances.updateCells(*region)
+
+    def continueCapture(self):
+        # Does the next part of the capture:
+        if self.capture.run(getCaptureWork()):
+            self.capture = None
 
     def floodfillPlayfield(self, coordinates, fromcolorname, tocolorname):
-        tofill = [coordinates]
-        while len(tofill) > 0:
+        """ Scanline flood-fill: Instead of pushing every single cell,
+            whole horizontal runs ("spans") of cells are filled at once.
+            For the rows above and below a span, only the first cell
+            of every run, that still has to be filled, is remembered. """
+        fromcolornr = COLORNRS[fromcolorname]
+        tocolornr   = COLORNRS[tocolorname]
+        filled = self.floodfillRows(self.playfield, coordinates, fromcolornr, tocolornr)[0]
+        self.counts[fromcolornr] -= filled
+        self.counts[tocolornr]   += filled
+
+    def floodfillRows(self, playfield, coordinates, fromcolornr, tocolornr):
+        # Fills the lists of colornrs in "playfield". Returns the number
+        # of filled cells and the first and the last row, that was changed:
+        xmax        = SCREENSIZE_X - 1
+        ymax        = SCREENSIZE_Y - 1
+        tofill      = [coordinates]
+        # Local name, as this is the inner loop of the game:
+        push        = tofill.append
+        filled      = 0
+        y0          = ymax
+        y1          = 0
+        while tofill:
             (x, y) = tofill.pop()
-            if self.playfield[y][x] != COLORNRS[fromcolorname]:
+            row = playfield[y]
+            if row[x] != fromcolornr:
+                continue
+            y0 = min(y0, y)
+            y1 = max(y1, y)
+            x0 = x
+            while x0 > 0 and row[x0 - 1] == fromcolornr:
+                x0 -= 1
+            x1 = x
+            while x1 < xmax and row[x1 + 1] == fromcolornr:
+                x1 += 1
+            filled += x1 - x0 + 1
+            if x0 == x1:
+                row[x] = tocolornr
+                if y > 0 and playfield[y - 1][x] == fromcolornr:
+                    push( (x, y - 1) )
+                if y < ymax and playfield[y + 1][x] == fromcolornr:
+                    push( (x, y + 1) )
                 continue
-            self.playfield[y][x] = COLORNRS[tocolorname]
-            tofill.append( (x - 1, y) )
-            tofill.append( (x + 1, y) )
-            tofill.append( (x, y - 1) )
-            tofill.append( (x, y + 1) )
+            row[x0 : x1 + 1] = [tocolornr] * (x1 - x0 + 1)
+            for ny in (y - 1, y + 1):
+                if ny < 0 or ny > ymax:
+                    continue
+                nrow  = playfield[ny]
+                inrun = False
+                for i in range(x0, x1 + 1):
+                    if nrow[i] == fromcolornr:
+                        if not inrun:
+                            push( (i, ny) )
+                            inrun = True
+                    else:
+                        inrun = False
+        return (filled, y0, y1)
+
+    def setRow(self, y, row):
+        self.playfield[y] = list(row)
+
+    def getRowBits(self, y, colornr):
+        # The cells of the color in row y as the bits of an integer, cell
+        # (x, y) being bit x. The row is written as the characters "0" and
+        # "1", highest cell first:
+        table = bytearray(b"0" * 256)
+        table[colornr] = ord("1")
+        return int(bytes(self.playfield[y][::-1]).translate(table), 2)
+
+    def setRowBits(self, y, bits, oldcolornr, colornr):
+        # Sets the cells of the bits (all of them of "oldcolornr") to the
+        # color. The counts, the dirty regions and the WallDistances are
+        # left to the caller:
+        row = self.playfield[y]
+        for (x0, x1) in bitRuns(bits):
+            row[x0 : x1 + 1] = [colornr] * (x1 - x0 + 1)
 
     def inversePlayfield(self):
 
-        filled = 0
-        c = (COLORNRS["blue"], COLORNRS["white"])
+        # Visible are only the changes from black to blue and magenta to white:
+        self.markDirtyColors( (COLORNRS["black"], COLORNRS["magenta"]) )
 
         # Can't use a dictionary here, because the order is of importance:
         changes = (("black", "blue"),
                    ("magenta", "white"),
                    ("grey", "black"))
+        # The changes are done on every row at once, as a translation of bytes:
+        table = bytearray(range(256))
+        for i in changes:
+            table[COLORNRS[i[0]]] = COLORNRS[i[1]]
         for y in range(SCREENSIZE_Y):
-            for x in range(SCREENSIZE_X):
-                for i in changes:
-                    if self.playfield[y][x] == COLORNRS[i[0]]:
-                        self.playfield[y][x] = COLORNRS[i[1]]
-                if self.playfield[y][x] in c:
-                    filled += 1
-        self.filled = int(filled * 100. / (SCREENSIZE_X * SCREENSIZE_Y))
-
-    def deleteMagentaInPlayfield(self):
+            self.playfield[y] = list(bytes(self.playfield[y]).translate(table))
+        self.invertCounts()
+
+    def invertCounts(self):
+        c = self.counts
+        c[COLORNRS["blue"]]   += c[COLORNRS["black"]]
+        c[COLORNRS["white"]]  += c[COLORNRS["magenta"]]
+        c[COLORNRS["black"]]   = c[COLORNRS["grey"]]
+        c[COLORNRS["magenta"]] = 0
+        c[COLORNRS["grey"]]    = 0
+
+    def deleteMagentaInPlayfield(self, trail = None):
+        """ Turns the Player's magenta line back to black. If the Trail of
+            the line is given, only its cells are changed. Otherwise the whole
+            playfield is searched. """
+        if trail is None:
+            self.deleteAllMagenta()
+            return
+        for (x, y) in trail.cells:
+            if self.getColorNr(x, y) == COLORNRS["magenta"]:
+                self.setColorNr(x, y, COLORNRS["black"])
+        for region in trail.getRegions():
+            self.markDirty(*region)
+
+    def deleteAllMagenta(self):
+        self.linegraph.clear()
+        self.markDirtyColors( (COLORNRS["magenta"],) )
         for y in range(SCREENSIZE_Y):
             for x in range(SCREENSIZE_X):
                 if self.playfield[y][x] == COLORNRS["magenta"]:
                     self.playfield[y][x] = COLORNRS["black"]
+        self.counts[COLORNRS["black"]]  += self.counts[COLORNRS["magenta"]]
+        self.counts[COLORNRS["magenta"]] = 0
+
+    def getCount(self, colorname):
+        return self.counts[COLORNRS[colorname]]
 
     def getFilledPercentage(self):
-        return self.filled
+        filled = self.counts[COLORNRS["blue"]] + self.counts[COLORNRS["white"]]
+        return int(filled * 100. / (SCREENSIZE_X * SCREENSIZE_Y))
+
+
+class RowLists(dict):
+    """ The rows of a NumPy-array as lists by their row numbers. A row is
+        converted, when it is used for the first time. """
+
+    def __init__(self, cells):
+        dict.__init__(self)
+        self.cells = cells
+
+    def __missing__(self, y):
+        row = self[y] = self.cells[y].tolist()
+        return row
+
+
+class NumpyPlayfield(Playfield):
+    """ Same as Playfield, but the cells are stored in a NumPy uint8-array,
+        so that the passes over the whole board are done as array operations.
+        "self.playfield[y][x]" still works for the other classes. """
+
+    def __init__(self):
+        # Lookup-table for inversePlayfield(): Every colornr is mapped to itself,
+        # except the ones, that change:
+        self.inversetable = numpy.arange(len(COLORNAMES), dtype = numpy.uint8)
+        self.inversetable[COLORNRS["black"]]   = COLORNRS["blue"]
+        self.inversetable[COLORNRS["magenta"]] = COLORNRS["white"]
+        self.inversetable[COLORNRS["grey"]]    = COLORNRS["black"]
+        Playfield.__init__(self)
+
+    def initPlayfield(self):
+        self.playfield = numpy.full((SCREENSIZE_Y, SCREENSIZE_X), COLORNRS["black"], dtype = numpy.uint8)
+        self.playfield[0, :]  = COLORNRS["white"]
+        self.playfield[-1, :] = COLORNRS["white"]
+        self.playfield[:, 0]  = COLORNRS["white"]
+        self.playfield[:, -1] = COLORNRS["white"]
+        self.initCounts()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.clear()
+        self.linegraph.clear()
+
+    def markDirtyColors(self, colornrs):
+        mask = numpy.isin(self.playfield, colornrs)
+        rows = numpy.flatnonzero(mask.any(axis = 1))
+        if len(rows) == 0:
+            return
+        columns = numpy.flatnonzero(mask.any(axis = 0))
+        self.markDirty(int(columns[0]), int(rows[0]), int(columns[-1]), int(rows[-1]))
+
+    def getRow(self, x0, x1, y):
+        return self.playfield[y, x0 : x1 + 1].tolist()
+
+    def copyCells(self, cells, region = None):
+        (x0, y0, x1, y1) = region or (0, 0, SCREENSIZE_X - 1, SCREENSIZE_Y - 1)
+        cells[y0 : y1 + 1, x0 : x1 + 1] = self.playfield[y0 : y1 + 1, x0 : x1 + 1]
+
+    def loadRows(self, rows):
+        self.playfield = numpy.array(rows, dtype = numpy.uint8)
+        self.countCells()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.rebuild()
+        self.linegraph.clear()
+
+    def getColorNr(self, x, y):
+        return self.playfield[y, x]
+
+    def setColorNr(self, x, y, colornr):
+        oldcolornr = int(self.playfield[y, x])
+        self.playfield[y, x] = colornr
+        self.cellChanged(x, y, oldcolornr, colornr)
+
+    def floodfillPlayfield(self, coordinates, fromcolorname, tocolorname):
+        # Searching the spans with array operations costs more than it
+        # gains on boards with many short spans. So the scanline flood-fill
+        # of Playfield is done on copies of the rows as lists. Only the rows,
+        # that the fill comes to, are copied, and the changed ones are
+        # written back:
+        fromcolornr = COLORNRS[fromcolorname]
+        tocolornr   = COLORNRS[tocolorname]
+        rows = RowLists(self.playfield)
+        (filled, y0, y1) = self.floodfillRows(rows, coordinates, fromcolornr, tocolornr)
+        if filled > 0:
+            for (y, row) in rows.items():
+                if y0 <= y <= y1:
+                    self.playfield[y] = row
+        self.counts[fromcolornr] -= filled
+        self.counts[tocolornr]   += filled
+
+    def setRow(self, y, row):
+        self.playfield[y] = numpy.frombuffer(row, dtype = numpy.uint8)
+
+    def getRowBits(self, y, colornr):
+        return int.from_bytes(numpy.packbits(self.playfield[y] == colornr, bitorder = "little").tobytes(), "little")
+
+    def setRowBits(self, y, bits, oldcolornr, colornr):
+        cells = numpy.frombuffer(bits.to_bytes((SCREENSIZE_X + 7) // 8, "little"), dtype = numpy.uint8)
+        self.playfield[y][numpy.unpackbits(cells, count = SCREENSIZE_X, bitorder = "little").view(bool)] = colornr
+
+    def inversePlayfield(self):
+        self.markDirtyColors( (COLORNRS["black"], COLORNRS["magenta"]) )
+        self.playfield[:] = self.inversetable[self.playfield]
+        self.invertCounts()
+
+    def deleteAllMagenta(self):
+        self.linegraph.clear()
+        self.markDirtyColors( (COLORNRS["magenta"],) )
+        self.playfield[self.playfield == COLORNRS["magenta"]] = COLORNRS["black"]
+        self.counts[COLORNRS["black"]]  += self.counts[COLORNRS["magenta"]]
+        self.counts[COLORNRS["magenta"]] = 0
+
+
+class WallDistances:
+    """ Distances to the next wall for every cell of the Playfield:
+        "right[y][x]" is the number of cells without a wall from (x, y)
+        to the right, including (x, y) itself, "down[x][y]" the same
+        downwards. So a row of cells starting at (x, y) is free of walls,
+        if right[y][x] is at least its width. Only the rows and columns,
+        that have changed, are calculated again. """
+
+    def __init__(self, playfield, wallcolornrs):
+        self.playfield = playfield
+        self.iswall    = [False] * len(COLORNAMES)
+        for i in wallcolornrs:
+            self.iswall[i] = True
+        # Translates a bytestring of colornrs to 1 for a wall, else 0:
+        self.walltable = bytes(int(self.iswall[i]) if i < len(COLORNAMES) else 0 for i in range(256))
+
+    def clear(self):
+        # The distances of the empty playfield, a frame of walls, are made
+        # without reading its cells. The lines are arrays, so that they are
+        # copied at once:
+        self.countdown = array.array("i", range(max(SCREENSIZE_X, SCREENSIZE_Y), 0, -1))
+        self.right = self.getFramedLines(SCREENSIZE_X, SCREENSIZE_Y)
+        self.down  = self.getFramedLines(SCREENSIZE_Y, SCREENSIZE_X)
+
+    def getFramedLines(self, length, count):
+        # The first and the last line are walls, the others only at their ends:
+        wall  = array.array("i", [0])
+        walls = wall * length
+        inner = wall + self.countdown[len(self.countdown) - (length - 2) :] + wall
+        return [walls] + [inner[:] for i in range(count - 2)] + [walls[:]]
+
+    def rebuild(self):
+        # The runs of free cells are cut out of this array, so that the
+        # numbers don't have to be made again for every run:
+        self.countdown = array.array("i", range(max(SCREENSIZE_X, SCREENSIZE_Y), 0, -1))
+        rows = [bytes(self.playfield.getRow(0, SCREENSIZE_X - 1, y)) for y in range(SCREENSIZE_Y)]
+        self.right = [self.getRuns(row) for row in rows]
+        # The columns are every SCREENSIZE_X-th cell of all rows together:
+        cells = b"".join(rows)
+        self.down  = [self.getRuns(cells[x :: SCREENSIZE_X]) for x in range(SCREENSIZE_X)]
+
+    def getRuns(self, cells, following = 0):
+        # For a wall 0, else the number of cells up to the next wall.
+        # "following" free cells come after the last one. The runs of
+        # walls and of free cells are searched in a bytestring:
+        walls = bytes(cells).translate(self.walltable)
+        runs  = array.array("i")
+        start = 0
+        while start < len(walls):
+            iswall = walls[start]
+            end = walls.find(iswall ^ 1, start)
+            if end < 0:
+                end = len(walls)
+            if iswall:
+                runs.extend(array.array("i", [0]) * (end - start))
+            else:
+                last = following if end == len(walls) else 0
+                runs.extend(self.countdown[len(self.countdown) - (end - start) - last : len(self.countdown) - last])
+            start = end
+        return runs
+
+    def updateCells(self, x0, y0, x1, y1):
+        # Only the rectangle of cells has changed. So only its part of the
+        # rows is read again, and its columns are cut out of them:
+        rows = [bytes(self.playfield.getRow(x0, x1, y)) for y in range(y0, y1 + 1)]
+        for y in range(y0, y1 + 1):
+            self.updateDistances(self.right[y], x0, x1, rows[y - y0])
+        cells = b"".join(rows)
+        width = x1 - x0 + 1
+        for x in range(x0, x1 + 1):
+            self.updateDistances(self.down[x], y0, y1, cells[x - x0 :: width])
+
+    def updateDistances(self, distances, i0, i1, cells):
+        following = 0
+        if i1 + 1 < len(distances):
+            following = distances[i1 + 1]
+        runs = self.getRuns(cells, following)
+        distances[i0 : i1 + 1] = runs
+        # The free cells before i0 lead up to the changed cells. Towards
+        # their start, the distances go up by one per cell. So the start
+        # can be bisected:
+        last = i0 - 1
+        if last < 0 or distances[last] in (0, runs[0] + 1):
+            return
+        (start, end) = (0, last)
+        while start < end:
+            middle = (start + end) // 2
+            if distances[middle] == distances[last] + last - middle:
+                end = middle
+            else:
+                start = middle + 1
+        end = len(self.countdown) - runs[0]
+        distances[start : i0] = self.countdown[end - (i0 - start) : end]
+
+    def isRowFree(self, x, y, width):
+        return self.right[y][x] >= width
+
+    def isColumnFree(self, x, y, height):
+        return self.down[x][y] >= height
+
+
+class WallMasks:
+    """ The walls of a BitboardPlayfield, looked up like the WallDistances:
+        The BitboardPlayfield keeps the rows of the wall colors together
+        anyway (see getCombinedRowMasks()). So a row of cells is free of
+        walls, if its bits and the row of walls have none in common, and a
+        column, if none of the rows has its bit. Nothing has to be
+        calculated again, when cells change. """
+
+    def __init__(self, playfield, wallcolornrs):
+        self.playfield    = playfield
+        self.wallcolornrs = tuple(wallcolornrs)
+        self.iswall       = [False] * len(COLORNAMES)
+        for i in wallcolornrs:
+            self.iswall[i] = True
+
+    def clear(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def updateCells(self, x0, y0, x1, y1):
+        pass
+
+    def isRowFree(self, x, y, width):
+        rows = self.playfield.getCombinedRowMasks(self.wallcolornrs)
+        return not rows[y] & (((1 << width) - 1) << x)
+
+    def isColumnFree(self, x, y, height):
+        rows = self.playfield.getCombinedRowMasks(self.wallcolornrs)
+        bit  = 1 << x
+        for row in rows[y : y + height]:
+            if row & bit:
+                return False
+        return True
+
+
+class LineGraph:
+    """ Navigation graph of the lines (white and magenta cells), on which
+        the LineRunners walk. A segment leads from a cell in one direction
+        along the line up to the next cell, where a LineRunner has to decide
+        again: A junction, or a dead end. On the way, there's always exactly
+        one way to go on (without turning around).
+
+        A segment is stored as the list of its steps (x, y, direction).
+        Segments are searched, when they are needed for the first time,
+        and are forgotten, when one of their cells or a neighbour changes. """
+
+    def __init__(self, playfield, linecolornrs):
+        self.playfield    = playfield
+        self.linecolornrs = linecolornrs
+        self.isline       = [False] * len(COLORNAMES)
+        for i in linecolornrs:
+            self.isline[i] = True
+        self.backwards = {"left" : "right", "right" : "left",
+                          "up"   : "down",  "down"  : "up"}
+        self.moves     = {"left" : (-1, 0), "right" : (1, 0),
+                          "up"   : (0, -1), "down"  : (0, 1)}
+        self.clear()
+
+    def clear(self):
+        self.segments = {}
+        # The keys of the segments, that pass each cell:
+        self.cellsegments = {}
+
+    def getWays(self, x, y, direction):
+        # Directions to go on from (x, y), without turning around:
+        ways = []
+        for i in self.playfield.getNeighbourDirections(x, y, self.linecolornrs):
+            if self.backwards[i] != direction:
+                ways.append(i)
+        return ways
+
+    def getSegment(self, x, y, direction):
+        key = (x, y, direction)
+        if key not in self.segments:
+            steps = self.findSegment(x, y, direction)
+            self.segments[key] = steps
+            for i in steps:
+                cell = (i[0], i[1])
+                if cell not in self.cellsegments:
+                    self.cellsegments[cell] = set()
+                self.cellsegments[cell].add(key)
+        return self.segments[key]
+
+    def findSegment(self, x, y, direction):
+        start = (x, y)
+        steps = []
+        # A closed line without junctions (like the frame of an empty
+        # playfield) ends, where it started:
+        while len(steps) < SCREENSIZE_X * SCREENSIZE_Y:
+            x += self.moves[direction][0]
+            y += self.moves[direction][1]
+            steps.append( (x, y, direction) )
+            if (x, y) == start:
+                break
+            ways = self.getWays(x, y, direction)
+            if len(ways) != 1:
+                break
+            direction = ways[0]
+        return steps
+
+    def cellChanged(self, x, y):
+        # A changed cell also changes the ways of its neighbours:
+        for cell in ((x, y), (x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if cell not in self.cellsegments:
+                continue
+            for key in self.cellsegments.pop(cell):
+                self.removeSegment(key)
+
+    def removeSegment(self, key):
+        if key not in self.segments:
+            return
+        for i in self.segments.pop(key):
+            cell = (i[0], i[1])
+            if cell in self.cellsegments:
+                self.cellsegments[cell].discard(key)
+
+    def isValid(self, key, steps):
+        # Is the segment, a LineRunner is walking on, still the current one?
+        return self.segments.get(key) is steps
+
+
+def bitCount(n):
+    if hasattr(n, "bit_count"):
+        return n.bit_count()
+    return bin(n).count("1")
+
+def bitRuns(bits):
+    # The runs of set bits as their first and last bit number, lowest first:
+    while bits:
+        low = bits & -bits
+        end = (bits + low) & ~bits
+        yield (low.bit_length() - 1, end.bit_length() - 2)
+        bits ^= end - low
+
+def growRuns(bits, free):
+    """ "Kogge-Stone"-fill on a row: Lets the bits run to the left and to
+        the right through the free bits, until they are the whole runs of
+        free bits, that they are in. Doubling the shift in every step needs
+        only about log2(length) steps for the longest run. """
+    # Often (in narrow passages), the bits can't grow at all:
+    if not free & ~bits & ((bits << 1) | (bits >> 1)):
+        return bits
+    (reach, shift) = (free, 1)
+    while True:
+        grown = bits | (reach & (bits << shift))
+        if grown == bits:
+            break
+        (bits, reach, shift) = (grown, reach & (reach << shift), shift * 2)
+    (reach, shift) = (free, 1)
+    while True:
+        grown = bits | (reach & (bits >> shift))
+        if grown == bits:
+            break
+        (bits, reach, shift) = (grown, reach & (reach >> shift), shift * 2)
+    return bits
+
+def getCaptureWork():
+    # CAPTUREWORK in rows of the current width. The time of a row of work is
+    # a fixed part, about as long as that of 800 cells, plus a part for every
+    # cell (measured with "benchmark.py scaling"):
+    return CAPTUREWORK * (800 + 160) // (800 + SCREENSIZE_X)
+
+
+class Capture:
+    """ Fills the areas, that the Player's line has cut off from the
+        Opponent, and turns the line white. Before, all black cells were one
+        area. So all the areas now touch the line, and one of them is the
+        Opponent's. A flood-fill is started on every run of black cells next
+        to the line. The fill with the smallest area so far always goes on,
+        and fills, that meet, are joined. When only one fill is left
+        unfinished, and the Opponent isn't in one of the finished ones, the
+        unfinished fill is the Opponent's, and the rest of its area doesn't
+        matter. So the work depends on the size of the captured areas, not
+        on the size of the board.
+
+        The fills work on the rows as integers, cell (x, y) being bit x:
+        Where a fill enters a row, its bits are grown to their whole runs at
+        once (see growRuns()). The captured rows are then set to blue.
+
+        run() only does a part of it, about "work" rows, so that a large
+        capture is spread over several frames. The work is counted in rows,
+        not in time, so that replays of recorded games stay the same. """
+
+    def __init__(self, playfield, opponentposition, trail):
+        self.playfield        = playfield
+        self.opponentposition = opponentposition
+        self.black            = COLORNRS["black"]
+        # The work of the current part, and the number of parts so far:
+        self.work             = 0
+        self.parts            = 0
+        # The black cells of the rows, that haven't been filled yet. A row
+        # is read, when it is needed for the first time:
+        self.free = {}
+        # The fills, that have been joined, are trees. The root has the
+        # filled bits of all of them by rows, the rows, where they go on,
+        # and their number of cells:
+        self.parents = []
+        self.rows    = []
+        self.stacks  = []
+        self.sizes   = []
+        # The fills, that have cells in a row, and the roots of the fills,
+        # that aren't finished, also in a heap by their sizes:
+        self.rowfills = {}
+        self.active   = set()
+        self.heap     = []
+        # The captured rows, when the fills are done, and how many of them
+        # have been set to blue:
+        self.captured = None
+        self.index    = 0
+        self.startFills(trail)
+
+    def startFills(self, trail):
+        # The line becomes white at once, so that it is a wall for the
+        # Opponent:
+        playfield = self.playfield
+        (magenta, white) = (COLORNRS["magenta"], COLORNRS["white"])
+        lines = {}
+        for (x, y) in trail.cells:
+            if playfield.getColorNr(x, y) == magenta:
+                lines[y] = lines.get(y, 0) | (1 << x)
+        for (y, bits) in lines.items():
+            playfield.setRowBits(y, bits, magenta, white)
+            playfield.counts[magenta] -= bitCount(bits)
+            playfield.counts[white]   += bitCount(bits)
+        for region in trail.getRegions():
+            playfield.markDirty(*region)
+            playfield.walldistances.updateCells(*region)
+            self.work += self.getWork(region)
+        # The cells next to the line, by rows. They are started as fills in
+        # the first parts of the work (see startFill()):
+        seeds = {}
+        for y in trail.rows:
+            bits = 0
+            for (x0, x1) in zip(*trail.rows[y]):
+                bits |= ((1 << (x1 - x0 + 1)) - 1) << x0
+            for (ny, near) in ((y, (bits << 1) | (bits >> 1)), (y - 1, bits), (y + 1, bits)):
+                if 0 <= ny < SCREENSIZE_Y:
+                    seeds[ny] = seeds.get(ny, 0) | near
+        # Popped from the end, the top row first:
+        self.seeds = sorted(seeds.items(), reverse = True)
+
+    def startFill(self, y, near):
+        # Every run of black cells next to the line is the seed of a fill.
+        # Seeds on the same side of the line are joined, as soon as their
+        # fills meet:
+        for (x0, x1) in bitRuns(near & self.getFree(y)):
+            i = len(self.parents)
+            self.parents.append(i)
+            self.rows.append({})
+            self.stacks.append([(y, ((1 << (x1 - x0 + 1)) - 1) << x0)])
+            self.sizes.append(0)
+            self.step(i)
+
+    def run(self, work):
+        """ Goes on with the capture for about "work" rows. Returns True,
+            when it is done. """
+        # The first part also has the work of turning the line white:
+        if self.parts > 0:
+            self.work = 0
+        self.parts += 1
+        if self.captured is None and not self.runFills(work):
+            return False
+        return self.setCaptured(work)
+
+    def getWork(self, region):
+        # The WallDistances read the rows of the region again, and cut its
+        # columns out of them, which costs about an eighth of a row each:
+        (x0, y0, x1, y1) = region
+        return y1 - y0 + 1 + (x1 - x0 + 1) // 8
+
+    def getFree(self, y):
+        if y not in self.free:
+            self.free[y] = self.playfield.getRowBits(y, self.black)
+            self.work += 1
+        return self.free[y]
+
+    def find(self, i):
+        while self.parents[i] != i:
+            self.parents[i] = self.parents[self.parents[i]]
+            i = self.parents[i]
+        return i
+
+    def join(self, i, j):
+        # The fill with fewer rows is put into the other one:
+        if len(self.rows[i]) < len(self.rows[j]):
+            (i, j) = (j, i)
+        self.parents[j] = i
+        rows = self.rows[i]
+        for (y, bits) in self.rows[j].items():
+            rows[y] = rows.get(y, 0) | bits
+        self.stacks[i].extend(self.stacks[j])
+        self.sizes[i] += self.sizes[j]
+        self.rows[j]   = None
+        self.stacks[j] = None
+        self.active.discard(j)
+        return i
+
+    def getOwner(self, x, y):
+        # The fill, that has filled the cell, if any:
+        for i in self.rowfills.get(y, ()):
+            i = self.find(i)
+            if (self.rows[i][y] >> x) & 1:
+                return i
+        return None
+
+    def getOpponentsFill(self):
+        (x, y) = self.opponentposition
+        i = self.getOwner(x, y)
+        if i is None and len(self.active) == 1 and (self.getFree(y) >> x) & 1:
+            return next(iter(self.active))
+        return i
+
+    def runFills(self, work):
+        # Returns True, when the fills are done:
+        while self.work < work:
+            # All the fills have to be started, before it is known, which
+            # one is the Opponent's:
+            if self.seeds:
+                self.startFill(*self.seeds.pop())
+                continue
+            if len(self.active) <= 1:
+                opponentsfill = self.getOpponentsFill()
+                if not self.active or opponentsfill in self.active:
+                    self.collectCaptured(opponentsfill)
+                    return True
+            # The smallest fill goes on, so that the large ones (like the
+            # Opponent's) don't get filled much further than the small ones.
+            # Entries of fills, that have grown or been joined since, are
+            # skipped:
+            (size, i) = heapq.heappop(self.heap)
+            if i in self.active and size == self.sizes[i]:
+                self.step(i)
+        return False
+
+    def step(self, i):
+        (y, bits) = self.stacks[i].pop()
+        self.work += 1
+        free  = self.getFree(y)
+        bits &= free
+        if bits:
+            bits = growRuns(bits, free)
+            self.free[y] = free ^ bits
+            i = self.addBits(i, y, bits)
+            if y > 0 and bits & self.getFree(y - 1):
+                self.stacks[i].append((y - 1, bits))
+            if y < SCREENSIZE_Y - 1 and bits & self.getFree(y + 1):
+                self.stacks[i].append((y + 1, bits))
+        if self.stacks[i]:
+            self.active.add(i)
+            heapq.heappush(self.heap, (self.sizes[i], i))
+        else:
+            self.active.discard(i)
+
+    def addBits(self, i, y, bits):
+        # Adds the filled bits to the fill, and joins the fills, that have
+        # cells next to them. Returns the root of the joined fills:
+        rows = self.rows[i]
+        if y in rows:
+            rows[y] |= bits
+        else:
+            rows[y] = bits
+            if y not in self.rowfills:
+                self.rowfills[y] = []
+            self.rowfills[y].append(i)
+        self.sizes[i] += bitCount(bits)
+        for (ny, near) in ((y, (bits << 1) | (bits >> 1)), (y - 1, bits), (y + 1, bits)):
+            for j in self.rowfills.get(ny, ()):
+                j = self.find(j)
+                if j != i and self.rows[j][ny] & near:
+                    i = self.join(i, j)
+        return i
+
+    def collectCaptured(self, opponentsfill):
+        # The rows of all the fills, but the Opponent's:
+        captured = {}
+        for i in range(len(self.parents)):
+            if self.parents[i] != i or i == opponentsfill:
+                continue
+            for (y, bits) in self.rows[i].items():
+                captured[y] = captured.get(y, 0) | bits
+        self.captured = sorted(captured.items())
+
+    def setCaptured(self, work):
+        # Sets the next captured rows to blue, as many as the work for their
+        # bounding box allows:
+        captured = self.captured
+        start    = self.index
+        columns  = 0
+        while self.index < len(captured):
+            (y, bits) = captured[self.index]
+            both   = columns | bits
+            region = ((both & -both).bit_length() - 1, captured[start][0], both.bit_length() - 1, y)
+            if self.work + self.getWork(region) > work and (self.index > start or self.work >= work):
+                break
+            columns = both
+            self.index += 1
+        if self.index == start:
+            return self.index == len(captured)
+        playfield = self.playfield
+        (black, blue) = (self.black, COLORNRS["blue"])
+        for (y, bits) in captured[start : self.index]:
+            playfield.setRowBits(y, bits, black, blue)
+            playfield.counts[black] -= bitCount(bits)
+            playfield.counts[blue]  += bitCount(bits)
+        region = ((columns & -columns).bit_length() - 1, captured[start][0],
+                  columns.bit_length() - 1, captured[self.index - 1][0])
+        playfield.markDirty(*region)
+        playfield.walldistances.updateCells(*region)
+        self.work += self.getWork(region)
+        return self.index == len(captured)
+
+
+class BitboardPlayfield(Playfield):
+    """ Playfield, that stores the cells of every color as bits: One
+        integer of SCREENSIZE_X bits per row, cell (x, y) is bit x of
+        row y. Single cells, rows, rectangles and neighbours are read from
+        these small integers, the Opponent's walls are looked up in them
+        (see WallMasks), and the Capture of the Player's line fills them
+        directly.
+
+        On boards of up to "wholeboardcells" cells, the flood-fill joins the
+        rows into one (big) integer, cell (x, y) being bit number
+        y * SCREENSIZE_X + x, and grows a mask of the whole area with shifts
+        and ANDs. Shifting a big integer costs as much as the whole board,
+        so on larger boards, the flood-fill works on the rows: It grows the
+        filled bits of a row as far as they can go at once, and goes on in
+        the rows above and below.
+
+        There is no "self.playfield" here, the cells have to be read with
+        getColorNr() and getRow(). """
+
+    # The colors, that most cells have, are looked up first:
+    colororder = [COLORNRS[i] for i in ("black", "blue", "white", "magenta", "red", "green", "cyan", "yellow", "grey")]
+
+    wholeboardcells = 100000
+
+    def initPlayfield(self):
+        w = SCREENSIZE_X
+        h = SCREENSIZE_Y
+        # A row full of bits and a row with only its first and last bit:
+        self.rowbits = (1 << w) - 1
+        sides = 1 | (1 << (w - 1))
+        self.rowmasks = {}
+        for i in COLORNAMES:
+            self.rowmasks[COLORNRS[i]] = [0] * h
+        self.rowmasks[COLORNRS["white"]] = [self.rowbits] + [sides] * (h - 2) + [self.rowbits]
+        self.rowmasks[COLORNRS["black"]] = [0] + [self.rowbits ^ sides] * (h - 2) + [0]
+        self.masks = {}
+        self.combinedmasks = {}
+        self.initCounts()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.clear()
+        self.linegraph.clear()
+
+    def createWallDistances(self, wallcolornrs):
+        return WallMasks(self, wallcolornrs)
+
+    def getMask(self, colornr):
+        # The rows of the color joined into one integer for the whole board.
+        # It is kept, until the color changes:
+        if colornr not in self.masks:
+            self.masks[colornr] = self.joinRowMasks(self.rowmasks[colornr])
+        return self.masks[colornr]
+
+    def joinRowMasks(self, rows):
+        # As a string of bits, the highest first:
+        w = SCREENSIZE_X
+        return int("".join(format(row, "0" + str(w) + "b") for row in reversed(rows)), 2)
+
+    def splitMask(self, mask):
+        # The other way round, the rows are cut out of the end backwards:
+        w = SCREENSIZE_X
+        bits = format(mask, "0" + str(w * SCREENSIZE_Y) + "b")
+        end = len(bits)
+        rows = []
+        for y in range(SCREENSIZE_Y):
+            rows.append(int(bits[end - w : end], 2))
+            end -= w
+        return rows
+
+    def getColorNr(self, x, y):
+        for colornr in self.colororder:
+            if (self.rowmasks[colornr][y] >> x) & 1:
+                return colornr
+
+    def setColorNr(self, x, y, colornr):
+        oldcolornr = self.getColorNr(x, y)
+        if oldcolornr == colornr:
+            return
+        bit = 1 << x
+        self.rowmasks[oldcolornr][y] &= ~bit
+        self.rowmasks[colornr][y]    |= bit
+        self.masks.pop(oldcolornr, None)
+        self.masks.pop(colornr, None)
+        # The kept combined rows are changed too, instead of being made anew:
+        for colornrs in self.combinedmasks:
+            if (oldcolornr in colornrs) != (colornr in colornrs):
+                self.combinedmasks[colornrs][y] ^= bit
+        self.cellChanged(x, y, oldcolornr, colornr)
+
+    def getRow(self, x0, x1, y):
+        # The bits of every color are written out as the characters "0" and
+        # "1", lowest first, and these are translated to 0 and the colornr.
+        # As the colors don't overlap, the rows can simply be added up
+        # (black is 0):
+        length = x1 - x0 + 1
+        row = 0
+        for colornr in self.rowmasks:
+            if colornr == COLORNRS["black"]:
+                continue
+            bits = (self.rowmasks[colornr][y] >> x0) & ((1 << length) - 1)
+            if bits:
+                table = bytearray(256)
+                table[ord("1")] = colornr
+                cells = format(bits, "0" + str(length) + "b")[::-1].encode().translate(table)
+                row += int.from_bytes(cells, "little")
+        return list(row.to_bytes(length, "little"))
+
+    def loadRows(self, rows):
+        # Every row as a bytestring, highest bit first. For every color,
+        # the cells are then translated to the characters "0" and "1":
+        rows = [bytes(row)[::-1] for row in rows]
+        for colornr in self.rowmasks:
+            table = bytearray(b"0" * 256)
+            table[colornr] = ord("1")
+            self.rowmasks[colornr] = [int(row.translate(table), 2) for row in rows]
+        self.masks = {}
+        self.combinedmasks = {}
+        self.countCells()
+        self.dirtyregions = []
+        self.capture = None
+        self.walldistances.rebuild()
+        self.linegraph.clear()
+
+    def setCells(self, region, cells):
+        # There are no rows to set here, so it's done cell by cell:
+        (x0, y0, x1, y1) = region
+        width = x1 - x0 + 1
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                colornr = cells[(y - y0) * width + x - x0]
+                if self.getColorNr(x, y) != colornr:
+                    self.setColorNr(x, y, colornr)
+        self.markDirty(x0, y0, x1, y1)
+
+    def getRowBits(self, y, colornr):
+        return self.rowmasks[colornr][y]
+
+    def setRowBits(self, y, bits, oldcolornr, colornr):
+        self.rowmasks[oldcolornr][y] ^= bits
+        self.rowmasks[colornr][y]    |= bits
+        self.masks.pop(oldcolornr, None)
+        self.masks.pop(colornr, None)
+        for colornrs in self.combinedmasks:
+            if (oldcolornr in colornrs) != (colornr in colornrs):
+                self.combinedmasks[colornrs][y] ^= bits
+
+    def getCombinedRowMasks(self, colornrs):
+        # The rows of all the colors together. They are kept and changed
+        # with the cells, until the playfield changes as a whole:
+        colornrs = tuple(colornrs)
+        if colornrs not in self.combinedmasks:
+            rows = [0] * SCREENSIZE_Y
+            for colornr in colornrs:
+                rows = [i | j for (i, j) in zip(rows, self.rowmasks[colornr])]
+            self.combinedmasks[colornrs] = rows
+        return self.combinedmasks[colornrs]
+
+    def getNeighbourDirections(self, x, y, colornrs):
+        rows = self.getCombinedRowMasks(colornrs)
+        d = []
+        if x > 0 and (rows[y] >> (x - 1)) & 1:
+            d.append("left")
+        if x < SCREENSIZE_X - 1 and (rows[y] >> (x + 1)) & 1:
+            d.append("right")
+        if y > 0 and (rows[y - 1] >> x) & 1:
+            d.append("up")
+        if y < SCREENSIZE_Y - 1 and (rows[y + 1] >> x) & 1:
+            d.append("down")
+        return d
+
+    def floodfillPlayfield(self, coordinates, fromcolorname, tocolorname):
+        if SCREENSIZE_X * SCREENSIZE_Y <= self.wholeboardcells:
+            self.floodfillBoard(coordinates, COLORNRS[fromcolorname], COLORNRS[tocolorname])
+        else:
+            self.floodfillRowMasks(coordinates, COLORNRS[fromcolorname], COLORNRS[tocolorname])
+
+    def floodfillBoard(self, coordinates, fromcolornr, tocolornr):
+        (x, y) = coordinates
+        if not (self.rowmasks[fromcolornr][y] >> x) & 1:
+            return
+        w = SCREENSIZE_X
+        allowed = self.getMask(fromcolornr)
+        area    = 1 << (y * w + x)
+        # Shifting left or right by one makes the bits wrap around into the
+        # next or previous row. Without the first or the last column, they
+        # can't. Grow the area in all four directions, until it doesn't
+        # change any more:
+        firstcolumn    = self.joinRowMasks([1] * SCREENSIZE_Y)
+        notfirstcolumn = allowed & ~firstcolumn
+        notlastcolumn  = allowed & ~(firstcolumn << (w - 1))
+        while True:
+            previous = area
+            area = self.growArea(area, notfirstcolumn, 1)
+            area = self.growArea(area, notlastcolumn, -1)
+            area = self.growArea(area, allowed, w)
+            area = self.growArea(area, allowed, -w)
+            if area == previous:
+                break
+        self.masks[fromcolornr] = allowed & ~area
+        self.masks[tocolornr]   = self.getMask(tocolornr) | area
+        self.rowmasks[fromcolornr] = self.splitMask(self.masks[fromcolornr])
+        self.rowmasks[tocolornr]   = self.splitMask(self.masks[tocolornr])
+        self.combinedmasks = {}
+        filled = bitCount(area)
+        self.counts[fromcolornr] -= filled
+        self.counts[tocolornr]   += filled
+
+    def growArea(self, area, allowed, shift):
+        """ "Kogge-Stone"-fill: Lets the area run as far as possible in one
+            direction through the allowed cells. Doubling the shift in every
+            step needs only about log2(size) steps for the longest run.
+            When a step adds nothing, all runs have ended. """
+        while True:
+            if shift > 0:
+                grown    = area | (allowed & (area << shift))
+                allowed &= allowed << shift
+            else:
+                grown    = area | (allowed & (area >> -shift))
+                allowed &= allowed >> -shift
+            if grown == area:
+                return area
+            area   = grown
+            shift *= 2
+
+    def floodfillRowMasks(self, coordinates, fromcolornr, tocolornr):
+        """ Scanline flood-fill on the rows: The bits, where the fill enters
+            a row, are grown to their whole runs at once with a
+            "Kogge-Stone"-fill like in growArea(), and these are passed on
+            to the rows above and below. """
+        (x, y) = coordinates
+        # The cells of the from-color, that haven't been filled yet:
+        allowed = self.rowmasks[fromcolornr]
+        filled  = self.rowmasks[tocolornr]
+        if not (allowed[y] >> x) & 1:
+            return
+        # The filled cells are counted at the end, as the ones gone from here:
+        count = sum(map(bitCount, allowed))
+        ymax  = SCREENSIZE_Y - 1
+        stack = [(y, 1 << x)]
+        # Local names, as this is the inner loop:
+        (pop, push) = (stack.pop, stack.append)
+        while stack:
+            (y, bits) = pop()
+            free  = allowed[y]
+            bits &= free
+            if not bits:
+                continue
+            # Often (in narrow passages), the bits can't grow at all:
+            if free & ~bits & ((bits << 1) | (bits >> 1)):
+                (reach, shift) = (free, 1)
+                while True:
+                    grown = bits | (reach & (bits << shift))
+                    if grown == bits:
+                        break
+                    (bits, reach, shift) = (grown, reach & (reach << shift), shift * 2)
+                (reach, shift) = (free, 1)
+                while True:
+                    grown = bits | (reach & (bits >> shift))
+                    if grown == bits:
+                        break
+                    (bits, reach, shift) = (grown, reach & (reach >> shift), shift * 2)
+            allowed[y] = free ^ bits
+            filled[y] |= bits
+            if y > 0 and bits & allowed[y - 1]:
+                push((y - 1, bits))
+            if y < ymax and bits & allowed[y + 1]:
+                push((y + 1, bits))
+        count -= sum(map(bitCount, allowed))
+        self.masks.pop(fromcolornr, None)
+        self.masks.pop(tocolornr, None)
+        self.combinedmasks = {}
+        self.counts[fromcolornr] -= count
+        self.counts[tocolornr]   += count
+
+    def markDirtyRows(self, rows):
+        y = [i for i in range(SCREENSIZE_Y) if rows[i]]
+        if not y:
+            return
+        # OR the rows on top of each other, to get the columns in use:
+        columns = 0
+        for row in rows[y[0] : y[-1] + 1]:
+            columns |= row
+        x0 = (columns & -columns).bit_length() - 1
+        x1 = columns.bit_length() - 1
+        self.markDirty(x0, y[0], x1, y[-1])
+
+    def inversePlayfield(self):
+        r = self.rowmasks
+        (black, blue, magenta, white, grey) = [COLORNRS[i] for i in ("black", "blue", "magenta", "white", "grey")]
+        self.markDirtyRows([i | j for (i, j) in zip(r[black], r[magenta])])
+        r[blue]    = [i | j for (i, j) in zip(r[blue], r[black])]
+        r[white]   = [i | j for (i, j) in zip(r[white], r[magenta])]
+        r[black]   = r[grey]
+        r[magenta] = [0] * SCREENSIZE_Y
+        r[grey]    = [0] * SCREENSIZE_Y
+        self.masks = {}
+        self.combinedmasks = {}
+        self.invertCounts()
+
+    def deleteAllMagenta(self):
+        self.linegraph.clear()
+        r = self.rowmasks
+        (black, magenta) = (COLORNRS["black"], COLORNRS["magenta"])
+        self.markDirtyRows(r[magenta])
+        r[black]   = [i | j for (i, j) in zip(r[black], r[magenta])]
+        r[magenta] = [0] * SCREENSIZE_Y
+        self.masks = {}
+        self.combinedmasks = {}
+        self.counts[black]  += self.counts[magenta]
+        self.counts[magenta] = 0
+
+
+def importNumpy():
+    # Returns, whether NumPy is available:
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+    return True
+
+def createPlayfield():
+    if PLAYFIELDBACKEND == "numpy":
+        if not importNumpy():
+            print("NumPy not found. Using the list playfield.")
+            return Playfield()
+        return NumpyPlayfield()
+    if PLAYFIELDBACKEND == "bitboard":
+        return BitboardPlayfield()
+    return Playfield()
 
 
 #####################################
 # Sprites:
 
-class MySprite(pygame.sprite.Sprite):
+def convertSurface(surface):
+    # Surfaces can only be converted, if there is a display
+    # (there isn't any, when running a Simulation on its own):
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert()
+
+class SpatialHash:
+    """ A uniform grid of buckets over the window, that holds the rects of
+        moving entities (the LineRunners). An entity is in the bucket of the
+        top left corner of its rect, and is moved to another one, when its
+        position is set. As the entities aren't larger than a bucket, a
+        collision query only has to look at the entities in the buckets of
+        its rect and in those left of and above them, not at all of them.
+
+        The rects are kept by reference, so they are always the current
+        ones. Entities are any hashable keys. """
+
+    def __init__(self, bucketsize):
+        self.bucketsize = bucketsize
+        self.buckets    = {}
+        self.rects      = {}
+        self.places     = {}
+
+    def move(self, key, rect):
+        place = (rect.left // self.bucketsize, rect.top // self.bucketsize)
+        if self.places.get(key) == place:
+            return
+        self.remove(key)
+        if place not in self.buckets:
+            self.buckets[place] = set()
+        self.buckets[place].add(key)
+        self.places[key] = place
+        self.rects[key]  = rect
+
+    def moveAll(self, keys, rects):
+        # Most moves stay in the same bucket. That is checked for all the
+        # entities in one loop:
+        size   = self.bucketsize
+        places = self.places
+        for (key, rect) in zip(keys, rects):
+            if places.get(key) != (rect.left // size, rect.top // size):
+                self.move(key, rect)
+
+    def remove(self, key):
+        if key not in self.places:
+            return
+        place = self.places.pop(key)
+        self.buckets[place].discard(key)
+        if not self.buckets[place]:
+            del self.buckets[place]
+        del self.rects[key]
+
+    def query(self, rect):
+        # The entities, whose rects collide with the rect:
+        size = self.bucketsize
+        keys = []
+        for y in range((rect.top - size) // size, (rect.bottom - 1) // size + 1):
+            for x in range((rect.left - size) // size, (rect.right - 1) // size + 1):
+                if (x, y) in self.buckets:
+                    keys.extend(self.buckets[(x, y)])
+        return [i for i in keys if self.rects[i].colliderect(rect)]
+
+class MySprite(pygame.sprite.DirtySprite):
+
+    # Like all sprites, that are drawn, these are DirtySprites: When their
+    # image or their position changes, they set "dirty", so that they are
+    # drawn again in DIRTYRENDERING-mode.
 
     def __init__(self, game):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
         self.game   = game
         self.image  = None
         self.rect   = None
@@ -181,13 +1530,31 @@ class MySprite(pygame.sprite.Sprite):
         self.floatcounter -= 1
         return 1
 
+    def getChanges(self, speed, maximum):
+        # Like getChange(), but allows up to "maximum" cells per frame:
+        self.floatcounter += speed * self.game.clocktick
+        change = int(self.floatcounter)
+        if change > maximum:
+            self.floatcounter = 0
+            return maximum
+        self.floatcounter -= change
+        return change
+
     def setPosition(self):
         self.rect.x = (self.spos_x + BORDER_X) * SCALEFACTOR
         self.rect.y = (self.spos_y + BORDER_Y) * SCALEFACTOR
+        self.dirty  = 1
 
     def getPosition(self):
         return (self.spos_x, self.spos_y)
 
+def getPercentageText(p):
+    s = ""
+    if p < 10:
+        s += " "
+    s += str(p) + "%"
+    return s
+
 class Player(MySprite):
 
     def __init__(self, game, playfield):
@@ -200,6 +1567,7 @@ class Player(MySprite):
         for i in ("magenta", "blue"):
             self.collisioncolornrs.append(COLORNRS[i])
         self.line = Line()
+        self.trail = Trail()
         self.initSettings()
 
     def initSettings(self):
@@ -211,13 +1579,14 @@ class Player(MySprite):
         self.drawCircle()
         self.drawing = False
         self.line.setColor("white")
+        self.trail.clear()
 
     def setOpponent(self, opponent):
         self.opponent = opponent
 
     def createImage(self):
         self.image = pygame.Surface((2 * SCALEFACTOR, 2 * SCALEFACTOR))
-        self.image = self.image.convert()
+        self.image = convertSurface(self.image)
         self.rect  = self.image.get_rect()
         self.center = (self.rect.width // 2, self.rect.height // 2)
         self.radius = self.rect.width // 2
@@ -242,10 +1611,12 @@ class Player(MySprite):
         self.image.fill(COLORS["black"])
         pygame.draw.circle(self.image, self.colorlist, self.center, self.radius)
         self.image.set_colorkey(COLORS["black"])
+        self.dirty = 1
 
     def setPosition(self):
         self.rect.x = (self.spos_x + BORDER_X) * SCALEFACTOR - 0.25 * self.rect.width
         self.rect.y = (self.spos_y + BORDER_Y) * SCALEFACTOR - 0.25 * self.rect.height
+        self.dirty  = 1
 
     def shimmer(self):
         step = 4
@@ -309,11 +1680,15 @@ class Player(MySprite):
         if self.newpos[1] < 0 or self.newpos[1] > SCREENSIZE_Y - 1:
             self.walldetected = True
             return
-        if self.playfield.playfield[self.newpos[1]][self.newpos[0]] in self.collisioncolornrs:
+        colornr = self.playfield.getColorNr(self.newpos[0], self.newpos[1])
+        if colornr in self.collisioncolornrs:
+            self.walldetected = True
+        # While a capture is going on, no new line can be drawn into it:
+        if colornr == COLORNRS["black"] and self.playfield.capture is not None:
             self.walldetected = True
 
     def collisions_linerunners(self):
-        if pygame.sprite.spritecollide(self, self.game.linerunners, False):
+        if self.game.spatialhash.query(self.rect):
             self.game.setState("playerexplosion", "player")
             return True
         return False
@@ -321,7 +1696,7 @@ class Player(MySprite):
     def checkPlayfield(self):
 
         # When player enters dark area, switch on line drawing:
-        locationcolornr = self.playfield.playfield[self.spos_y][self.spos_x]
+        locationcolornr = self.playfield.getColorNr(self.spos_x, self.spos_y)
         if locationcolornr == COLORNRS["black"] and not self.drawing:
             self.drawing = True
             self.line.setColor("magenta")
@@ -329,24 +1704,27 @@ class Player(MySprite):
         # When player hits white line while drawing his line, start area-filling:
         if self.drawing and locationcolornr == COLORNRS["white"]:
             self.game.playSound("fill")
-            self.playfield.fillArea(self.opponent.getPosition())
+            self.playfield.fillArea(self.opponent.getPosition(), self.trail)
             self.drawing = False
             self.line.setColor("white")
-            self.game.playfieldsprite.updatePlayfieldSprite()
-            p = self.playfield.getFilledPercentage()
-            s = ""
-            if p < 10:
-                s += " "
-            s += str(p) + "%"
-            self.game.texts["percentage"].setText(s)
+            # The line has become white now, so it's not a trail any more:
+            self.trail.clear()
+            self.game.playfieldChanged()
+            self.game.textChanged("percentage", getPercentageText(self.playfield.getFilledPercentage()))
  
     def drawToPlayfield(self):
         self.line.setPosition(self.spos_x, self.spos_y)
         self.playfield.insertIntoPlayfield(self.line)
-        self.game.playfieldsprite.drawLine(self.line)
+        if self.drawing:
+            self.trail.add(self.spos_x, self.spos_y)
+        self.game.lineDrawn(self.line)
+
+    def eraseTrail(self):
+        self.playfield.deleteMagentaInPlayfield(self.trail)
+        self.trail.clear()
 
     def onWhiteLine(self):
-        if self.playfield.playfield[self.spos_y][self.spos_x] == COLORNRS["white"]:
+        if self.playfield.getColorNr(self.spos_x, self.spos_y) == COLORNRS["white"]:
             return True
         else:
             return False
@@ -354,6 +1732,95 @@ class Player(MySprite):
     def draw(self, screen):
         screen.blit(self.image, self.rect)
 
+class Trail:
+    """ The cells of the Player's magenta line in the order, in which they
+        were drawn. For fast searching, every row also has a sorted list of
+        the horizontal runs ("spans") of the line in that row, stored as
+        a list of the first and a list of the last x of the spans. """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.cells = []
+        self.rows  = {}
+        self.x0 = SCREENSIZE_X
+        self.y0 = SCREENSIZE_Y
+        self.x1 = -1
+        self.y1 = -1
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, x, y):
+        if y not in self.rows:
+            self.rows[y] = ([], [])
+        (starts, ends) = self.rows[y]
+        i = bisect.bisect_right(starts, x)
+        # Already in the trail (the Player hasn't moved):
+        if i > 0 and ends[i - 1] >= x:
+            return
+        joinleft  = i > 0 and ends[i - 1] == x - 1
+        joinright = i < len(starts) and starts[i] == x + 1
+        if joinleft and joinright:
+            ends[i - 1] = ends[i]
+            del starts[i]
+            del ends[i]
+        elif joinleft:
+            ends[i - 1] = x
+        elif joinright:
+            starts[i] = x
+        else:
+            starts.insert(i, x)
+            ends.insert(i, x)
+        self.cells.append( (x, y) )
+        self.x0 = min(self.x0, x)
+        self.y0 = min(self.y0, y)
+        self.x1 = max(self.x1, x)
+        self.y1 = max(self.y1, y)
+
+    def getBoundingBox(self):
+        return (self.x0, self.y0, self.x1, self.y1)
+
+    def getRegions(self):
+        """ Rectangles (x0, y0, x1, y1), that cover the cells of the line:
+            Its spans, where equal spans in the rows below each other are
+            joined. So a line from one side of the board to the other is a
+            few long and thin rectangles, not one as large as the board. """
+        regions = []
+        previous = {}
+        for y in sorted(self.rows):
+            current = {}
+            for span in zip(*self.rows[y]):
+                region = previous.get(span)
+                if region is None or region[3] != y - 1:
+                    region = [span[0], y, span[1], y]
+                    regions.append(region)
+                region[3] = y
+                current[span] = region
+            previous = current
+        return [tuple(i) for i in regions]
+
+    def intersectsRow(self, x0, x1, y):
+        if y not in self.rows:
+            return False
+        (starts, ends) = self.rows[y]
+        # The last span, that starts left of x1, is the only one, that may reach x0:
+        i = bisect.bisect_right(starts, x1)
+        return i > 0 and ends[i - 1] >= x0
+
+    def intersectsRect(self, x, y, width, height):
+        if x > self.x1 or x + width - 1 < self.x0 or y > self.y1 or y + height - 1 < self.y0:
+            return False
+        for i in range(max(y, self.y0), min(y + height - 1, self.y1) + 1):
+            if self.intersectsRow(x, x + width - 1, i):
+                return True
+        return False
+
+    def contains(self, x, y):
+        return self.intersectsRow(x, x, y)
+
+
 class Line:
 
     def __init__(self):
@@ -363,7 +1830,7 @@ class Line:
 
     def drawImage(self):
         self.image = pygame.Surface((SCALEFACTOR, SCALEFACTOR))
-        self.image = self.image.convert()
+        self.image = convertSurface(self.image)
         self.rect  = self.image.get_rect()
         self.rect.topleft = (0, 0)
 
@@ -382,34 +1849,91 @@ class PlayfieldSprite(MySprite):
     def __init__(self, game, playfield):
         MySprite.__init__(self, game)
         self.playfield = playfield 
+        self.colors = {}
+        for i in ("blue", "white", "magenta"):
+            self.colors[COLORNRS[i]] = COLORS[i]
         self.createImage()
-        self.dsrect = pygame.Rect((0, 0), (SCALEFACTOR, SCALEFACTOR))
         self.updatePlayfieldSprite()
 
     def createImage(self):
         self.image = pygame.Surface((SCREENSIZE_X * SCALEFACTOR, SCREENSIZE_Y * SCALEFACTOR))
-        self.image = self.image.convert()
+        self.image = convertSurface(self.image)
         self.image.fill(COLORS["black"])
         self.rect  = self.image.get_rect()
         self.rect.topleft = (BORDER_X * SCALEFACTOR, BORDER_Y * SCALEFACTOR)
-
-    def updatePlayfieldSprite(self):
-        self.image.fill(COLORS["black"])
-        colornames = ("blue", "white", "magenta")
-        # This is stupid, but it works:
-        colors     = {}
-        colornrs   = []
-        for i in colornames:
-            colornrs.append(COLORNRS[i])
-            colors[COLORNRS[i]] = COLORS[i]
-        for y in range(len(self.playfield.playfield)):
-            for x in range(len(self.playfield.playfield[y])):
-                if self.playfield.playfield[y][x] in colornrs:
-                    self.dsrect.topleft = (x * SCALEFACTOR, y * SCALEFACTOR)
-                    pygame.draw.rect(self.image, colors[self.playfield.playfield[y][x]], self.dsrect)
+        # With NATIVERESOLUTION, the cells are drawn here, one pixel each.
+        # It has 8 bits per pixel, with a palette in the order of the
+        # colornrs, so that the cells can be written as they are.
+        # The rectangle of cells, that have changed since, is scaled to
+        # "image" by scaleImage():
+        self.nativeimage = None
+        self.scalerect   = None
+        if NATIVERESOLUTION:
+            self.nativeimage = pygame.Surface((SCREENSIZE_X, SCREENSIZE_Y), 0, 8)
+            palette = []
+            for i in range(256):
+                palette.append(self.colors.get(i, COLORS["black"]))
+            self.nativeimage.set_palette(palette)
+
+    def updatePlayfieldSprite(self, regions = None):
+        """ Repaints the given regions of the playfield, or all of it,
+            if no regions are given. A region is a tuple (x0, y0, x1, y1)
+            of cells, as returned by Playfield.popDirtyRegions(). """
+        if regions is None:
+            regions = ( (0, 0, SCREENSIZE_X - 1, SCREENSIZE_Y - 1), )
+        if self.nativeimage:
+            self.updateNativeImage(regions)
+            return
+        for (x0, y0, x1, y1) in regions:
+            self.image.fill(COLORS["black"], (x0 * SCALEFACTOR, y0 * SCALEFACTOR,
+                                              (x1 - x0 + 1) * SCALEFACTOR, (y1 - y0 + 1) * SCALEFACTOR))
+            # One rectangle for every run of cells of the same color in a row:
+            for y in range(y0, y1 + 1):
+                x = x0
+                for (colornr, run) in itertools.groupby(self.playfield.getRow(x0, x1, y)):
+                    length = len(tuple(run))
+                    if colornr in self.colors:
+                        self.image.fill(self.colors[colornr], (x * SCALEFACTOR, y * SCALEFACTOR,
+                                                               length * SCALEFACTOR, SCALEFACTOR))
+                    x += length
+
+    def updateNativeImage(self, regions):
+        # The rows of cells are copied into the pixels directly:
+        pitch  = self.nativeimage.get_pitch()
+        pixels = self.nativeimage.get_buffer()
+        for (x0, y0, x1, y1) in regions:
+            for y in range(y0, y1 + 1):
+                pixels.write(bytes(self.playfield.getRow(x0, x1, y)), y * pitch + x0)
+            self.addScaleRect(pygame.Rect(x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+        # Unlocks the surface:
+        del pixels
 
     def drawLine(self, line):
-        self.image.blit(line.image, line.rect)
+        if self.nativeimage:
+            self.nativeimage.set_at((line.spos_x, line.spos_y), self.nativeimage.map_rgb(COLORS[line.colorname]))
+            self.addScaleRect(pygame.Rect(line.spos_x, line.spos_y, 1, 1))
+        else:
+            self.image.blit(line.image, line.rect)
+
+    def addScaleRect(self, rect):
+        if self.scalerect is None:
+            self.scalerect = rect
+        else:
+            self.scalerect.union_ip(rect)
+
+    def scaleImage(self):
+        # The single scale pass of a frame:
+        if self.scalerect is None:
+            return
+        r = self.scalerect
+        target = pygame.Rect(r.x * SCALEFACTOR, r.y * SCALEFACTOR, r.width * SCALEFACTOR, r.height * SCALEFACTOR)
+        self.image.blit(pygame.transform.scale(self.nativeimage.subsurface(r), target.size), target)
+        self.scalerect = None
+
+    def getScreenRect(self, x0, y0, x1, y1):
+        # The part of the window, that shows the given cells:
+        return pygame.Rect(self.rect.x + x0 * SCALEFACTOR, self.rect.y + y0 * SCALEFACTOR,
+                           (x1 - x0 + 1) * SCALEFACTOR, (y1 - y0 + 1) * SCALEFACTOR)
 
     def draw(self, screen):
         screen.blit(self.image, self.rect)
@@ -445,46 +1969,60 @@ class Opponent(MySprite):
             self.move()
 
     def move(self):
-        change = self.getChange(OPPONENTSPEED)
+        if OPPONENTMAXSTEPS > 1:
+            change = self.getChanges(OPPONENTSPEED, OPPONENTMAXSTEPS)
+        else:
+            change = self.getChange(OPPONENTSPEED)
+        for i in range(change):
+            # As the tests are cheap, they are simply done again before
+            # every further step in the same frame:
+            if i > 0:
+                self.collision_player()
+                self.collision_playfield()
+                if self.walldetected or self.game.state != "level":
+                    return
+            self.step()
+
+    def step(self):
         if self.direction[0] == "left":
-            self.spos_x -= change
+            self.spos_x -= 1
         if self.direction[0] == "right":
-            self.spos_x += change
+            self.spos_x += 1
         if self.direction[1] == "up":
-            self.spos_y -= change
+            self.spos_y -= 1
         if self.direction[1] == "down":
-            self.spos_y += change
+            self.spos_y += 1
         self.setPosition()
 
     def collision_playfield(self):
 
+        # The edge of cells in front of the Opponent is looked up in the
+        # distances to the next walls:
+        distances = self.playfield.walldistances
+
         if self.direction[0] == "left":
-            for y in range(OPPONENTSIZE_Y):
-                if self.playfield.playfield[self.spos_y + y][self.spos_x - 1] in self.walls:
-                    self.walldetected = True
-                    self.boing("left")
-                    return
+            if not distances.isColumnFree(self.spos_x - 1, self.spos_y, OPPONENTSIZE_Y):
+                self.walldetected = True
+                self.boing("left")
+                return
 
         if self.direction[0] == "right":
-            for y in range(OPPONENTSIZE_Y):
-                if self.playfield.playfield[self.spos_y + y][self.spos_x + OPPONENTSIZE_X] in self.walls:
-                    self.walldetected = True
-                    self.boing("right")
-                    return
+            if not distances.isColumnFree(self.spos_x + OPPONENTSIZE_X, self.spos_y, OPPONENTSIZE_Y):
+                self.walldetected = True
+                self.boing("right")
+                return
 
         if self.direction[1] == "up":
-            for x in range(OPPONENTSIZE_X):
-                if self.playfield.playfield[self.spos_y - 1][self.spos_x + x] in self.walls:
-                    self.walldetected = True
-                    self.boing("up")
-                    return
+            if not distances.isRowFree(self.spos_x, self.spos_y - 1, OPPONENTSIZE_X):
+                self.walldetected = True
+                self.boing("up")
+                return
 
         if self.direction[1] == "down":
-            for x in range(OPPONENTSIZE_X):
-                if self.playfield.playfield[self.spos_y + OPPONENTSIZE_Y][self.spos_x + x] in self.walls:
-                    self.walldetected = True
-                    self.boing("down")
-                    return
+            if not distances.isRowFree(self.spos_x, self.spos_y + OPPONENTSIZE_Y, OPPONENTSIZE_X):
+                self.walldetected = True
+                self.boing("down")
+                return
 
     def boing(self, tochange):
         if self.direction[0] == tochange:
@@ -500,22 +2038,38 @@ class Opponent(MySprite):
             if not self.player.onWhiteLine():
                 self.game.setState("playerexplosion", "opponent")
                 return
-        # Collision with Player's magenta line.
-        # "return", in order not to drain more than one life from the Player:
-        for y in range(OPPONENTSIZE_Y):
-            for x in range(OPPONENTSIZE_X):
-                # Collision with Player's magenta line:
-                if self.playfield.playfield[self.spos_y + y][self.spos_x + x] == COLORNRS["magenta"]:
-                    self.game.setState("playerexplosion", "opponent")
-                    return
+        # Collision with Player's magenta line:
+        if self.player.trail.intersectsRect(self.spos_x, self.spos_y, OPPONENTSIZE_X, OPPONENTSIZE_Y):
+            self.game.setState("playerexplosion", "opponent")
 
     def createImage(self):
         self.image     = pygame.Surface((OPPONENTSIZE_X * SCALEFACTOR, OPPONENTSIZE_Y * SCALEFACTOR))
-        self.image     = self.image.convert()
+        self.image     = convertSurface(self.image)
         self.image.fill(COLORS[OPPONENTCOLOR])
         self.rect      = self.image.get_rect()
 
 
+def createLineRunnerImage():
+    image  = pygame.Surface((3 * SCALEFACTOR, 3 * SCALEFACTOR))
+    image  = convertSurface(image)
+    rect   = image.get_rect()
+    center = (int(rect.width / 2), int(rect.height / 2))
+    radius = int(rect.width / 2)
+    image.fill(COLORS["black"])
+    # pygame.draw.circle(image, COLORS["magenta"], center, radius)
+    pygame.draw.circle(image, COLORS["bright_yellow"], center, radius)
+    image.set_colorkey(COLORS["black"])
+    return image
+
+def getLineRunnerStart(initside):
+    if initside == "left":
+        return (0, int(SCREENSIZE_Y / 2))
+    if initside == "right":
+        return (SCREENSIZE_X - 1, int(SCREENSIZE_Y / 2))
+    if initside == "up":
+        return (int(SCREENSIZE_X / 2), 0)
+    return (int(SCREENSIZE_X / 2), SCREENSIZE_Y - 1)
+
 class LineRunner(MySprite):
 
     def __init__(self, game, initside, initdirection):
@@ -524,57 +2078,38 @@ class LineRunner(MySprite):
         self.player        = self.game.player
         self.initside      = initside
         self.initdirection = initdirection
-        self.linecolors = (COLORNRS["white"], COLORNRS["magenta"])
+        self.linegraph  = self.playfield.linegraph
         self.createImage()
 
     def createImage(self):
-        self.image = pygame.Surface((3 * SCALEFACTOR, 3 * SCALEFACTOR))
-        self.image = self.image.convert()
+        self.image = createLineRunnerImage()
         self.rect  = self.image.get_rect()
-        center = (int(self.rect.width / 2), int(self.rect.height / 2))
-        radius = int(self.rect.width / 2)
-        self.image.fill(COLORS["black"])
-        # pygame.draw.circle(self.image, COLORS["magenta"], center, radius)
-        pygame.draw.circle(self.image, COLORS["bright_yellow"], center, radius)
-        self.image.set_colorkey(COLORS["black"])
 
     def initSettings(self):
         self.direction = self.initdirection
-        if self.initside == "left":
-            self.spos_x = 0
-            self.spos_y = int(SCREENSIZE_Y / 2)
-        if self.initside == "right":
-            self.spos_x = SCREENSIZE_X - 1
-            self.spos_y = int(SCREENSIZE_Y / 2)
-        if self.initside == "up":
-            self.spos_x = int(SCREENSIZE_X / 2)
-            self.spos_y = 0
-        if self.initside == "down":
-            self.spos_x = int(SCREENSIZE_X / 2)
-            self.spos_y = SCREENSIZE_Y - 1
+        # The segment of the LineGraph, the siderunner is walking on:
+        self.segment      = None
+        self.steps        = None
+        self.segmentindex = 0
+        (self.spos_x, self.spos_y) = getLineRunnerStart(self.initside)
         self.setPosition()
 
     def setPosition(self):
         self.rect.x = (self.spos_x + BORDER_X) * SCALEFACTOR - 0.25 * self.rect.width
         self.rect.y = (self.spos_y + BORDER_Y) * SCALEFACTOR - 0.25 * self.rect.height
+        self.dirty  = 1
+        self.game.spatialhash.move(self, self.rect)
 
     def getDirection(self):
-        # Look to every direction and see, what way the siderunner can walk:
-        d = []
-        if self.spos_x > 0 and self.playfield.playfield[self.spos_y][self.spos_x - 1] in self.linecolors and self.direction != "right":
-            d.append("left")
-        if self.spos_x < SCREENSIZE_X - 1 and self.playfield.playfield[self.spos_y][self.spos_x + 1] in self.linecolors and self.direction != "left":
-            d.append("right")
-        if self.spos_y > 0 and self.playfield.playfield[self.spos_y - 1][self.spos_x] in self.linecolors and self.direction != "down":
-            d.append("up")
-        if self.spos_y < SCREENSIZE_Y - 1 and self.playfield.playfield[self.spos_y + 1][self.spos_x] in self.linecolors and self.direction != "up":
-            d.append("down")
+        # Look to every direction and see, what way the siderunner can walk
+        # (but don't turn around):
+        d = self.linegraph.getWays(self.spos_x, self.spos_y, self.direction)
         lend = len(d)
         if lend == 0:
             return "stop"
         if lend == 1:
             return d[0]
-        return d[random.randrange(lend)]
+        return d[self.game.random.randrange(lend)]
 
     def update(self):
         if self.game.state == "level":
@@ -585,20 +2120,122 @@ class LineRunner(MySprite):
         # Don't change the direction in frames, in which the siderunner isn't moving:
         if change == 0:
             return
-        self.direction = self.getDirection()
-        if self.direction == "stop":
-            return
-        if self.direction == "left":
-            self.spos_x -= change
-        if self.direction == "right":
-            self.spos_x += change
-        if self.direction == "up":
-            self.spos_y -= change
-        if self.direction == "down":
-            self.spos_y += change
+        # Decisions are only needed at the end of a segment, or if the
+        # line under the siderunner has changed:
+        if self.steps is None or self.segmentindex >= len(self.steps) or not self.linegraph.isValid(self.segment, self.steps):
+            self.direction = self.getDirection()
+            if self.direction == "stop":
+                self.steps = None
+                return
+            self.segment      = (self.spos_x, self.spos_y, self.direction)
+            self.steps        = self.linegraph.getSegment(self.spos_x, self.spos_y, self.direction)
+            self.segmentindex = 0
+        (self.spos_x, self.spos_y, self.direction) = self.steps[self.segmentindex]
+        self.segmentindex += 1
         self.setPosition()
 
 
+class LineRunnerSwarm(pygame.sprite.Sprite):
+    """ The LineRunners of swarm mode. They walk like LineRunners, but aren't
+        sprites of their own: Their positions, float counters and places in
+        their segments are kept in arrays, their directions and segments in
+        lists. update() moves them all in one loop, and draw() blits the one
+        image of them all with a single Surface.blits(). In the spatial hash
+        of the game, they are entered by their numbers, all at once after
+        they have moved. """
+
+    def __init__(self, game, starts, count):
+        pygame.sprite.Sprite.__init__(self)
+        self.game      = game
+        self.linegraph = game.playfield.linegraph
+        self.count     = count
+        # The starting points are used in turn, like those of the LineRunners:
+        self.starts     = [starts[i % len(starts)] for i in range(count)]
+        self.xs         = array.array("i", [0]) * count
+        self.ys         = array.array("i", [0]) * count
+        self.counters   = array.array("d", [0.]) * count
+        self.indexes    = array.array("i", [0]) * count
+        self.directions = [None] * count
+        self.segments   = [None] * count
+        self.steps      = [None] * count
+        self.image      = createLineRunnerImage()
+        self.rects      = [self.image.get_rect() for i in range(count)]
+        # Where the swarm has been drawn last:
+        self.drawnrects = []
+
+    def initPositions(self):
+        for i in range(self.count):
+            (initside, self.directions[i]) = self.starts[i]
+            (self.xs[i], self.ys[i]) = getLineRunnerStart(initside)
+            self.steps[i] = None
+            self.setPosition(i)
+
+    def setPosition(self, i):
+        rect = self.rects[i]
+        rect.x = (self.xs[i] + BORDER_X) * SCALEFACTOR - 0.25 * rect.width
+        rect.y = (self.ys[i] + BORDER_Y) * SCALEFACTOR - 0.25 * rect.height
+        self.game.spatialhash.move(i, rect)
+
+    def update(self):
+        if self.game.state == "level":
+            self.move()
+
+    def move(self):
+        # LineRunner.move() for all of them. Everything, that is used in the
+        # loop, is looked up only once:
+        (xs, ys, counters, indexes) = (self.xs, self.ys, self.counters, self.indexes)
+        (directions, segments, stepslist) = (self.directions, self.segments, self.steps)
+        (getWays, getSegment, isValid) = (self.linegraph.getWays, self.linegraph.getSegment, self.linegraph.isValid)
+        randrange = self.game.random.randrange
+        speed     = LINERUNNERSSPEED * self.game.clocktick
+        rects     = self.rects
+        offset_x  = BORDER_X * SCALEFACTOR - 0.25 * self.image.get_width()
+        offset_y  = BORDER_Y * SCALEFACTOR - 0.25 * self.image.get_height()
+        for i in range(self.count):
+            # Like MySprite.getChange():
+            counter = counters[i] + speed
+            if counter < 1:
+                counters[i] = counter
+                continue
+            counters[i] = 0. if counter >= 2 else counter - 1
+            steps = stepslist[i]
+            index = indexes[i]
+            if steps is None or index >= len(steps) or not isValid(segments[i], steps):
+                (x, y) = (xs[i], ys[i])
+                ways = getWays(x, y, directions[i])
+                if not ways:
+                    directions[i] = "stop"
+                    stepslist[i]  = None
+                    continue
+                direction     = ways[0] if len(ways) == 1 else ways[randrange(len(ways))]
+                segments[i]   = (x, y, direction)
+                steps         = getSegment(x, y, direction)
+                stepslist[i]  = steps
+                index         = 0
+            (x, y, directions[i]) = steps[index]
+            (xs[i], ys[i]) = (x, y)
+            indexes[i] = index + 1
+            # Like setPosition():
+            rect   = rects[i]
+            rect.x = x * SCALEFACTOR + offset_x
+            rect.y = y * SCALEFACTOR + offset_y
+        self.game.spatialhash.moveAll(range(self.count), rects)
+
+    def getLeftRects(self):
+        # The places, that LineRunners have left, since the swarm was drawn.
+        # Where many of them are on the same place, it is needed only once:
+        rects = {}
+        for (old, new) in zip(self.drawnrects, self.rects):
+            if old != new:
+                rects[tuple(old)] = old
+        return rects.values()
+
+    def draw(self, screen):
+        image = self.image
+        self.drawnrects = screen.blits([(image, rect) for rect in self.rects])
+        return self.drawnrects
+
+
 #####################################
 # Sprite Groups:
 
@@ -643,79 +2280,101 @@ class LineRunnersGroup(pygame.sprite.Group):
         for i in range(2):
             for u in a:
                 self.lrdata.append(u)
+        # The LineRunnerSwarm in swarm mode:
+        self.swarm = None
+
+    def setSwarm(self, swarm):
+        self.swarm = swarm
 
     def initPositions(self):
         for s in self.sprites():
             s.initSettings()
+        if self.swarm is not None:
+            self.swarm.initPositions()
 
 
 #####################################
 # Text Class:
 
-class Text(pygame.sprite.Sprite):
+def getTextScale():
+    # The texts are laid out for the window of the normal playfield,
+    # 160 cells with SCALEFACTOR 5. In wider windows, they are larger:
+    return max(1, SCREENSIZE_X * SCALEFACTOR // (160 * TEXTLAYOUTSCALE))
+
+def getTextPosition(spos_x, spos_y):
+    # Texts are placed in cells of TEXTLAYOUTSCALE pixels:
+    unit = TEXTLAYOUTSCALE * getTextScale()
+    return (BORDER_X * SCALEFACTOR + spos_x * unit, BORDER_Y * SCALEFACTOR + spos_y * unit)
+
+class Text(pygame.sprite.DirtySprite):
 
     def __init__(self, text, colorname, spos_x, spos_y, scalefactor):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
         # self.game      = game
         self.text        = text
         self.colorname   = colorname
         self.scalefactor = scalefactor
-        self.fontdata    = VGAFont()
-        self.pointrect = pygame.Rect((0, 0), (self.scalefactor, self.scalefactor))
+        self.pixelscale  = scalefactor * getTextScale()
         self.createImage()
         self.initSettings(spos_x, spos_y)
 
     def setText(self, text):
-        self.text = text
-        self.drawLetters()
+        # The letters are drawn, when the text is shown next:
+        self.text    = text
+        self.changed = True
+        self.dirty   = 1
 
     def createImage(self):
-        self.image = pygame.Surface((len(self.text) * 8 * self.scalefactor, 8 * self.scalefactor))
-        self.image = self.image.convert()
-        self.rect  = self.image.get_rect()
-        self.drawLetters()
+        self.surface = None
+        self.changed = True
+        self.rect    = pygame.Rect(0, 0, len(self.text) * 8 * self.pixelscale, 8 * self.pixelscale)
+
+    def getImage(self):
+        # Texts are drawn only, when they are shown. So texts, that aren't
+        # visible yet, cost nothing, and neither do changes in between:
+        if self.changed:
+            self.drawLetters()
+        return self.surface
+
+    image = property(getImage)
 
     def drawLetters(self):
-        self.image.fill(COLORS["black"])
-        indent = 0
-        for s in self.text:
-            for y in range(8):
-                b = "{0:08b}".format(self.fontdata.vgafont[s][y])
-                for x in range(8):
-                    if b[x] == "1":
-                        self.pointrect.topleft = ((indent + x) * self.scalefactor, y * self.scalefactor)
-                        pygame.draw.rect(self.image, COLORS[self.colorname], self.pointrect)
-            indent += 8
-        self.image.set_colorkey(COLORS["black"])
+        if self.surface is None:
+            self.surface = convertSurface(pygame.Surface(self.rect.size))
+        self.surface.fill(COLORS["black"])
+        width = 8 * self.pixelscale
+        self.surface.blits([(getGlyph(self.text[i], self.pixelscale, self.colorname), (i * width, 0))
+                            for i in range(len(self.text))], False)
+        self.surface.set_colorkey(COLORS["black"])
+        self.changed = False
 
     def initSettings(self, spos_x, spos_y):
         self.spos_x = spos_x
         self.spos_y = spos_y
-        self.rect.x = (self.spos_x + BORDER_X) * SCALEFACTOR
-        self.rect.y = (self.spos_y + BORDER_Y) * SCALEFACTOR
+        self.rect.topleft = getTextPosition(self.spos_x, self.spos_y)
+        self.dirty  = 1
 
     def draw(self, screen):
         screen.blit(self.image, self.rect)
 
 
-class MultilineText(pygame.sprite.Sprite):
+class MultilineText(pygame.sprite.DirtySprite):
 
     def __init__(self, textlist, paragraph, colorname, spos_x, spos_y, scalefactor):
-        pygame.sprite.Sprite.__init__(self)
+        pygame.sprite.DirtySprite.__init__(self)
         self.textlist = textlist
         self.paragraph = paragraph
         self.colorname   = colorname
         self.scalefactor = scalefactor
-        self.fontdata    = VGAFont()
-        self.pointrect = pygame.Rect((0, 0), (self.scalefactor, self.scalefactor))
+        self.pixelscale  = scalefactor * getTextScale()
         self.createImage()
         self.initSettings(spos_x, spos_y)
 
     def initSettings(self, spos_x, spos_y):
         self.spos_x = spos_x
         self.spos_y = spos_y
-        self.rect.x = (self.spos_x + BORDER_X) * SCALEFACTOR
-        self.rect.y = (self.spos_y + BORDER_Y) * SCALEFACTOR
+        self.rect.topleft = getTextPosition(self.spos_x, self.spos_y)
+        self.dirty  = 1
 
     def getDimensions(self):
         max = 0
@@ -726,26 +2385,29 @@ class MultilineText(pygame.sprite.Sprite):
 
     def createImage(self):
         dimensions = self.getDimensions()
-        self.image = pygame.Surface((dimensions[0] * 8 * self.scalefactor, dimensions[1] * self.scalefactor * (8 + self.paragraph)))
-        self.image = self.image.convert()
-        self.rect  = self.image.get_rect()
-        self.drawStrings()
+        self.surface = None
+        self.rect    = pygame.Rect(0, 0, dimensions[0] * 8 * self.pixelscale, dimensions[1] * self.pixelscale * (8 + self.paragraph))
+
+    def getImage(self):
+        # Like a Text, drawn when it's shown first:
+        if self.surface is None:
+            self.drawStrings()
+        return self.surface
+
+    image = property(getImage)
 
     def drawStrings(self):
-        self.image.fill(COLORS["black"])
+        self.surface = convertSurface(pygame.Surface(self.rect.size))
+        self.surface.fill(COLORS["black"])
+        width = 8 * self.pixelscale
+        blits = []
         newline = 0
         for t in self.textlist:
-            indent  = 0
-            for s in t:
-                for y in range(8):
-                    b = "{0:08b}".format(self.fontdata.vgafont[s][y])
-                    for x in range(8):
-                        if b[x] == "1":
-                            self.pointrect.topleft = ((indent + x) * self.scalefactor, (newline + y) * self.scalefactor)
-                            pygame.draw.rect(self.image, COLORS[self.colorname], self.pointrect)
-                indent += 8
+            for i in range(len(t)):
+                blits.append((getGlyph(t[i], self.pixelscale, self.colorname), (i * width, newline * self.pixelscale)))
             newline += self.paragraph
-        self.image.set_colorkey(COLORS["black"])
+        self.surface.blits(blits, False)
+        self.surface.set_colorkey(COLORS["black"])
 
 
 class VGAFont:
@@ -857,6 +2519,150 @@ class VGAFont:
                         "y" : (0, 0, 204, 204, 204, 124, 12, 248),
                         "z" : (0, 0, 252, 152, 48, 100, 252, 0)}
 
+#####################################
+# Glyph Cache:
+
+# The characters of the VGAFont as surfaces, scaled and colored, shared by all
+# texts. Keys are (character, scalefactor, colorname):
+GLYPHS   = {}
+FONTDATA = None
+
+def getGlyph(character, scalefactor, colorname):
+    global FONTDATA
+    key = (character, scalefactor, colorname)
+    if key in GLYPHS:
+        return GLYPHS[key]
+    # Drawn only once, at the size of the font, then scaled:
+    if FONTDATA is None:
+        FONTDATA = VGAFont().vgafont
+    glyph = pygame.Surface((8, 8))
+    glyph.fill(COLORS["black"])
+    for y in range(8):
+        row = FONTDATA[character][y]
+        for x in range(8):
+            if row & (0x80 >> x):
+                glyph.set_at((x, y), COLORS[colorname])
+    glyph = convertSurface(pygame.transform.scale(glyph, (8 * scalefactor, 8 * scalefactor)))
+    GLYPHS[key] = glyph
+    return glyph
+
+
+#####################################
+# Performance HUD:
+
+class PerformanceHUD:
+    """ An overlay with the current, average and 99th-percentile frame time,
+        the time of every phase of Game.frame() and of the last fillArea()
+        and updatePlayfieldSprite(), and the simulation ticks dropped and
+        the frames skipped so far. Captures, that are spread over several
+        frames, go on in continueCapture() and Capture.run(), so these are
+        timed as "fillArea" too.
+
+        While it is shown, these methods are timed by wrappers, that are put
+        on the objects (on the class for Capture, as there is a new one for
+        every capture). When it is hidden, the wrappers are removed again,
+        so that it costs nothing. """
+
+    phases   = ("checkKeys", "checkGameState", "updateSprites", "drawSprites", "flipDisplay")
+    # Frames, the frame times are kept for:
+    frames   = 600
+    # Frames between two updates of the texts (drawing them takes time too):
+    interval = 30
+
+    def __init__(self, game):
+        self.game       = game
+        self.visible    = False
+        self.wrapped    = []
+        self.frametimes = collections.deque(maxlen = self.frames)
+        self.phasetimes = dict.fromkeys(self.phases, 0.)
+        self.lasttimes  = {"fillArea" : 0., "updatePlayfieldSprite" : 0.}
+        self.lastframe  = None
+        self.counter    = 0
+        self.texts = []
+        for i in range(2 + len(self.phases) + len(self.lasttimes)):
+            self.texts.append(Text(" " * 32, "bright_yellow", 1, 8 + 2 * i, 1))
+        self.rect = self.texts[0].rect.unionall([i.rect for i in self.texts])
+
+    def toggle(self):
+        if self.visible:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        self.frametimes.clear()
+        self.lastframe = None
+        self.counter   = 0
+        for i in self.phases:
+            self.phasetimes[i] = 0.
+            self.wrap(self.game, i, self.phasetimes, True)
+        self.wrap(self.game.playfield, "fillArea", self.lasttimes, False)
+        self.wrap(self.game.playfield, "continueCapture", self.lasttimes, False, "fillArea")
+        self.wrap(Capture, "run", self.lasttimes, False, "fillArea")
+        self.wrap(self.game.playfieldsprite, "updatePlayfieldSprite", self.lasttimes, False)
+        self.setTexts()
+        self.visible = True
+
+    def hide(self):
+        for (obj, name, function) in self.wrapped:
+            if isinstance(obj, type):
+                setattr(obj, name, function)
+            else:
+                delattr(obj, name)
+        self.wrapped = []
+        self.visible = False
+
+    def wrap(self, obj, name, times, add, bucket = None):
+        # Puts a timing wrapper on the object, in front of its method.
+        # The times are added up for the phases, or the last one is kept.
+        # They go to "bucket", if given, else to the method's name. Calls
+        # within each other in the same bucket leave the outermost time:
+        function = getattr(obj, name)
+        if bucket is None:
+            bucket = name
+        def timed(*args, **kwargs):
+            starttime = time.perf_counter()
+            result = function(*args, **kwargs)
+            if add:
+                times[bucket] += time.perf_counter() - starttime
+            else:
+                times[bucket] = time.perf_counter() - starttime
+            return result
+        setattr(obj, name, timed)
+        self.wrapped.append((obj, name, function))
+
+    def setTexts(self):
+        # Times in milliseconds, the phases as average per frame:
+        frametimes = sorted(self.frametimes)
+        if frametimes:
+            current = self.frametimes[-1] * 1000
+            average = sum(frametimes) * 1000 / len(frametimes)
+            p99     = frametimes[min(len(frametimes) - 1, int(len(frametimes) * 0.99))] * 1000
+        else:
+            current = average = p99 = 0.
+        lines = ["frame {0:5.1f} avg{1:5.1f} p99{2:5.1f} ms".format(current, average, p99)]
+        for i in self.phases:
+            lines.append("{0:<22}{1:6.2f} ms".format(i, self.phasetimes[i] * 1000 / max(1, self.counter)))
+            self.phasetimes[i] = 0.
+        for i in self.lasttimes:
+            lines.append("{0:<22}{1:6.2f} ms".format(i, self.lasttimes[i] * 1000))
+        lines.append("ticks dropped{0:6d} skipped{1:5d}".format(self.game.droppedticks, self.game.skippedframes))
+        for i in range(len(lines)):
+            self.texts[i].setText(lines[i])
+        self.counter = 0
+
+    def draw(self, screen):
+        now = time.perf_counter()
+        if self.lastframe is not None:
+            self.frametimes.append(now - self.lastframe)
+        self.lastframe = now
+        self.counter += 1
+        if self.counter >= self.interval:
+            self.setTexts()
+        for i in self.texts:
+            i.draw(screen)
+
+
 #####################################
 # InputHandler:
 
@@ -868,17 +2674,18 @@ class InputHandler:
                       pygame.K_UP    : "up",   pygame.K_DOWN    : "down",
                       pygame.K_LCTRL : "fire", pygame.K_RCTRL   : "fire",
                       pygame.K_q     : "quit", pygame.K_ESCAPE : "quit",
-                      pygame.K_RETURN : "return" }
+                      pygame.K_RETURN : "return", pygame.K_F3 : "hud",
+                      pygame.K_BACKSPACE : "rewind" }
 
         self.datakeys = self.data.keys()
         self.datavalues = self.data.values()
 
+        # The joystick is initialized by initJoystick(), after the first frame:
         self.joystick = {}
-        if JOYSTICKNUMBER > 0:
-            self.initJoystick()
         self.initKeys()
 
     def initJoystick(self):
+        pygame.joystick.init()
         if pygame.joystick.get_count() == 0:
             print("No joysticks found.")
             return
@@ -896,7 +2703,8 @@ class InputHandler:
 
     def getKeyboardAndJoystickAction(self):
         action = {"left" : False, "right" : False, "up" : False, "down" : False,
-                  "fire" : False, "quit" : False, "return" : False}
+                  "fire" : False, "quit" : False, "return" : False, "hud" : False,
+                  "rewind" : False}
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 action["quit"] = True
@@ -909,7 +2717,8 @@ class InputHandler:
                 for i in self.keypresses:
                     if event.key == i:
                         self.keypresses[i] = False
-            if JOYSTICKNUMBER > 0:
+            # Only if a joystick has been found:
+            if self.joystick:
                 if event.type == pygame.JOYBUTTONDOWN:
                     self.joystick["fire"] = True
                 if event.type == pygame.JOYBUTTONUP:
@@ -937,7 +2746,7 @@ class InputHandler:
             if self.keypresses[i]:
                 action[self.data[i]] = True
 
-        if JOYSTICKNUMBER > 0:
+        if self.joystick:
             for i in self.datavalues:
                 if i == "quit":
                     continue
@@ -947,119 +2756,492 @@ class InputHandler:
 
 
 #####################################
-# Game / Main Class:
+# Sounds:
+
+# Next to the script, wherever the game is started from:
+SOUNDDIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds")
+SOUNDNAMES = ("start", "wall", "fill", "levelcompleted", "level2", "explosion", "end")
+
+class SoundLoader:
+    """ Loads the sounds in a background thread, so that the game can start
+        at once. Sounds, that aren't loaded yet, are missing in "sounds".
+
+        Decoding the MP3-files takes most of the time. So the decoded samples
+        are cached in the subdirectory "cache". A cached sound is only used,
+        if its MP3-file hasn't changed since (same mtime and size), and if
+        the mixer is set up the same way.
+
+        The mixer has to be started before, in the main thread. The thread
+        only decodes the sounds and reads and writes the cache. """
+
+    cachemagic = b"PQXS"
+
+    def __init__(self, sounddir):
+        self.sounddir = sounddir
+        self.cachedir = os.path.join(sounddir, "cache")
+        self.sounds   = {}
+        self.thread   = threading.Thread(target = self.loadSounds, daemon = True)
+        self.thread.start()
+
+    def loadSounds(self):
+        for i in SOUNDNAMES:
+            try:
+                self.sounds[i] = self.loadSound(i)
+            except (pygame.error, OSError) as e:
+                print("Sound '" + i + "' could not be loaded: " + str(e))
+
+    def loadSound(self, name):
+        filename  = os.path.join(self.sounddir, name + ".mp3")
+        cachename = os.path.join(self.cachedir, name + ".pcm")
+        stat   = os.stat(filename)
+        header = self.cachemagic + struct.pack("<qqiii", stat.st_mtime_ns, stat.st_size, *pygame.mixer.get_init())
+        try:
+            with open(cachename, "rb") as fh:
+                if fh.read(len(header)) == header:
+                    return pygame.mixer.Sound(buffer = fh.read())
+        except OSError:
+            pass
+        sound = pygame.mixer.Sound(filename)
+        self.writeCache(cachename, header, sound.get_raw())
+        return sound
+
+    def writeCache(self, cachename, header, samples):
+        # Written to a temporary file first, so that another game starting
+        # at the same time never reads half a file:
+        tempname = cachename + "." + str(os.getpid())
+        try:
+            os.makedirs(self.cachedir, exist_ok = True)
+            with open(tempname, "wb") as fh:
+                fh.write(header)
+                fh.write(samples)
+            os.replace(tempname, cachename)
+        except OSError:
+            # Not writable. Then the sounds are decoded every time:
+            pass
 
-class Game:
 
-    def __init__(self):
-        os.environ['SDL_VIDEO_WINDOW_POS'] = str(WINDOWPOSITION_X) + ", " + str(WINDOWPOSITION_Y)
-        if SOUND:
-            pygame.mixer.pre_init(44100, -16, 1, 512)
-        pygame.init()
-        self.screen = pygame.display.set_mode((SCREENSIZE_X * SCALEFACTOR + 2 * BORDER_X * SCALEFACTOR, SCREENSIZE_Y * SCALEFACTOR + 2 * BORDER_Y * SCALEFACTOR))
-        pygame.display.set_caption("PyQueex")
-        self.clock = pygame.time.Clock()
-        self.ih = InputHandler()
-        self.keyaction = {}
+#####################################
+# Input Recording:
+
+# A recording starts with a header: MAGIC, the version, a byte of flags
+# (1 = fixed-timestep mode) and the random seed. Then come runs of equal
+# frames, each as two varints: the actions as bits (in the order of
+# Simulation.actionnames) plus the frame time in milliseconds shifted
+# above them, and the number of frames in the run.
+
+RECORDINGMAGIC   = b"PQXR"
+# Version 2 added the size of the playfield:
+RECORDINGVERSION = 2
+
+def writeVarint(fh, n):
+    # 7 bits per byte, the highest bit set on all bytes but the last:
+    b = bytearray()
+    while n >= 0x80:
+        b.append((n & 0x7f) | 0x80)
+        n >>= 7
+    b.append(n)
+    fh.write(b)
+
+def readVarint(fh):
+    n = 0
+    shift = 0
+    while True:
+        b = fh.read(1)
+        if not b:
+            return None
+        n |= (b[0] & 0x7f) << shift
+        if b[0] < 0x80:
+            return n
+        shift += 7
+
+class InputRecorder:
+    """ Writes the actions and the time of every frame to a file. Only the
+        current run of equal frames is held in memory, so long sessions
+        don't need more of it. """
+
+    def __init__(self, filename, seed, fixedtimestep):
+        self.fh = open(filename, "wb")
+        self.fh.write(RECORDINGMAGIC + bytes((RECORDINGVERSION, int(fixedtimestep))))
+        writeVarint(self.fh, seed)
+        writeVarint(self.fh, SCREENSIZE_X)
+        writeVarint(self.fh, SCREENSIZE_Y)
+        self.frame = None
+        self.run   = 0
+
+    def write(self, action, clocktick):
+        frame = int(clocktick) << len(Simulation.actionnames)
+        for i in range(len(Simulation.actionnames)):
+            if action[Simulation.actionnames[i]]:
+                frame |= 1 << i
+        if frame == self.frame:
+            self.run += 1
+            return
+        self.writeRun()
+        self.frame = frame
+        self.run   = 1
+
+    def writeRun(self):
+        if self.run > 0:
+            writeVarint(self.fh, self.frame)
+            writeVarint(self.fh, self.run)
+
+    def close(self):
+        self.writeRun()
+        self.run = 0
+        self.fh.close()
+
+class InputPlayer:
+    """ Reads a file of the InputRecorder frame by frame. """
+
+    def __init__(self, filename):
+        self.fh = open(filename, "rb")
+        header = self.fh.read(len(RECORDINGMAGIC) + 2)
+        if header[:len(RECORDINGMAGIC)] != RECORDINGMAGIC:
+            raise ValueError("'" + filename + "' is not a PyQueex recording.")
+        version = header[len(RECORDINGMAGIC)]
+        if version not in (1, RECORDINGVERSION):
+            raise ValueError("Unknown version of the recording '" + filename + "'.")
+        self.fixedtimestep = bool(header[len(RECORDINGMAGIC) + 1] & 1)
+        self.seed  = readVarint(self.fh)
+        self.size  = (160, 100)
+        if version >= 2:
+            self.size = (readVarint(self.fh), readVarint(self.fh))
+        self.frame = None
+        self.run   = 0
+
+    def read(self):
+        # Returns the action-dictionary and the time of the next frame,
+        # or None at the end of the recording:
+        if self.run == 0:
+            self.frame = readVarint(self.fh)
+            self.run   = readVarint(self.fh)
+            if self.frame is None or self.run is None:
+                self.run = 0
+                return None
+        self.run -= 1
+        action = {}
+        for i in range(len(Simulation.actionnames)):
+            action[Simulation.actionnames[i]] = bool(self.frame & (1 << i))
+        return (action, self.frame >> len(Simulation.actionnames))
+
+    def close(self):
+        self.fh.close()
+
+
+#####################################
+# Rewind:
+
+def xorBytes(a, b):
+    # The bytes of a and b (of the same length) XORed, as one long integer:
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+class RewindBuffer:
+    """ The last REWINDSECONDS of a level, to go back in them frame by frame.
+        A snapshot of every frame has the Player, the Opponent and the
+        LineRunners, the lives and the state packed into arrays. Of the
+        playfield, it only has the regions, that have changed in the frame,
+        as the XOR of their cells before and after it (compressed, if they
+        are large). XORing them again gives the cells before. So the
+        playfield is gone back from the current one, delta by delta, and
+        no whole copies of it are needed. To have the cells before, the
+        buffer keeps a copy of the playfield as one bytearray, which is
+        updated by the deltas.
+        The snapshots are in a deque with a maxlen, so the oldest ones fall
+        out, and the memory is bounded. The Player's trail only ever grows
+        between its clear()s, so the snapshots share its list of cells. """
+
+    states = ("getready", "level", "playerexplosion", "completed")
+    directions = ("left", "right", "up", "down", "stop")
+    # Deltas, that are larger, are compressed:
+    compresssize = 64
+
+    def __init__(self, game, seconds, rate):
+        # "rate" is the number of snapshots per second:
+        self.game      = game
+        self.snapshots = collections.deque(maxlen = max(2, int(seconds * rate)))
+        self.cells     = bytearray(self.getCells((0, 0, SCREENSIZE_X - 1, SCREENSIZE_Y - 1)))
+        # The regions, that have changed since the last snapshot:
+        self.changed   = []
+        self.level     = None
+
+    def getCells(self, region):
+        (x0, y0, x1, y1) = region
+        playfield = self.game.playfield
+        return b"".join(bytes(playfield.getRow(x0, x1, y)) for y in range(y0, y1 + 1))
+
+    def getCopiedCells(self, region):
+        (x0, y0, x1, y1) = region
+        return b"".join(self.cells[y * SCREENSIZE_X + x0 : y * SCREENSIZE_X + x1 + 1] for y in range(y0, y1 + 1))
+
+    def setCopiedCells(self, region, cells):
+        (x0, y0, x1, y1) = region
+        width = x1 - x0 + 1
+        for y in range(y0, y1 + 1):
+            self.cells[y * SCREENSIZE_X + x0 : y * SCREENSIZE_X + x1 + 1] = cells[(y - y0) * width : (y - y0 + 1) * width]
+
+    def cellsChanged(self, region):
+        self.changed.append(region)
+
+    def playfieldReset(self):
+        # A new playfield can't be gone back from. So it is copied, and
+        # the snapshots are dropped:
+        self.cells = bytearray(self.getCells((0, 0, SCREENSIZE_X - 1, SCREENSIZE_Y - 1)))
+        self.changed = []
+        self.snapshots.clear()
+
+    def getDeltas(self):
+        deltas = []
+        for region in self.changed:
+            new = self.getCells(region)
+            old = self.getCopiedCells(region)
+            if new == old:
+                continue
+            self.setCopiedCells(region, new)
+            delta = xorBytes(old, new)
+            if len(delta) > self.compresssize:
+                deltas.append((region, True, zlib.compress(delta, 1)))
+            else:
+                deltas.append((region, False, delta))
+        self.changed = []
+        return tuple(deltas)
+
+    def save(self):
+        # Called after every frame. The frames, in which a capture is going
+        # on, can't be gone back to. Their changes go into the next snapshot:
+        if self.game.playfield.capture is not None:
+            return
+        deltas = self.getDeltas()
+        game = self.game
+        if game.state not in self.states:
+            self.snapshots.clear()
+            return
+        # A new level has other LineRunners, and starts from an empty playfield:
+        if game.level != self.level:
+            self.snapshots.clear()
+            self.level = game.level
+        self.snapshots.append((deltas,) + self.getSprites())
+
+    def getSprites(self):
+        game     = self.game
+        player   = game.player
+        opponent = game.opponent
+        ints = [self.states.index(game.state), player.lives,
+                game.counters["getready"], game.counters["completed"],
+                player.spos_x, player.spos_y, int(player.drawing), len(player.trail), player.shimmermode]
+        ints += player.colorlist
+        ints += [opponent.spos_x, opponent.spos_y,
+                 self.directions.index(opponent.direction[0]), self.directions.index(opponent.direction[1])]
+        floats = [player.floatcounter, opponent.floatcounter]
+        for i in game.linerunners:
+            ints += [i.spos_x, i.spos_y, self.directions.index(i.direction)]
+            floats.append(i.floatcounter)
+        swarm = game.linerunners.swarm
+        if swarm is not None:
+            ints += swarm.xs
+            ints += swarm.ys
+            ints += [self.directions.index(i) for i in swarm.directions]
+            floats += swarm.counters
+        return (array.array("i", ints).tobytes(), array.array("d", floats).tobytes(), player.trail.cells)
+
+    def rewind(self):
+        """ Goes back one frame. Returns False, if there is none. """
+        if len(self.snapshots) < 2 or self.game.playfield.capture is not None:
+            return False
+        deltas = self.snapshots.pop()[0]
+        for (region, compressed, delta) in reversed(deltas):
+            if compressed:
+                delta = zlib.decompress(delta)
+            cells = xorBytes(self.getCopiedCells(region), delta)
+            self.setCopiedCells(region, cells)
+            self.game.playfield.setCells(region, cells)
+        self.setSprites(*self.snapshots[-1][1:])
+        return True
+
+    def setSprites(self, ints, floats, trailcells):
+        game     = self.game
+        player   = game.player
+        opponent = game.opponent
+        ints   = array.array("i", ints)
+        floats = array.array("d", floats)
+        game.state   = self.states[ints[0]]
+        player.lives = ints[1]
+        (game.counters["getready"], game.counters["completed"]) = ints[2:4]
+        (player.spos_x, player.spos_y) = ints[4:6]
+        player.drawing = bool(ints[6])
+        player.line.setColor("magenta" if player.drawing else "white")
+        player.trail.clear()
+        for i in trailcells[:ints[7]]:
+            player.trail.add(*i)
+        player.shimmermode = ints[8]
+        player.colorlist   = list(ints[9:12])
+        player.drawCircle()
+        player.setPosition()
+        (opponent.spos_x, opponent.spos_y) = ints[12:14]
+        opponent.direction = [self.directions[ints[14]], self.directions[ints[15]]]
+        opponent.setPosition()
+        (player.floatcounter, opponent.floatcounter) = floats[:2]
+        i = 16
+        j = 2
+        for linerunner in game.linerunners:
+            (linerunner.spos_x, linerunner.spos_y) = ints[i : i + 2]
+            linerunner.direction    = self.directions[ints[i + 2]]
+            linerunner.floatcounter = floats[j]
+            # The segment is looked up again on the next move:
+            linerunner.steps = None
+            linerunner.setPosition()
+            i += 3
+            j += 1
+        swarm = game.linerunners.swarm
+        if swarm is not None:
+            count = swarm.count
+            swarm.xs[:] = array.array("i", ints[i : i + count])
+            swarm.ys[:] = array.array("i", ints[i + count : i + 2 * count])
+            swarm.directions = [self.directions[d] for d in ints[i + 2 * count : i + 3 * count]]
+            swarm.counters[:] = array.array("d", floats[j : j + count])
+            for k in range(count):
+                swarm.steps[k] = None
+                swarm.setPosition(k)
+
+
+#####################################
+# Simulation:
+
+class Simulation:
+    """ The game logic without a window, sound or a clock: the playfield,
+        the sprites that move on it, and the states of the game.
+
+        reset() starts a new game, step() advances it by one frame:
+
+            sim = Simulation()
+            sim.reset()
+            while sim.state != "lost":
+                sim.step({"up" : True}, 17)
+
+        Or, in fixed-timestep mode, advance() steps it in ticks of
+        TICKLENGTH milliseconds. All random numbers come from self.random,
+        so a game with the same seed and the same actions in each tick
+        always plays the same.
+
+        Game extends this by the display, the texts and the sounds,
+        and overrides the hooks playSound(), textChanged(),
+        playfieldChanged(), lineDrawn() and extraLifeShown(). """
+
+    actionnames = ("left", "right", "up", "down", "fire", "quit", "return")
+
+    def __init__(self, seed = None):
+        self.random = random.Random()
+        if seed is None:
+            seed = RANDOMSEED
+        self.setSeed(seed)
+        self.clocktick = 0
+        self.accumulator  = 0
+        self.droppedticks = 0
+        self.keyaction = dict.fromkeys(self.actionnames, False)
         self.counters = {"getready"  : GETREADYTIME,
                          "completed" : COMPLETEDTIME,
                          "gameover"  : GAMEOVERTIME}
-        self.playfield = Playfield()
+        self.playfield = createPlayfield()
+        # The LineRunners, for the collisions with the Player:
+        self.spatialhash = SpatialHash(BUCKETSIZE * SCALEFACTOR)
         self.initSprites()
-        if SOUND:
-            self.initSounds()
-        self.state   = "intro"
-        self.running = True
-        while self.running:
-            self.clocktick = self.clock.tick(FPS)
-            self.checkKeys()
-            self.screen.fill(COLORS["grey"])
-            self.checkGameState()
-
-            self.spritegroups[self.state].update()
-            self.spritegroups[self.state].draw(self.screen)
-
-            pygame.display.flip()
-        pygame.quit()
+        self.state = "intro"
 
     def initSprites(self):
         # Create sprites:
-        self.playfieldsprite      = PlayfieldSprite(self, self.playfield)
         self.player               = Player(self, self.playfield)
         self.opponent             = Opponent(self, self.playfield, self.player)
         self.player.setOpponent(self.opponent)
-        self.texts                = {}
-        self.texts["intro"]       = Text("PyQueex",
-                                         "bright_white",
-                                         60, 15,
-                                         3)
-        self.texts["intro_story"] = MultilineText(("The evil green-rectangle-mutant",
-                                                   "wants to kill you, his creator!",
-                                                   "Try to wall it in, before it gets you,",
-                                                   "or you'll be chicken feed!"),
-                                                   16,
-                                                   "green",
-                                                   25, 30,
-                                                   2)
-        self.texts["intro_return"] = Text("Press \"Return\" to play.",
-                                          "bright_white",
-                                          40, 60,
-                                          2)
-        self.texts["intro_author"] = Text("Written by H. Lubenow, (C) 2023, GNU GPL.",
-                                          "white",
-                                          15, 80,
-                                          2)
-        self.texts["gr_level"]     = Text("Level 999",
-                                          "cyan",
-                                          65, 10,
-                                          3)
-        self.texts["getready"]     = Text("GET READY",
-                                          "bright_white",
-                                          60, 20,
-                                          3)
-        self.texts["completed"]    = Text("Level 900 Completed",
-                                          "bright_white",
-                                          40, 20,
-                                          3)
-        self.texts["lost"]         = Text("GAME OVER",
-                                          "bright_white",
-                                          60, 35,
-                                          3)
-        self.texts["press_return"] = Text("Press \"Return\" to play again.",
-                                          "bright_white",
-                                          36, 50,
-                                          2)
-        self.texts["livestext"]    = Text("Lives: ",
-                                          "bright_white",
-                                          3, 3,
-                                          2)
-        self.texts["lives"]        = Text(str(PLAYERLIVES),
-                                         "bright_white",
-                                         self.texts["livestext"].spos_x + 20,
-                                         self.texts["livestext"].spos_y,
-                                         self.texts["livestext"].scalefactor)
-        self.texts["percentage"]   = Text(" 0%",
-                                          "bright_white",
-                                          SCREENSIZE_X - 12, 3,
-                                          2)
-        self.texts["extra_life"]   = Text("Extra Life!",
-                                          "cyan",
-                                          65, 40,
-                                          2)
-        # Create groups:
+        # Create groups. These are the sprites, that are updated in each state:
         self.spritegroups = {}
-        for i in ("intro", "getready", "level", "playerexplosion", "completed", "lost", "infotexts"):
+        for i in ("intro", "getready", "level", "playerexplosion", "completed", "lost"):
             self.spritegroups[i] = pygame.sprite.Group()
         self.linerunners = LineRunnersGroup()
+        self.spritegroups["getready"].add(self.player, self.opponent)
+        self.spritegroups["level"].add(self.player, self.opponent)
+        self.spritegroups["playerexplosion"].add(self.player)
+        if LINERUNNERSWARM > 0:
+            self.linerunners.setSwarm(LineRunnerSwarm(self, self.linerunners.lrdata, LINERUNNERSWARM))
+            self.spritegroups["level"].add(self.linerunners.swarm)
+
+    def setSeed(self, seed = None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.random.seed(seed)
+
+    def reset(self, seed = None):
+        # Starts a new game, without the intro-screen.
+        # With a seed, the random numbers start anew too:
+        if seed is not None:
+            self.setSeed(seed)
+        self.accumulator = 0
+        self.startGame()
+
+    def step(self, actions, dt):
+        """ Advances the game by one frame. "actions" is a dictionary like
+            the one of the InputHandler, missing actions are False. "dt" is
+            the time of the frame in milliseconds. """
+        self.clocktick = dt
+        self.keyaction = dict.fromkeys(self.actionnames, False)
+        self.keyaction.update(actions)
 
-        # Put sprites in groups:
-        self.spritegroups["infotexts"].add(self.texts["livestext"], self.texts["lives"], self.texts["percentage"])
-        self.spritegroups["intro"].add(self.playfieldsprite, self.texts["intro"], self.texts["intro_story"], self.texts["intro_return"], self.texts["intro_author"])
-        self.spritegroups["getready"].add(self.playfieldsprite, self.player, self.opponent, self.texts["gr_level"], self.texts["getready"], self.spritegroups["infotexts"])
-        self.spritegroups["level"].add(self.playfieldsprite, self.player, self.opponent, self.spritegroups["infotexts"])
-        self.spritegroups["playerexplosion"].add(self.playfieldsprite, self.player, self.spritegroups["infotexts"])
-        self.spritegroups["completed"].add(self.playfieldsprite, self.texts["completed"], self.spritegroups["infotexts"])
-        self.spritegroups["lost"].add(self.playfieldsprite, self.texts["lost"])
+        # Start the game after the intro-screen, or restart it
+        # after having lost:
+        if self.state in ("intro", "lost"):
+            if self.keyaction["return"] or self.keyaction["fire"]:
+                self.startGame()
+
+        # A capture, that is spread over several frames, goes on first:
+        if self.playfield.capture is not None:
+            self.continueCapture()
+
+        self.checkGameState()
+        self.updateSprites()
+
+    def continueCapture(self):
+        self.playfield.continueCapture()
+        self.playfieldChanged()
+        self.textChanged("percentage", getPercentageText(self.playfield.getFilledPercentage()))
+
+    def updateSprites(self):
+        self.spritegroups[self.state].update()
+
+    def advance(self, actions, elapsed):
+        """ Fixed-timestep mode: Adds the elapsed milliseconds to the
+            accumulator and does a step() of TICKLENGTH for every full tick
+            in it. Returns the number of ticks done. """
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= TICKLENGTH:
+            if ticks == MAXTICKSPERFRAME:
+                # Too far behind to catch up. Drop the rest, but keep the
+                # part of a tick, that has already passed:
+                dropped = int(self.accumulator // TICKLENGTH)
+                self.droppedticks += dropped
+                self.accumulator  -= dropped * TICKLENGTH
+                break
+            self.step(actions, TICKLENGTH)
+            self.accumulator -= TICKLENGTH
+            ticks += 1
+        return ticks
+
+    # Hooks for the display and the sound. They do nothing here:
+
+    def playSound(self, name):
+        pass
+
+    def textChanged(self, name, text):
+        pass
+
+    def playfieldChanged(self, whole = False):
+        # Nothing to repaint, but the dirty regions mustn't pile up:
+        self.playfield.popDirtyRegions()
+
+    def lineDrawn(self, line):
+        pass
+
+    def extraLifeShown(self, shown):
+        pass
 
     def startGame(self):
         # Called after the intro-screen, or when restarting the game
@@ -1067,7 +3249,7 @@ class Game:
         self.level          = 1
         self.counters["gameover"] = GAMEOVERTIME
         self.player.lives         = PLAYERLIVES
-        self.texts["lives"].setText(str(self.player.lives))
+        self.textChanged("lives", str(self.player.lives))
         self.removeLinerunnersFromGroups()
         self.extralifeshown = False
         self.leveltwoplayed = 0
@@ -1078,35 +3260,27 @@ class Game:
         self.counters["completed"] = COMPLETEDTIME
         self.counters["getready"]  = GETREADYTIME
         self.playfield.initPlayfield()
-        self.playfieldsprite.updatePlayfieldSprite()
-        self.texts["gr_level"].setText("Level " + str(self.level))
-        self.texts["percentage"].setText(" 0%")
+        self.playfieldChanged(whole = True)
+        self.textChanged("gr_level", "Level " + str(self.level))
+        self.textChanged("percentage", getPercentageText(0))
         self.player.initSettings()
         self.opponent.initSettings()
-        # Increasing number of Siderunners from level 1 to 4:
-        if self.level >= 1 and self.level <= LINERUNNERSMAX:
+        # Increasing number of Siderunners from level 1 to 4
+        # (the swarm is there from the start):
+        if self.level >= 1 and self.level <= LINERUNNERSMAX and self.linerunners.swarm is None:
             self.addLineRunner()
         self.linerunners.initPositions()
         self.state = "getready"
 
-    def initSounds(self):
-        self.sounds = {}
-        sounddir = os.path.join(os.getcwd(), "sounds")
-        soundfilenames = ("start", "wall", "fill", "levelcompleted", "level2", "explosion", "end")
-        for i in soundfilenames:
-            self.sounds[i] = pygame.mixer.Sound(os.path.join(sounddir, i + ".mp3"))
-
-    def playSound(self, name):
-        if not SOUND:
-            return
-        self.sounds[name].play()
-
     def addLineRunner(self):
-        l = LineRunner(self, self.linerunners.lrdata[self.level - 1][0], self.linerunners.lrdata[self.level - 1][1])
+        # There are 8 different starting points. More siderunners start at the same ones again:
+        lrdata = self.linerunners.lrdata[(self.level - 1) % len(self.linerunners.lrdata)]
+        l = LineRunner(self, lrdata[0], lrdata[1])
         self.linerunners.add(l)
         self.spritegroups["level"].add(l)
         self.spritegroups["getready"].add(l)
         self.spritegroups["playerexplosion"].add(l)
+        return l
 
     def removeLinerunnersFromGroups(self):
         for l in self.linerunners.sprites():
@@ -1114,43 +3288,33 @@ class Game:
             self.spritegroups["getready"].remove(l)
             self.spritegroups["playerexplosion"].remove(l)
             self.linerunners.remove(l)
-
-    def checkKeys(self):
-        self.keyaction = self.ih.getKeyboardAndJoystickAction()
-        if self.keyaction["quit"]:
-            self.running = False
-
-        # Start the game after the intro-screen, or restart it
-        # after having lost:
-        if self.state in ("intro", "lost"):
-            if self.keyaction["return"] or self.keyaction["fire"]:
-                self.startGame()
+            self.spatialhash.remove(l)
 
     def setState(self, state, caller):
         self.state = state
 
         # Is called after the Player-"explosion":
         if self.state == "getready":
+            self.player.eraseTrail()
             self.player.initSettings()
             self.linerunners.initPositions()
-            self.playfield.deleteMagentaInPlayfield()
-            self.playfieldsprite.updatePlayfieldSprite()
+            self.playfieldChanged()
 
         # Is called by the Player or the Opponent due to collision:
         if self.state == "playerexplosion":
             self.player.lives -= 1
             self.playSound("explosion")
             self.linerunners.initPositions()
-            self.texts["lives"].setText(str(self.player.lives))
-            self.playfield.deleteMagentaInPlayfield()
-            self.playfieldsprite.updatePlayfieldSprite()
+            self.textChanged("lives", str(self.player.lives))
+            self.player.eraseTrail()
+            self.playfieldChanged()
 
     def checkGameState(self):
 
         if self.state == "level":
             # Level completed:
             if self.playfield.getFilledPercentage() >= WINNINGPERCENTAGE:
-                self.texts["completed"].setText("Level " + str(self.level) + " Completed")
+                self.textChanged("completed", "Level " + str(self.level) + " Completed")
                 self.state = "completed"
                 self.playSound("levelcompleted")
                 return
@@ -1161,8 +3325,8 @@ class Game:
                 self.level += 1
                 if self.level % EXTRALIFELEVEL == 0:
                     self.player.lives += 1
-                    self.texts["lives"].setText(str(self.player.lives))
-                    self.spritegroups["getready"].add(self.texts["extra_life"])
+                    self.textChanged("lives", str(self.player.lives))
+                    self.extraLifeShown(True)
                     self.extralifeshown = True
                     self.playSound("start")
                 self.initLevel()
@@ -1177,16 +3341,16 @@ class Game:
                     self.playSound("level2")
                     self.leveltwoplayed += 1
                 elif self.leveltwoplayed == 1:
-                    if random.randrange(10) < 3:
+                    if self.random.randrange(10) < 3:
                         self.playSound("level2")
                         self.leveltwoplayed += 1
 
             if self.counters["getready"] <= 0:
                 self.state = "level"
                 self.player.initSettings()
-                self.texts["lives"].setText(str(self.player.lives))
+                self.textChanged("lives", str(self.player.lives))
                 if self.extralifeshown:
-                    self.spritegroups["getready"].remove(self.texts["extra_life"])
+                    self.extraLifeShown(False)
                     self.extralifeshown = False
                 self.counters["getready"] = GETREADYTIME
             return
@@ -1200,7 +3364,531 @@ class Game:
         self.state = "lost"
         self.linerunners.initPositions()
         self.playfield.initPlayfield()
-        self.playfieldsprite.updatePlayfieldSprite()
+        self.playfieldChanged(whole = True)
         self.playSound("end")
 
-Game()
+
+class ObservedSimulation(Simulation):
+    """ A Simulation, that keeps a copy of its playfield in a NumPy array
+        of SCREENSIZE_Y x SCREENSIZE_X colornrs up to date. Like Game keeps
+        its window, it only copies the changes, that the hooks report. """
+
+    def __init__(self, cells, seed = None):
+        self.cells = cells
+        Simulation.__init__(self, seed)
+
+    def playfieldChanged(self, whole = False):
+        regions = self.playfield.popDirtyRegions()
+        if whole:
+            self.playfield.copyCells(self.cells)
+            return
+        for i in regions:
+            self.playfield.copyCells(self.cells, i)
+
+    def lineDrawn(self, line):
+        self.cells[line.spos_y, line.spos_x] = self.playfield.getColorNr(line.spos_x, line.spos_y)
+
+
+class VectorSimulation:
+    """ Steps n independent Simulations at once, for training and evaluating
+        automated players. Needs NumPy.
+
+        reset() and step() return the playfields of all of them as one
+        array of n x SCREENSIZE_Y x SCREENSIZE_X colornrs (uint8), and step()
+        also the rewards and the done-flags:
+
+            vector = VectorSimulation(8)
+            observations = vector.reset()
+            while True:
+                (observations, rewards, dones) = vector.step([{"up" : True}] * 8)
+
+        The reward is the gain of the filled percentage in the step. A
+        Simulation is done, when its Player has lost the last life. Then it
+        starts a new game at once, so the observation is the first one of
+        the new game. The arrays are the same in every step and are written
+        over, so they have to be copied to be kept. Each Simulation writes
+        the changes of its playfield into its part of the observations.
+
+        The actions are dictionaries like for Simulation.step(), or numbers
+        of the actions in VectorSimulation.actions. """
+
+    actions = ({}, {"left" : True}, {"right" : True}, {"up" : True}, {"down" : True})
+
+    def __init__(self, n, seed = None):
+        if not importNumpy():
+            raise ImportError("VectorSimulation needs NumPy.")
+        self.observations = numpy.zeros((n, SCREENSIZE_Y, SCREENSIZE_X), dtype = numpy.uint8)
+        self.rewards      = numpy.zeros(n, dtype = numpy.float32)
+        self.dones        = numpy.zeros(n, dtype = bool)
+        # With a seed, the Simulations get the following seeds, so that
+        # they play different games:
+        self.simulations = []
+        for i in range(n):
+            if seed is None:
+                self.simulations.append(ObservedSimulation(self.observations[i]))
+            else:
+                self.simulations.append(ObservedSimulation(self.observations[i], seed + i))
+        # The level and the filled percentage of each, after its last step:
+        self.levels      = [0] * n
+        self.percentages = [0] * n
+
+    def __len__(self):
+        return len(self.simulations)
+
+    def reset(self):
+        for i in range(len(self.simulations)):
+            self.resetSimulation(i)
+        self.rewards[:] = 0
+        self.dones[:]   = False
+        return self.observations
+
+    def resetSimulation(self, i):
+        simulation = self.simulations[i]
+        simulation.reset()
+        self.levels[i]      = simulation.level
+        self.percentages[i] = 0
+
+    def step(self, actions, dt = TICKLENGTH):
+        for i in range(len(self.simulations)):
+            simulation = self.simulations[i]
+            action = actions[i]
+            if not isinstance(action, dict):
+                action = self.actions[action]
+            simulation.step(action, dt)
+            # A new level starts at 0%:
+            if simulation.level != self.levels[i]:
+                self.levels[i]      = simulation.level
+                self.percentages[i] = 0
+            percentage = simulation.playfield.getFilledPercentage()
+            self.rewards[i]     = max(0, percentage - self.percentages[i])
+            self.percentages[i] = percentage
+            self.dones[i]       = simulation.state == "lost"
+            if self.dones[i]:
+                self.resetSimulation(i)
+        return (self.observations, self.rewards, self.dones)
+
+
+#####################################
+# Game / Main Class:
+
+class Game(Simulation):
+
+    def __init__(self, recordfilename = None, replayfilename = None, startupprofile = False):
+        self.startupprofile = startupprofile
+        self.startupmarks   = [("start", STARTTIME)]
+        self.markStartup("imports")
+        os.environ['SDL_VIDEO_WINDOW_POS'] = str(WINDOWPOSITION_X) + ", " + str(WINDOWPOSITION_Y)
+        if SOUND:
+            pygame.mixer.pre_init(44100, -16, 1, 512)
+        # Only the display is needed for the first frame. The mixer and the
+        # joystick are started after the first frame:
+        pygame.display.init()
+        self.markStartup("display")
+        self.inputplayer   = None
+        self.inputrecorder = None
+        if replayfilename:
+            # The game is played with the seed, the mode and on the
+            # playfield of the recording:
+            self.inputplayer = InputPlayer(replayfilename)
+            if self.inputplayer.size != (SCREENSIZE_X, SCREENSIZE_Y):
+                # The cells are scaled, so that the window is about as large,
+                # as it would be without the recording (a recording of the
+                # large board gets one pixel per cell, as with --large):
+                (width, height) = self.inputplayer.size
+                scalefactor = min((SCREENSIZE_X + 2 * BORDER_X) * SCALEFACTOR // (width + 2 * BORDER_X),
+                                  (SCREENSIZE_Y + 2 * BORDER_Y) * SCALEFACTOR // (height + 2 * BORDER_Y))
+                setGridSize(width, height, max(1, scalefactor))
+        self.screen = pygame.display.set_mode((SCREENSIZE_X * SCALEFACTOR + 2 * BORDER_X * SCALEFACTOR, SCREENSIZE_Y * SCALEFACTOR + 2 * BORDER_Y * SCALEFACTOR))
+        pygame.display.set_caption("PyQueex")
+        self.markStartup("window")
+        self.clock = pygame.time.Clock()
+        self.ih = InputHandler()
+        # Parts of the window to draw again in DIRTYRENDERING-mode:
+        self.repaintrects = []
+        self.dirtyrects   = []
+        self.drawnstate   = None
+        self.fixedtimestep = FIXEDTIMESTEP
+        self.multirate     = MULTIRATE and not recordfilename and not replayfilename
+        self.skippedframes = 0
+        self.rewindbuffer  = None
+        # Set by initSounds(), after the first frame:
+        self.soundloader   = None
+        if self.inputplayer:
+            self.fixedtimestep = self.inputplayer.fixedtimestep
+            Simulation.__init__(self, self.inputplayer.seed)
+        else:
+            Simulation.__init__(self)
+        if recordfilename:
+            self.inputrecorder = InputRecorder(recordfilename, self.seed, self.fixedtimestep)
+        # Going back would change a recorded game:
+        if REWINDSECONDS > 0 and not recordfilename and not replayfilename:
+            self.rewindbuffer = RewindBuffer(self, REWINDSECONDS, SIMULATIONRATE if self.multirate else FPS)
+        self.hud = PerformanceHUD(self)
+        self.hudkeypressed = False
+        if PERFORMANCEHUD:
+            self.hud.show()
+        self.running = True
+
+    def markStartup(self, phase):
+        # The time, at which a phase of the start has ended:
+        self.startupmarks.append((phase, time.perf_counter()))
+
+    def printStartupProfile(self):
+        print("Time to the first frame (milliseconds):")
+        for i in range(1, len(self.startupmarks)):
+            print("{0:<14}{1:8.1f}".format(self.startupmarks[i][0],
+                                           (self.startupmarks[i][1] - self.startupmarks[i - 1][1]) * 1000))
+        print("{0:<14}{1:8.1f}".format("total", (self.startupmarks[-1][1] - STARTTIME) * 1000))
+
+    def run(self):
+        # The first frame is shown without waiting for the framerate:
+        self.clocktick = self.clock.tick()
+        self.frame()
+        self.markStartup("first frame")
+        if self.startupprofile:
+            self.printStartupProfile()
+            self.running = False
+        else:
+            # Not needed for the first frame:
+            if SOUND:
+                self.initSounds()
+            if JOYSTICKNUMBER > 0:
+                self.ih.initJoystick()
+        if self.multirate:
+            self.runMultiRate()
+        else:
+            while self.running:
+                self.clocktick = self.clock.tick(FPS)
+                self.frame()
+        if self.multirate or self.fixedtimestep:
+            print("Simulation ticks dropped: " + str(self.droppedticks) + ", frames skipped: " + str(self.skippedframes))
+        if self.inputrecorder:
+            self.inputrecorder.close()
+        if self.inputplayer:
+            self.inputplayer.close()
+        pygame.quit()
+
+    def runMultiRate(self):
+        # Like advance(), but the keys are read for every tick, and the
+        # window is drawn in between, when it's time for the next frame.
+        # Times are in milliseconds:
+        ticklength  = 1000 / SIMULATIONRATE
+        framelength = 1000 / RENDERRATE
+        lasttime  = time.perf_counter() * 1000
+        nextframe = lasttime + framelength
+        while self.running:
+            now = time.perf_counter() * 1000
+            self.accumulator += now - lasttime
+            lasttime = now
+            ticks = 0
+            while self.accumulator >= ticklength and self.running:
+                if ticks == MAXTICKSPERFRAME:
+                    dropped = int(self.accumulator // ticklength)
+                    self.droppedticks += dropped
+                    self.accumulator  -= dropped * ticklength
+                    break
+                self.clocktick = ticklength
+                self.simulate()
+                self.accumulator -= ticklength
+                ticks += 1
+            if now >= nextframe:
+                # Frames, whose time has already passed, are skipped:
+                behind = int((now - nextframe) // framelength)
+                self.skippedframes += behind
+                nextframe += (behind + 1) * framelength
+                self.render()
+            wait = min(nextframe, lasttime + ticklength - self.accumulator) - time.perf_counter() * 1000
+            if wait > 0:
+                time.sleep(wait / 1000)
+
+    def frame(self):
+        self.simulate()
+        self.render()
+
+    def simulate(self):
+        self.checkKeys()
+        # A capture, that is going on, is finished first:
+        if self.rewindbuffer and self.keyaction["rewind"] and self.playfield.capture is None:
+            self.rewind()
+        else:
+            # The ticks of runMultiRate() already have a fixed length, and
+            # advance() would add them to the same accumulator again:
+            if self.fixedtimestep and not self.multirate:
+                self.advance(self.keyaction, self.clocktick)
+            else:
+                self.step(self.keyaction, self.clocktick)
+            if self.rewindbuffer:
+                self.rewindbuffer.save()
+
+    def render(self):
+        if not DIRTYRENDERING:
+            self.screen.fill(COLORS["grey"])
+        self.drawSprites()
+        if self.hud.visible:
+            self.hud.draw(self.screen)
+        self.flipDisplay()
+
+    def drawSprites(self):
+        if NATIVERESOLUTION:
+            self.playfieldsprite.scaleImage()
+        group = self.drawgroups[self.state]
+        # The swarm is drawn in the states, that the LineRunners are shown in:
+        swarm = self.linerunners.swarm
+        if self.state not in ("getready", "level", "playerexplosion"):
+            swarm = None
+        if DIRTYRENDERING:
+            # Another state shows other sprites, so everything is drawn again.
+            # The group only knows, where its sprites have been, when it last
+            # drew them, so they are all set dirty to update that:
+            if self.state != self.drawnstate:
+                for i in group:
+                    i.dirty = 1
+                group.repaint_rect(self.screen.get_rect())
+                self.drawnstate = self.state
+            # The HUD is drawn over the sprites afterwards:
+            if self.hud.visible:
+                self.repaintrects.append(self.hud.rect)
+            for i in self.repaintrects:
+                group.repaint_rect(i)
+            self.repaintrects = []
+            # The places, that the swarm has left, are drawn again without it:
+            if swarm is not None:
+                for i in swarm.getLeftRects():
+                    group.repaint_rect(i)
+        self.dirtyrects = group.draw(self.screen)
+        if swarm is not None:
+            self.dirtyrects += swarm.draw(self.screen)
+
+    def rewind(self):
+        # Goes back one frame, and shows it:
+        if not self.rewindbuffer.rewind():
+            return
+        self.playfieldChanged()
+        self.textChanged("lives", str(self.player.lives))
+        self.textChanged("percentage", getPercentageText(self.playfield.getFilledPercentage()))
+
+    def flipDisplay(self):
+        if DIRTYRENDERING:
+            pygame.display.update(self.dirtyrects)
+        else:
+            pygame.display.flip()
+
+    def initSprites(self):
+        Simulation.initSprites(self)
+        self.markStartup("game")
+        # Create sprites:
+        self.playfieldsprite      = PlayfieldSprite(self, self.playfield)
+        self.markStartup("playfield")
+        self.texts                = {}
+        self.texts["intro"]       = Text("PyQueex",
+                                         "bright_white",
+                                         60, 15,
+                                         3)
+        self.texts["intro_story"] = MultilineText(("The evil green-rectangle-mutant",
+                                                   "wants to kill you, his creator!",
+                                                   "Try to wall it in, before it gets you,",
+                                                   "or you'll be chicken feed!"),
+                                                   16,
+                                                   "green",
+                                                   25, 30,
+                                                   2)
+        self.texts["intro_return"] = Text("Press \"Return\" to play.",
+                                          "bright_white",
+                                          40, 60,
+                                          2)
+        self.texts["intro_author"] = Text("Written by H. Lubenow, (C) 2023, GNU GPL.",
+                                          "white",
+                                          15, 80,
+                                          2)
+        self.texts["gr_level"]     = Text("Level 999",
+                                          "cyan",
+                                          65, 10,
+                                          3)
+        self.texts["getready"]     = Text("GET READY",
+                                          "bright_white",
+                                          60, 20,
+                                          3)
+        self.texts["completed"]    = Text("Level 900 Completed",
+                                          "bright_white",
+                                          40, 20,
+                                          3)
+        self.texts["lost"]         = Text("GAME OVER",
+                                          "bright_white",
+                                          60, 35,
+                                          3)
+        self.texts["press_return"] = Text("Press \"Return\" to play again.",
+                                          "bright_white",
+                                          36, 50,
+                                          2)
+        self.texts["livestext"]    = Text("Lives: ",
+                                          "bright_white",
+                                          3, 3,
+                                          2)
+        self.texts["lives"]        = Text(str(PLAYERLIVES),
+                                         "bright_white",
+                                         self.texts["livestext"].spos_x + 20,
+                                         self.texts["livestext"].spos_y,
+                                         self.texts["livestext"].scalefactor)
+        # At the right of the window, in the cells of the texts:
+        layoutwidth = SCREENSIZE_X * SCALEFACTOR // (TEXTLAYOUTSCALE * getTextScale())
+        self.texts["percentage"]   = Text(" 0%",
+                                          "bright_white",
+                                          layoutwidth - 12, 3,
+                                          2)
+        self.texts["extra_life"]   = Text("Extra Life!",
+                                          "cyan",
+                                          65, 40,
+                                          2)
+        # Create groups. These are the sprites, that are drawn in each state:
+        self.drawgroups = {}
+        self.background = pygame.Surface(self.screen.get_size())
+        self.background.fill(COLORS["grey"])
+        for i in ("intro", "getready", "level", "playerexplosion", "completed", "lost", "infotexts"):
+            if DIRTYRENDERING:
+                self.drawgroups[i] = pygame.sprite.LayeredDirty()
+                self.drawgroups[i].clear(self.screen, self.background)
+            else:
+                self.drawgroups[i] = pygame.sprite.Group()
+
+        # Put sprites in groups:
+        self.drawgroups["infotexts"].add(self.texts["livestext"], self.texts["lives"], self.texts["percentage"])
+        self.drawgroups["intro"].add(self.playfieldsprite, self.texts["intro"], self.texts["intro_story"], self.texts["intro_return"], self.texts["intro_author"])
+        self.drawgroups["getready"].add(self.playfieldsprite, self.player, self.opponent, self.texts["gr_level"], self.texts["getready"], self.drawgroups["infotexts"])
+        self.drawgroups["level"].add(self.playfieldsprite, self.player, self.opponent, self.drawgroups["infotexts"])
+        self.drawgroups["playerexplosion"].add(self.playfieldsprite, self.player, self.drawgroups["infotexts"])
+        self.drawgroups["completed"].add(self.playfieldsprite, self.texts["completed"], self.drawgroups["infotexts"])
+        self.drawgroups["lost"].add(self.playfieldsprite, self.texts["lost"])
+        self.markStartup("texts")
+
+    def initSounds(self):
+        # Starting the mixer takes time, so it's done after the first frame.
+        # The SoundLoader then decodes the sounds in the background:
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            print("No sound: " + str(e))
+            return
+        self.soundloader = SoundLoader(SOUNDDIR)
+
+    def playSound(self, name):
+        if self.soundloader is None:
+            return
+        # Sounds, that haven't been loaded yet, are left out:
+        sound = self.soundloader.sounds.get(name)
+        if sound is not None:
+            sound.play()
+
+    def textChanged(self, name, text):
+        self.texts[name].setText(text)
+
+    def playfieldChanged(self, whole = False):
+        regions = self.playfield.popDirtyRegions()
+        if self.rewindbuffer:
+            if whole:
+                self.rewindbuffer.playfieldReset()
+            else:
+                for i in regions:
+                    self.rewindbuffer.cellsChanged(i)
+        if whole:
+            self.playfieldsprite.updatePlayfieldSprite()
+            self.playfieldsprite.dirty = 1
+        elif regions:
+            self.playfieldsprite.updatePlayfieldSprite(regions)
+            if DIRTYRENDERING:
+                for i in regions:
+                    self.repaintrects.append(self.playfieldsprite.getScreenRect(*i))
+
+    def lineDrawn(self, line):
+        if self.rewindbuffer:
+            self.rewindbuffer.cellsChanged((line.spos_x, line.spos_y, line.spos_x, line.spos_y))
+        self.playfieldsprite.drawLine(line)
+        if DIRTYRENDERING:
+            self.repaintrects.append(line.rect.move(self.playfieldsprite.rect.topleft))
+
+    def extraLifeShown(self, shown):
+        if shown:
+            self.texts["extra_life"].dirty = 1
+            self.drawgroups["getready"].add(self.texts["extra_life"])
+        else:
+            self.drawgroups["getready"].remove(self.texts["extra_life"])
+
+    def addLineRunner(self):
+        l = Simulation.addLineRunner(self)
+        self.drawgroups["level"].add(l)
+        self.drawgroups["getready"].add(l)
+        self.drawgroups["playerexplosion"].add(l)
+        return l
+
+    def removeLinerunnersFromGroups(self):
+        for l in self.linerunners.sprites():
+            self.drawgroups["level"].remove(l)
+            self.drawgroups["getready"].remove(l)
+            self.drawgroups["playerexplosion"].remove(l)
+        Simulation.removeLinerunnersFromGroups(self)
+
+    def checkKeys(self):
+        action = self.ih.getKeyboardAndJoystickAction()
+        # Toggle the HUD, when the key is pressed (not as long as it's held):
+        if action["hud"] and not self.hudkeypressed:
+            self.hud.toggle()
+            self.repaintrects.append(self.hud.rect)
+        self.hudkeypressed = action["hud"]
+        if self.inputplayer:
+            # Only quitting is taken from the keyboard during a replay:
+            frame = self.inputplayer.read()
+            if frame is None:
+                print("End of the recording.")
+                self.running = False
+                return
+            (self.keyaction, self.clocktick) = frame
+            if action["quit"]:
+                self.keyaction["quit"] = True
+        else:
+            self.keyaction = action
+        if self.inputrecorder:
+            self.inputrecorder.write(self.keyaction, self.clocktick)
+        if self.keyaction["quit"]:
+            self.running = False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Clone of an ancient arcade game.")
+    parser.add_argument("--record", metavar = "FILE", help = "record the input of the session to FILE")
+    parser.add_argument("--replay", metavar = "FILE", help = "play the session recorded in FILE again")
+    parser.add_argument("--startup-profile", action = "store_true",
+                        help = "show the time to the first frame by phase, and quit")
+    parser.add_argument("--size", metavar = "WIDTHxHEIGHT",
+                        type = lambda s: tuple(int(i) for i in s.lower().split("x", 1)),
+                        help = "size of the playfield in cells (default: " + str(SCREENSIZE_X) + "x" + str(SCREENSIZE_Y) + ")")
+    parser.add_argument("--scale", metavar = "N", type = int,
+                        help = "size of a cell in pixels (default: " + str(SCALEFACTOR) + ")")
+    parser.add_argument("--large", action = "store_true",
+                        help = "play on the large board of " + str(LARGESIZE_X) + "x" + str(LARGESIZE_Y) + " cells")
+    parser.add_argument("--swarm", metavar = "N", type = int,
+                        help = "play against a swarm of N LineRunners")
+    parser.add_argument("--dirty-rendering", action = "store_true",
+                        help = "draw and update only the parts of the window, that have changed")
+    parser.add_argument("--native-resolution", action = "store_true",
+                        help = "draw the playfield at one pixel per cell and scale it to the window")
+    parser.add_argument("--simulation-rate", metavar = "HZ", type = int,
+                        help = "read the keys and advance the game HZ times per second, independently of drawing")
+    parser.add_argument("--render-rate", metavar = "HZ", type = int,
+                        help = "with --simulation-rate: draw the window HZ times per second (default: " + str(RENDERRATE) + ")")
+    args = parser.parse_args()
+    if args.simulation_rate:
+        MULTIRATE = True
+        SIMULATIONRATE = args.simulation_rate
+    if args.render_rate:
+        RENDERRATE = args.render_rate
+    if args.large:
+        setGridSize(LARGESIZE_X, LARGESIZE_Y, LARGESCALEFACTOR)
+    if args.size:
+        setGridSize(args.size[0], args.size[1])
+    if args.scale:
+        setGridSize(SCREENSIZE_X, SCREENSIZE_Y, args.scale)
+    if args.swarm:
+        LINERUNNERSWARM = args.swarm
+    if args.dirty_rendering:
+        DIRTYRENDERING = True
+    if args.native_resolution:
+        NATIVERESOLUTION = True
+    Game(args.record, args.replay, args.startup_profile).run()
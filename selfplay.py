@@ -0,0 +1,414 @@
+#!/usr/bin/python3
+# coding: utf-8
+
+"""
+    Self-play for PyQueex: Bots play headless games on all cores, to tune
+    the settings of the game.
+
+    Usage: python3 selfplay.py [--workers N] [--frames N] [--bot NAME]
+                               [--seed N] [--set NAME=VALUE ...] [--json FILE]
+
+    Every worker process plays a Simulation for the given number of frames,
+    driven by a bot, and starts a new game after every game over. The
+    outcome of every level (the time to clear it, the deaths in it and the
+    sizes of the captured areas) is sent to the main process, as soon as
+    the level is over. At the end, the statistics per level and the frames
+    per second per core are printed.
+
+    Settings of pyqueex.py can be changed for all workers with --set, for
+    example "--set OPPONENTSPEED=0.05 --set LINERUNNERSMAX=3".
+
+    The bots are "boxes" (cuts off boxes from the dark area) and "random"
+    (walks around randomly). Other bots can be given as "module:Class".
+    A bot is created with a seed, and getActions(simulation) returns the
+    actions for the next frame, like the InputHandler.
+"""
+
+import os
+import time
+import json
+import random
+import argparse
+import importlib
+import statistics
+import multiprocessing
+import queue
+import ast
+
+# No window and no sound needed:
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import pyqueex
+
+FRAMES = 100000
+
+# Seconds between two progress lines:
+PROGRESSINTERVAL = 2
+
+DIRECTIONS = {"left"  : (-1, 0),
+              "right" : (1, 0),
+              "up"    : (0, -1),
+              "down"  : (0, 1)}
+
+BACKWARDS = {"left" : "right", "right" : "left",
+             "up"   : "down",  "down"  : "up"}
+
+
+#####################################
+# Bots:
+
+class Bot:
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def getActions(self, simulation):
+        return {}
+
+    def getColorNr(self, simulation, x, y, direction):
+        # The color of the next cell in the direction, or None outside:
+        x += DIRECTIONS[direction][0]
+        y += DIRECTIONS[direction][1]
+        if x < 0 or x >= pyqueex.SCREENSIZE_X or y < 0 or y >= pyqueex.SCREENSIZE_Y:
+            return None
+        return simulation.playfield.getColorNr(x, y)
+
+
+class RandomBot(Bot):
+    """ Walks in a random direction for a random time. """
+
+    def __init__(self, seed):
+        Bot.__init__(self, seed)
+        self.direction = "up"
+        self.frames    = 0
+
+    def getActions(self, simulation):
+        self.frames -= 1
+        if self.frames <= 0:
+            self.direction = self.random.choice(tuple(DIRECTIONS))
+            self.frames    = self.random.randrange(10, 120)
+        return {self.direction : True}
+
+
+class BoxBot(Bot):
+    """ Walks along the white lines for a while, then draws a box of random
+        size into the dark area and back to a line, which captures it.
+
+        The way is planned as legs of (direction, cells). The last leg of a
+        box has no number of cells: It goes on, until a line is reached.
+        When the Player can't go on, the bot plans again. """
+
+    # Frames without moving, after which the bot plans again:
+    stuckframes = 30
+    # LineRunners closer than this many cells make the bot leave the line:
+    runnerdistance = 8
+
+    def __init__(self, seed):
+        Bot.__init__(self, seed)
+        self.legs     = []
+        self.position = None
+        self.still    = 0
+
+    def getActions(self, simulation):
+        if simulation.state != "level":
+            self.legs     = []
+            self.position = None
+            return {}
+        player   = simulation.player
+        position = player.getPosition()
+        if position != self.position:
+            self.position = position
+            self.still    = 0
+            if self.legs and self.legs[0][1] is not None:
+                self.legs[0] = (self.legs[0][0], self.legs[0][1] - 1)
+        else:
+            self.still += 1
+        if self.still > self.stuckframes:
+            self.legs  = []
+            self.still = 0
+        # On a line, LineRunners can get the Player. In the dark area they can't:
+        escape = not player.drawing and bool(self.getNearRunners(simulation))
+        if escape and self.legs and self.legs[-1][1] is not None:
+            self.legs = []
+        black = pyqueex.COLORNRS["black"]
+        white = pyqueex.COLORNRS["white"]
+        while self.legs:
+            (direction, cells) = self.legs[0]
+            colornr = self.getColorNr(simulation, position[0], position[1], direction)
+            if cells == 0 or colornr not in (black, white):
+                self.legs.pop(0)
+            elif cells is None and not player.drawing and player.onWhiteLine():
+                # Back on a line:
+                self.legs.pop(0)
+            else:
+                break
+        if not self.legs:
+            self.plan(simulation, escape)
+        if not self.legs:
+            return {}
+        return {self.legs[0][0] : True}
+
+    def plan(self, simulation, escape = False):
+        player = simulation.player
+        (x, y) = player.getPosition()
+        black  = pyqueex.COLORNRS["black"]
+        white  = pyqueex.COLORNRS["white"]
+        colornrs = {}
+        for i in DIRECTIONS:
+            colornrs[i] = self.getColorNr(simulation, x, y, i)
+        if player.drawing:
+            # Stuck on the way. Back to a line, the shortest way there is:
+            ways = [i for i in DIRECTIONS if colornrs[i] == white]
+            if not ways:
+                ways = [i for i in DIRECTIONS if colornrs[i] == black]
+            if ways:
+                self.legs = [(self.random.choice(ways), None)]
+            return
+        inwards = [i for i in DIRECTIONS if colornrs[i] == black]
+        along   = [i for i in DIRECTIONS if colornrs[i] == white]
+        if inwards and (escape or not along or self.random.random() < 0.7):
+            # A few boxes are tried. Those too close to the Opponent aren't
+            # drawn, unless a LineRunner is near:
+            for i in range(5):
+                direction = self.random.choice(inwards)
+                side      = self.random.choice([i for i in DIRECTIONS if i not in (direction, BACKWARDS[direction])])
+                depth     = self.random.randrange(3, max(4, pyqueex.SCREENSIZE_Y // 6))
+                width     = self.random.randrange(3, max(4, pyqueex.SCREENSIZE_X // 6))
+                if escape or not self.isNearOpponent(simulation, x, y, (direction, depth), (side, width)):
+                    self.legs = [(direction, depth), (side, width), (BACKWARDS[direction], None)]
+                    return
+        if along and escape:
+            # Away from the LineRunners along the line:
+            (px, py) = player.rect.center
+            away = []
+            for i in along:
+                if all(DIRECTIONS[i][0] * (px - r.centerx) + DIRECTIONS[i][1] * (py - r.centery) > 0
+                       for r in self.getNearRunners(simulation)):
+                    away.append(i)
+            if away:
+                along = away
+        if along:
+            self.legs = [(self.random.choice(along), self.random.randrange(5, 40))]
+
+    def getNearRunners(self, simulation):
+        # The rects of the LineRunners, looked up in the spatial hash of the game:
+        distance = self.runnerdistance * pyqueex.SCALEFACTOR
+        spatialhash = simulation.spatialhash
+        return [spatialhash.rects[i] for i in spatialhash.query(simulation.player.rect.inflate(2 * distance, 2 * distance))]
+
+    def isNearOpponent(self, simulation, x, y, *legs):
+        # Whether the Opponent can reach the box from (x, y), while it is
+        # drawn. The way back to the line is taken as long as the first leg:
+        (x0, y0, x1, y1) = (x, y, x, y)
+        for (direction, cells) in legs:
+            x += DIRECTIONS[direction][0] * cells
+            y += DIRECTIONS[direction][1] * cells
+            (x0, y0, x1, y1) = (min(x0, x), min(y0, y), max(x1, x), max(y1, y))
+        length = 2 * legs[0][1] + sum(i[1] for i in legs[1:])
+        reach  = int(length * pyqueex.OPPONENTSPEED / pyqueex.PLAYERSPEED) + 2
+        (ox, oy) = simulation.opponent.getPosition()
+        return (x0 <= ox + pyqueex.OPPONENTSIZE_X + reach and x1 >= ox - reach and
+                y0 <= oy + pyqueex.OPPONENTSIZE_Y + reach and y1 >= oy - reach)
+
+BOTS = {"boxes"  : BoxBot,
+        "random" : RandomBot}
+
+def getBot(name):
+    if name in BOTS:
+        return BOTS[name]
+    (modulename, classname) = name.split(":", 1)
+    return getattr(importlib.import_module(modulename), classname)
+
+
+#####################################
+# Workers:
+
+class LevelWatcher:
+    """ Follows the states of a Simulation and sends the outcome of every
+        level to the main process, when the level is over. """
+
+    def __init__(self, workernr, outqueue):
+        self.workernr = workernr
+        self.outqueue = outqueue
+        self.game     = 0
+
+    def startGame(self, simulation):
+        self.game += 1
+        self.startLevel(simulation)
+
+    def startLevel(self, simulation):
+        self.level    = simulation.level
+        self.state    = simulation.state
+        self.frames   = 0
+        self.deaths   = 0
+        self.captures = []
+        self.blue     = simulation.playfield.getCount("blue")
+
+    def check(self, simulation):
+        if simulation.level != self.level:
+            self.startLevel(simulation)
+        state = simulation.state
+        if state == "level":
+            self.frames += 1
+        # A capture, that is spread over several frames, is counted, when
+        # it is done:
+        if simulation.playfield.capture is None:
+            blue = simulation.playfield.getCount("blue")
+            if blue > self.blue:
+                self.captures.append(blue - self.blue)
+            self.blue = blue
+        if state != self.state:
+            if state == "playerexplosion":
+                self.deaths += 1
+            if state == "completed":
+                self.send(simulation, "cleared")
+            if state == "lost":
+                self.send(simulation, "lost")
+        self.state = state
+
+    def send(self, simulation, result):
+        self.outqueue.put({"worker"   : self.workernr,
+                           "game"     : self.game,
+                           "level"    : self.level,
+                           "result"   : result,
+                           "frames"   : self.frames,
+                           "seconds"  : self.frames * pyqueex.TICKLENGTH / 1000,
+                           "deaths"   : self.deaths,
+                           "captures" : self.captures,
+                           "filled"   : simulation.playfield.getFilledPercentage()})
+
+# The queue to the main process. It's handed to the workers, when they start:
+OUTQUEUE = None
+
+def initWorker(outqueue):
+    global OUTQUEUE
+    OUTQUEUE = outqueue
+
+def applySettings(settings):
+    for (name, value) in settings:
+        setattr(pyqueex, name, value)
+
+def playGames(job):
+    (workernr, frames, botname, seed, settings) = job
+    applySettings(settings)
+    bot        = getBot(botname)(seed)
+    simulation = pyqueex.Simulation(seed)
+    watcher    = LevelWatcher(workernr, OUTQUEUE)
+    simulation.reset()
+    watcher.startGame(simulation)
+    starttime = time.process_time()
+    for i in range(frames):
+        if simulation.state == "lost":
+            simulation.reset()
+            watcher.startGame(simulation)
+        simulation.step(bot.getActions(simulation), pyqueex.TICKLENGTH)
+        watcher.check(simulation)
+    # Sent through the same queue, so that it comes after all the levels:
+    OUTQUEUE.put({"worker"     : workernr,
+                  "done"       : True,
+                  "frames"     : frames,
+                  "cpuseconds" : time.process_time() - starttime})
+
+
+#####################################
+# Main process:
+
+def parseSetting(text):
+    # "NAME=VALUE", where NAME is a setting of pyqueex.py:
+    (name, value) = text.split("=", 1)
+    if not name.isupper() or not hasattr(pyqueex, name):
+        raise argparse.ArgumentTypeError("unknown setting '" + name + "'")
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return (name, value)
+
+def getMedian(values):
+    if not values:
+        return 0.
+    return statistics.median(values)
+
+def getMean(values):
+    if not values:
+        return 0.
+    return statistics.mean(values)
+
+def printStatistics(levels, workers, walltime):
+    print()
+    print("{0:>5} {1:>7} {2:>8} {3:>12} {4:>8} {5:>9} {6:>13}".format("level", "played", "cleared",
+                                                                     "median time", "deaths", "captures", "median size"))
+    for level in sorted(set(i["level"] for i in levels)):
+        played   = [i for i in levels if i["level"] == level]
+        cleared  = [i for i in played if i["result"] == "cleared"]
+        captures = [j for i in played for j in i["captures"]]
+        # The time to clear a level is only known, if it has been cleared:
+        cleartime = "-"
+        if cleared:
+            cleartime = "{0:.1f}s".format(getMedian([i["seconds"] for i in cleared]))
+        print("{0:>5} {1:>7} {2:>7.1f}% {3:>12} {4:>8.2f} {5:>9.1f} {6:>13.0f}".format(level, len(played),
+                100 * len(cleared) / len(played), cleartime,
+                getMean([i["deaths"] for i in played]), getMean([len(i["captures"]) for i in played]),
+                getMedian(captures)))
+    frames = sum(i["frames"] for i in workers)
+    print()
+    print("Games over: " + str(len([i for i in levels if i["result"] == "lost"])) +
+          ", levels cleared: " + str(len([i for i in levels if i["result"] == "cleared"])))
+    print("Frames: {0}, {1:.1f} seconds, {2:.0f} frames per second".format(frames, walltime, frames / walltime))
+    print("Frames per second per core: {0:.0f}".format(getMean([i["frames"] / i["cpuseconds"] for i in workers])))
+
+def writeJSON(filename, settings, levels, workers, walltime):
+    data = {"settings" : dict(settings),
+            "walltime" : walltime,
+            "workers"  : workers,
+            "levels"   : levels}
+    with open(filename, "w") as fh:
+        json.dump(data, fh, indent = 1)
+    print("Results written to '" + filename + "'.")
+
+def run(args):
+    jobs = [(i, args.frames, args.bot, args.seed + i, args.set) for i in range(args.workers)]
+    outqueue = multiprocessing.Queue()
+    levels   = []
+    workers  = []
+    starttime    = time.perf_counter()
+    progresstime = starttime
+    with multiprocessing.Pool(args.workers, initWorker, (outqueue,)) as pool:
+        result = pool.map_async(playGames, jobs)
+        while len(workers) < len(jobs):
+            try:
+                message = outqueue.get(timeout = 0.5)
+            except queue.Empty:
+                # A worker, that has failed, doesn't send "done":
+                if result.ready() and not result.successful():
+                    result.get()
+                continue
+            if "done" in message:
+                workers.append(message)
+            else:
+                levels.append(message)
+            if time.perf_counter() - progresstime >= PROGRESSINTERVAL:
+                progresstime = time.perf_counter()
+                print("{0:6.1f}s: {1} levels played, highest level {2}".format(progresstime - starttime,
+                        len(levels), max((i["level"] for i in levels), default = 0)))
+    walltime = time.perf_counter() - starttime
+    printStatistics(levels, workers, walltime)
+    if args.json:
+        writeJSON(args.json, args.set, levels, workers, walltime)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Self-play for PyQueex.")
+    parser.add_argument("--workers", metavar = "N", type = int, default = os.cpu_count(),
+                        help = "number of worker processes (default: number of cores)")
+    parser.add_argument("--frames", metavar = "N", type = int, default = FRAMES,
+                        help = "frames to play in each worker (default: " + str(FRAMES) + ")")
+    parser.add_argument("--bot", metavar = "NAME", default = "boxes",
+                        help = "the bot: " + ", ".join(BOTS) + " or module:Class (default: boxes)")
+    parser.add_argument("--seed", metavar = "N", type = int, default = 1,
+                        help = "seed of the first worker, the others get the following ones (default: 1)")
+    parser.add_argument("--set", metavar = "NAME=VALUE", type = parseSetting, action = "append", default = [],
+                        help = "change a setting of pyqueex.py")
+    parser.add_argument("--json", metavar = "FILE",
+                        help = "also write the outcomes of all levels to FILE")
+    run(parser.parse_args())
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# No window and no sound are needed:
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyqueex
+
+
+@pytest.fixture
+def gridsize(monkeypatch):
+    """ Returns pyqueex.setGridSize(). The size and everything, that depends
+        on it, is set back after the test. """
+    for name in ("SCREENSIZE_X", "SCREENSIZE_Y", "SCALEFACTOR", "OPPONENTSIZE_X", "OPPONENTSIZE_Y"):
+        monkeypatch.setattr(pyqueex, name, getattr(pyqueex, name))
+    return pyqueex.setGridSize
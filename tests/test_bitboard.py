@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+import pyqueex
+
+
+def getNoiseBoard(seed):
+    # About a third of the cells are walls, scattered randomly:
+    r = random.Random(seed)
+    rows = []
+    for y in range(pyqueex.SCREENSIZE_Y):
+        if y in (0, pyqueex.SCREENSIZE_Y - 1):
+            rows.append([pyqueex.COLORNRS["white"]] * pyqueex.SCREENSIZE_X)
+            continue
+        row = [pyqueex.COLORNRS["white"] if r.random() < 0.33 else pyqueex.COLORNRS["black"]
+               for x in range(pyqueex.SCREENSIZE_X)]
+        row[0] = row[-1] = pyqueex.COLORNRS["white"]
+        rows.append(row)
+    return rows
+
+def getCells(playfield):
+    return [playfield.getRow(0, pyqueex.SCREENSIZE_X - 1, y) for y in range(pyqueex.SCREENSIZE_Y)]
+
+# The whole board at once, and row by row:
+@pytest.mark.parametrize("wholeboardcells", (100000, 0))
+def test_bitboard_fill_is_the_same_as_list(gridsize, monkeypatch, wholeboardcells):
+    gridsize(160, 100, 1)
+    monkeypatch.setattr(pyqueex.BitboardPlayfield, "wholeboardcells", wholeboardcells)
+    for seed in range(3):
+        board = getNoiseBoard(seed)
+        reference = pyqueex.Playfield()
+        reference.loadRows(board)
+        playfield = pyqueex.BitboardPlayfield()
+        playfield.loadRows(board)
+        for (x, y) in ((1, 2), (80, 50), (158, 98)):
+            reference.fillArea((x, y))
+            playfield.fillArea((x, y))
+            assert getCells(playfield) == getCells(reference)
+            assert playfield.counts == reference.counts
+            assert playfield.getNeighbourDirections(x, y, (pyqueex.COLORNRS["blue"],)) == \
+                   reference.getNeighbourDirections(x, y, (pyqueex.COLORNRS["blue"],))
+
+def test_bitboard_walls_are_the_same_as_list(gridsize):
+    gridsize(160, 100, 1)
+    board = getNoiseBoard(3)
+    reference = pyqueex.Playfield()
+    reference.loadRows(board)
+    playfield = pyqueex.BitboardPlayfield()
+    playfield.loadRows(board)
+    (walls, distances) = (playfield.walldistances, reference.walldistances)
+    r = random.Random(3)
+    for i in range(2000):
+        (x, y) = (r.randrange(pyqueex.SCREENSIZE_X), r.randrange(pyqueex.SCREENSIZE_Y))
+        width  = r.randrange(1, pyqueex.SCREENSIZE_X - x + 1)
+        height = r.randrange(1, pyqueex.SCREENSIZE_Y - y + 1)
+        assert walls.isRowFree(x, y, width) == distances.isRowFree(x, y, width)
+        assert walls.isColumnFree(x, y, height) == distances.isColumnFree(x, y, height)
+
+def test_bitboard_capture_is_the_same_as_list(gridsize):
+    gridsize(1600, 1000, 1)
+    # A staircase from the left wall up to the top wall:
+    cells = []
+    for i in range(300):
+        cells += [(1 + i, 500 - i), (2 + i, 500 - i)]
+    cells += [(301, y) for y in range(200, 0, -1)]
+    playfields = []
+    for backend in (pyqueex.Playfield, pyqueex.BitboardPlayfield):
+        playfield = backend()
+        trail = pyqueex.Trail()
+        for (x, y) in cells:
+            playfield.setColorNr(x, y, pyqueex.COLORNRS["magenta"])
+            trail.add(x, y)
+        playfield.fillArea((1200, 600), trail)
+        while playfield.capture is not None:
+            playfield.continueCapture()
+        playfields.append(playfield)
+    (reference, playfield) = playfields
+    assert getCells(playfield) == getCells(reference)
+    assert playfield.counts == reference.counts
+    assert playfield.walldistances.isRowFree(1, 100, 300) == reference.walldistances.isRowFree(1, 100, 300)
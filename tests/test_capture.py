@@ -0,0 +1,105 @@
+import time
+
+import pyqueex
+
+
+def drawLine(playfield, cells):
+    trail = pyqueex.Trail()
+    for (x, y) in cells:
+        playfield.setColorNr(x, y, pyqueex.COLORNRS["magenta"])
+        trail.add(x, y)
+    return trail
+
+def getCells(playfield):
+    return [playfield.getRow(0, pyqueex.SCREENSIZE_X - 1, y) for y in range(pyqueex.SCREENSIZE_Y)]
+
+def getStaircase(steps):
+    # From the left wall up and to the right, then straight up to the top wall:
+    cells = []
+    (x, y) = (1, 500)
+    for i in range(steps):
+        cells += [(x, y), (x + 1, y)]
+        x += 1
+        y -= 1
+    return cells + [(x, i) for i in range(y, 0, -1)]
+
+def runCapture(playfield, opponent, trail):
+    # Like Playfield.fillArea() and continueCapture(). Returns the work and
+    # the seconds of every part of the capture:
+    parts = []
+    starttime = time.perf_counter()
+    capture = pyqueex.Capture(playfield, opponent, trail)
+    while True:
+        done = capture.run(pyqueex.getCaptureWork())
+        parts.append((capture.work, time.perf_counter() - starttime))
+        if done:
+            return parts
+        starttime = time.perf_counter()
+
+def checkCapture(playfield, cells, opponent):
+    trail = drawLine(playfield, cells)
+    parts = runCapture(playfield, opponent, trail)
+    # The same as filling the whole board:
+    reference = pyqueex.Playfield()
+    drawLine(reference, cells)
+    reference.fillArea(opponent)
+    assert getCells(playfield) == getCells(reference)
+    assert playfield.counts == reference.counts
+    assert playfield.getCount("magenta") == 0
+    # The WallDistances have been kept up to date:
+    walldistances = playfield.walldistances
+    (right, down) = (walldistances.right, walldistances.down)
+    walldistances.rebuild()
+    assert right == walldistances.right
+    assert down == walldistances.down
+    return parts
+
+def test_staircase_capture_on_large_grid(gridsize):
+    gridsize(1600, 1000, 1)
+    checkCapture(pyqueex.Playfield(), getStaircase(300), (1200, 600))
+
+def test_small_capture_beside_opponent(gridsize):
+    gridsize(160, 100, 5)
+    # A box in the corner, and the Opponent right next to its line. It is
+    # done at once:
+    cells = [(20, y) for y in range(1, 10)] + [(x, 10) for x in range(20, 0, -1)]
+    parts = checkCapture(pyqueex.Playfield(), cells, (21, 5))
+    assert len(parts) == 1
+
+def test_half_capture_at_normal_size(gridsize):
+    gridsize(160, 100, 5)
+    # On the normal playfield, even half of the board is done at once:
+    cells = [(80, y) for y in range(1, 99)]
+    parts = checkCapture(pyqueex.Playfield(), cells, (120, 50))
+    assert len(parts) == 1
+
+def test_capture_budget_on_large_grid(gridsize):
+    gridsize(1600, 1000, 1)
+    # Half of the board, spread over several frames:
+    cells = [(800, y) for y in range(1, 999)]
+    parts = checkCapture(pyqueex.Playfield(), cells, (1200, 500))
+    assert len(parts) > 1
+    # Every part stays within the work of a frame. It may only go on for
+    # one more row, the first part also turns the line white:
+    row = 1 + pyqueex.SCREENSIZE_X // 8
+    assert parts[0][0] <= len(cells) + pyqueex.getCaptureWork() + row
+    for (work, seconds) in parts[1:]:
+        assert work <= pyqueex.getCaptureWork() + row
+    assert max(seconds for (work, seconds) in parts) < 1. / pyqueex.FPS
+
+def test_capture_goes_on_in_next_frames(gridsize):
+    gridsize(1600, 1000, 1)
+    simulation = pyqueex.Simulation(1)
+    simulation.reset()
+    simulation.state = "level"
+    playfield = simulation.playfield
+    trail = drawLine(playfield, [(400, y) for y in range(1, 999)])
+    opponent = simulation.opponent.getPosition()
+    playfield.fillArea(opponent, trail)
+    assert playfield.capture is not None
+    while playfield.capture is not None:
+        simulation.step({}, pyqueex.TICKLENGTH)
+    if opponent[0] > 400:
+        assert playfield.getCount("blue") == 399 * 998
+    else:
+        assert playfield.getCount("blue") == 1198 * 998
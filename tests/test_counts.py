@@ -0,0 +1,45 @@
+import pytest
+
+import pyqueex
+
+
+def checkCounts(playfield):
+    # The kept counts are the same as counting all cells again:
+    counts = list(playfield.counts)
+    playfield.countCells()
+    assert counts == playfield.counts
+
+def drawLine(playfield, cells):
+    trail = pyqueex.Trail()
+    line = pyqueex.Line()
+    line.setColor("magenta")
+    for (x, y) in cells:
+        line.setPosition(x, y)
+        playfield.insertIntoPlayfield(line)
+        trail.add(x, y)
+    return trail
+
+@pytest.mark.parametrize("backend", ("Playfield", "NumpyPlayfield", "BitboardPlayfield"))
+def test_counts_follow_every_change(gridsize, backend):
+    if backend == "NumpyPlayfield":
+        pytest.importorskip("numpy")
+        pyqueex.importNumpy()
+    gridsize(160, 100, 5)
+    playfield = getattr(pyqueex, backend)()
+    checkCounts(playfield)
+    # A line, that is erased again:
+    trail = drawLine(playfield, [(x, 50) for x in range(1, 100)])
+    checkCounts(playfield)
+    playfield.deleteMagentaInPlayfield(trail)
+    checkCounts(playfield)
+    # A line, that cuts off a corner:
+    trail = drawLine(playfield, [(40, y) for y in range(1, 30)] + [(x, 30) for x in range(40, 0, -1)])
+    checkCounts(playfield)
+    playfield.fillArea((100, 80), trail)
+    while playfield.capture is not None:
+        playfield.continueCapture()
+    checkCounts(playfield)
+    assert playfield.getCount("blue") == 39 * 29
+    # The whole board at once:
+    playfield.fillArea((100, 80))
+    checkCounts(playfield)
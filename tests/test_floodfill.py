@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+import pyqueex
+
+
+def floodfillCells(rows, coordinates, fromcolornr, tocolornr):
+    # The former flood-fill, that pushes the four neighbours of every cell:
+    tofill = [coordinates]
+    while tofill:
+        (x, y) = tofill.pop()
+        if rows[y][x] != fromcolornr:
+            continue
+        rows[y][x] = tocolornr
+        tofill.extend(((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)))
+
+@pytest.mark.parametrize("backend", ("Playfield", "NumpyPlayfield"))
+def test_scanline_fill_matches_the_cell_fill(backend):
+    if backend == "NumpyPlayfield":
+        pytest.importorskip("numpy")
+        pyqueex.importNumpy()
+    (black, white, grey) = (pyqueex.COLORNRS["black"], pyqueex.COLORNRS["white"], pyqueex.COLORNRS["grey"])
+    rnd = random.Random(2)
+    for density in (0.0, 0.2, 0.35, 0.45, 0.6):
+        for i in range(4):
+            playfield = getattr(pyqueex, backend)()
+            # Random walls inside the white frame:
+            rows = [[int(c) for c in row] for row in playfield.playfield]
+            for y in range(1, pyqueex.SCREENSIZE_Y - 1):
+                for x in range(1, pyqueex.SCREENSIZE_X - 1):
+                    if rnd.random() < density:
+                        rows[y][x] = white
+                        playfield.playfield[y][x] = white
+            start = (rnd.randrange(1, pyqueex.SCREENSIZE_X - 1), rnd.randrange(1, pyqueex.SCREENSIZE_Y - 1))
+            floodfillCells(rows, start, black, grey)
+            playfield.floodfillPlayfield(start, "black", "grey")
+            assert [[int(c) for c in row] for row in playfield.playfield] == rows
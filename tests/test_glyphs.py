@@ -0,0 +1,31 @@
+import pyqueex
+
+
+def test_glyphs_are_shared():
+    glyph = pyqueex.getGlyph("A", 2, "white")
+    assert glyph.get_size() == (16, 16)
+    assert pyqueex.getGlyph("A", 2, "white") is glyph
+    assert pyqueex.getGlyph("A", 2, "red") is not glyph
+    assert pyqueex.getGlyph("A", 3, "white").get_size() == (24, 24)
+    # The top row of "A" has pixels, the bottom row doesn't:
+    colors = [glyph.get_at((x, 0))[:3] for x in range(16)]
+    assert pyqueex.COLORS["white"] in colors
+    assert all(glyph.get_at((x, 15))[:3] == pyqueex.COLORS["black"] for x in range(16))
+
+
+def test_text_is_drawn_from_glyphs():
+    text = pyqueex.Text("AB", "yellow", 0, 0, 1)
+    scale = text.pixelscale
+    image = text.image
+    assert image.get_size() == (16 * scale, 8 * scale)
+    for i in range(2):
+        glyph = pyqueex.getGlyph("AB"[i], scale, "yellow")
+        for y in range(8 * scale):
+            for x in range(8 * scale):
+                assert image.get_at((i * 8 * scale + x, y)) == glyph.get_at((x, y))
+    # Drawn again only, when the text changes:
+    assert text.image is image
+    text.setText("BA")
+    assert text.changed
+    assert text.image is image
+    assert not text.changed
@@ -0,0 +1,27 @@
+import pyqueex
+
+
+def test_segments_follow_the_lines():
+    playfield = pyqueex.Playfield()
+    linegraph = playfield.linegraph
+    # The frame of the empty board is one closed segment:
+    frame = linegraph.getSegment(0, 0, "right")
+    assert len(frame) == 2 * 160 + 2 * 100 - 4
+    assert frame[-1][:2] == (0, 0)
+    assert linegraph.isValid((0, 0, "right"), frame)
+    # A line from the top to the bottom makes two junctions, and changes
+    # the segment:
+    for y in range(1, 99):
+        playfield.setColorNr(20, y, pyqueex.COLORNRS["white"])
+    assert not linegraph.isValid((0, 0, "right"), frame)
+    steps = linegraph.getSegment(0, 0, "right")
+    assert steps[-1] == (20, 0, "right")
+    assert sorted(linegraph.getWays(20, 0, "right")) == ["down", "right"]
+    steps = linegraph.getSegment(20, 0, "down")
+    assert len(steps) == 99
+    assert steps[-1] == (20, 99, "down")
+    # Magenta is a line too:
+    playfield.setColorNr(21, 10, pyqueex.COLORNRS["magenta"])
+    assert not linegraph.isValid((20, 0, "down"), steps)
+    assert linegraph.getSegment(20, 0, "down")[-1] == (20, 10, "down")
+    assert linegraph.getSegment(20, 10, "right") == [(21, 10, "right")]
@@ -0,0 +1,45 @@
+import pytest
+
+import pyqueex
+
+
+class FakeClock:
+    """ Stands in for time.perf_counter() and time.sleep(). Every call of
+        perf_counter() also lets a little time pass, like a real loop. """
+
+    def __init__(self):
+        self.now = 0.
+
+    def perf_counter(self):
+        self.now += 0.0001
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.mark.parametrize("fixedtimestep", (False, True))
+@pytest.mark.parametrize("simulationrate", (30, 120, 240))
+def test_steps_per_simulated_second(monkeypatch, fixedtimestep, simulationrate):
+    monkeypatch.setattr(pyqueex, "SOUND", False)
+    monkeypatch.setattr(pyqueex, "MULTIRATE", True)
+    monkeypatch.setattr(pyqueex, "FIXEDTIMESTEP", fixedtimestep)
+    monkeypatch.setattr(pyqueex, "SIMULATIONRATE", simulationrate)
+    monkeypatch.setattr(pyqueex, "RENDERRATE", 60)
+    clock = FakeClock()
+    monkeypatch.setattr(pyqueex.time, "perf_counter", clock.perf_counter)
+    monkeypatch.setattr(pyqueex.time, "sleep", clock.sleep)
+    game = pyqueex.Game()
+    steps = []
+    def step(actions, dt):
+        steps.append(dt)
+        # One simulated second:
+        if clock.now >= 1:
+            game.running = False
+    monkeypatch.setattr(game, "step", step)
+    try:
+        game.runMultiRate()
+    finally:
+        pyqueex.pygame.quit()
+    assert abs(len(steps) - simulationrate) <= 1
+    assert steps == [pytest.approx(1000 / simulationrate)] * len(steps)
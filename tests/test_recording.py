@@ -0,0 +1,59 @@
+import io
+import random
+
+import pyqueex
+
+
+def test_varint_round_trip():
+    numbers = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40 + 5]
+    fh = io.BytesIO()
+    for n in numbers:
+        pyqueex.writeVarint(fh, n)
+    assert len(fh.getvalue()) < 8 * len(numbers)
+    fh.seek(0)
+    assert [pyqueex.readVarint(fh) for n in numbers] == numbers
+    assert pyqueex.readVarint(fh) is None
+
+
+def test_recording_round_trip(tmp_path, gridsize):
+    gridsize(320, 200, 1)
+    random.seed(5)
+    names = pyqueex.Simulation.actionnames
+    frames = []
+    for i in range(500):
+        # Runs of equal frames, as the recorder writes them:
+        if not frames or random.random() < 0.2:
+            action = {name: random.random() < 0.3 for name in names}
+            clocktick = random.choice((16, 17, 33))
+        frames.append((action, clocktick))
+    filename = str(tmp_path / "run.pqx")
+    recorder = pyqueex.InputRecorder(filename, 12345, True)
+    for action, clocktick in frames:
+        recorder.write(action, clocktick)
+    recorder.close()
+    player = pyqueex.InputPlayer(filename)
+    assert player.seed == 12345
+    assert player.size == (320, 200)
+    assert player.fixedtimestep
+    assert [player.read() for frame in frames] == frames
+    assert player.read() is None
+    player.close()
+
+
+def test_replay_scales_the_window_to_the_recorded_size(tmp_path, gridsize):
+    # Recorded on the large board, replayed with the normal settings:
+    gridsize(pyqueex.LARGESIZE_X, pyqueex.LARGESIZE_Y, pyqueex.LARGESCALEFACTOR)
+    filename = str(tmp_path / "large.pqx")
+    recorder = pyqueex.InputRecorder(filename, 1, False)
+    recorder.write(dict.fromkeys(pyqueex.Simulation.actionnames, False), 17)
+    recorder.close()
+    gridsize(160, 100, 5)
+    game = pyqueex.Game(replayfilename = filename)
+    try:
+        assert (pyqueex.SCREENSIZE_X, pyqueex.SCREENSIZE_Y) == (pyqueex.LARGESIZE_X, pyqueex.LARGESIZE_Y)
+        assert pyqueex.SCALEFACTOR == pyqueex.LARGESCALEFACTOR
+        assert game.screen.get_size() == (pyqueex.LARGESIZE_X + 2 * pyqueex.BORDER_X,
+                                          pyqueex.LARGESIZE_Y + 2 * pyqueex.BORDER_Y)
+    finally:
+        game.inputplayer.close()
+        pyqueex.pygame.quit()
@@ -0,0 +1,105 @@
+import pyqueex
+
+
+def test_long_trail_on_large_grid(gridsize):
+    gridsize(1600, 1000, 1)
+    simulation = pyqueex.Simulation(1)
+    simulation.reset()
+    simulation.state = "level"
+    rewindbuffer = pyqueex.RewindBuffer(simulation, 1, 60)
+    rewindbuffer.save()
+    # A line back and forth over the board, longer than 32767 cells:
+    player = simulation.player
+    player.drawing = True
+    for y in range(2, 50, 2):
+        for x in range(1, 1599):
+            player.trail.add(x, y)
+    length = len(player.trail)
+    assert length > 32767
+    rewindbuffer.save()
+    player.trail.add(1, 51)
+    rewindbuffer.save()
+    assert rewindbuffer.rewind()
+    assert len(player.trail) == length
+
+
+class RewindedSimulation(pyqueex.Simulation):
+    """ Gives the changes of the playfield to the RewindBuffer, like Game. """
+
+    def playfieldChanged(self, whole = False):
+        regions = self.playfield.popDirtyRegions()
+        if whole:
+            self.rewindbuffer.playfieldReset()
+            return
+        for i in regions:
+            self.rewindbuffer.cellsChanged(i)
+
+    def lineDrawn(self, line):
+        self.rewindbuffer.cellsChanged((line.spos_x, line.spos_y, line.spos_x, line.spos_y))
+
+
+def getFrame(simulation):
+    playfield = simulation.playfield
+    cells = b"".join(bytes(playfield.getRow(0, pyqueex.SCREENSIZE_X - 1, y)) for y in range(pyqueex.SCREENSIZE_Y))
+    player = simulation.player
+    opponent = simulation.opponent
+    linerunners = [(i.spos_x, i.spos_y, i.floatcounter) for i in simulation.linerunners]
+    swarm = simulation.linerunners.swarm
+    if swarm is not None:
+        linerunners += zip(swarm.xs, swarm.ys, swarm.counters)
+    return (cells, simulation.state, player.spos_x, player.spos_y, player.lives, len(player.trail),
+            player.floatcounter, opponent.spos_x, opponent.spos_y, opponent.floatcounter, linerunners)
+
+
+def test_rewind_restores_the_frames(gridsize):
+    gridsize(80, 50, 1)
+    simulation = RewindedSimulation(7)
+    simulation.rewindbuffer = pyqueex.RewindBuffer(simulation, 100, 60)
+    simulation.reset()
+    rewindbuffer = simulation.rewindbuffer
+    # After "getready", two areas are captured from the bottom border:
+    path = [("fire", 180), ("up", 20), ("right", 15), ("down", 25), ("left", 30), ("up", 10), ("left", 20), ("down", 15)]
+    # The frames of the snapshots in the buffer:
+    frames = []
+    percentages = set()
+    for (direction, count) in path:
+        for i in range(count):
+            simulation.step({direction : True, "fire" : True}, pyqueex.TICKLENGTH)
+            saved = len(rewindbuffer.snapshots)
+            rewindbuffer.save()
+            if len(rewindbuffer.snapshots) == saved + 1:
+                frames.append(getFrame(simulation))
+                percentages.add(simulation.playfield.getFilledPercentage())
+            elif len(rewindbuffer.snapshots) < saved:
+                frames = [getFrame(simulation)] * len(rewindbuffer.snapshots)
+    assert len(percentages) == 3
+    # Going back frame by frame gives the same playfields and sprites,
+    # also before the captures:
+    while rewindbuffer.rewind():
+        frames.pop()
+        assert getFrame(simulation) == frames[-1]
+    assert len(frames) == 1
+    assert simulation.playfield.getFilledPercentage() == min(percentages)
+
+
+def test_rewind_restores_the_swarm(gridsize, monkeypatch):
+    gridsize(80, 50, 1)
+    monkeypatch.setattr(pyqueex, "LINERUNNERSWARM", 30)
+    simulation = RewindedSimulation(3)
+    simulation.rewindbuffer = pyqueex.RewindBuffer(simulation, 100, 60)
+    simulation.reset()
+    rewindbuffer = simulation.rewindbuffer
+    frames = []
+    for i in range(400):
+        simulation.step({}, pyqueex.TICKLENGTH)
+        rewindbuffer.save()
+        if len(rewindbuffer.snapshots) > len(frames):
+            frames.append(getFrame(simulation))
+    assert len(frames) == len(rewindbuffer.snapshots)
+    assert sum(1 for frame in frames if frame[1] == "level") > 50
+    # The float counters come back exactly, or the LineRunners would walk
+    # on differently after going back:
+    for frame in reversed(frames[:-1]):
+        assert rewindbuffer.rewind()
+        assert getFrame(simulation) == frame
+    assert not rewindbuffer.rewind()
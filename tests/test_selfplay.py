@@ -0,0 +1,48 @@
+import argparse
+import queue
+
+import pytest
+
+import pyqueex
+import selfplay
+
+
+def test_settings_are_parsed():
+    assert selfplay.parseSetting("OPPONENTSPEED=0.05") == ("OPPONENTSPEED", 0.05)
+    assert selfplay.parseSetting("PLAYFIELDBACKEND=list") == ("PLAYFIELDBACKEND", "list")
+    for text in ("NOSUCHSETTING=1", "time=1"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            selfplay.parseSetting(text)
+    assert selfplay.getBot("boxes") is selfplay.BoxBot
+    assert selfplay.getBot("selfplay:RandomBot") is selfplay.RandomBot
+
+
+def playGames(monkeypatch, job):
+    # A worker, in this process:
+    (workernr, frames, botname, seed, settings) = job
+    for (name, value) in settings:
+        monkeypatch.setattr(pyqueex, name, getattr(pyqueex, name))
+    outqueue = queue.Queue()
+    monkeypatch.setattr(selfplay, "OUTQUEUE", outqueue)
+    selfplay.playGames(job)
+    messages = []
+    while not outqueue.empty():
+        messages.append(outqueue.get())
+    return messages
+
+
+def test_worker_sends_the_levels(monkeypatch):
+    job = (3, 6000, "boxes", 5, [("WINNINGPERCENTAGE", 20)])
+    messages = playGames(monkeypatch, job)
+    done = messages.pop()
+    assert done["done"] and done["worker"] == 3 and done["frames"] == 6000
+    assert messages
+    for level in messages:
+        assert level["result"] in ("cleared", "lost")
+        assert all(size > 0 for size in level["captures"])
+        if level["result"] == "cleared":
+            assert level["filled"] >= 20
+            assert level["frames"] > 0
+    assert "cleared" in [i["result"] for i in messages]
+    # The same seed plays the same games:
+    assert playGames(monkeypatch, job)[:-1] == messages
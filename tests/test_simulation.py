@@ -0,0 +1,50 @@
+import random
+
+import pygame
+
+import pyqueex
+
+
+def play(simulation, path):
+    for (direction, count) in path:
+        for i in range(count):
+            simulation.step({direction : True, "fire" : True}, pyqueex.TICKLENGTH)
+
+def getState(simulation):
+    return ([list(row) for row in simulation.playfield.playfield], simulation.state, simulation.level,
+            simulation.player.lives, simulation.player.getPosition(), simulation.opponent.getPosition(),
+            sorted(l.getPosition() for l in simulation.linerunners))
+
+
+def test_simulation_plays_without_a_window():
+    simulation = pyqueex.Simulation(1)
+    simulation.reset()
+    play(simulation, [("fire", 180)])
+    assert simulation.state == "level"
+    filled = simulation.playfield.getFilledPercentage()
+    # A line from the bottom border back to it:
+    play(simulation, [("up", 30), ("right", 30), ("down", 40)])
+    assert simulation.player.lives == pyqueex.PLAYERLIVES
+    assert simulation.playfield.getFilledPercentage() > filled
+    assert pygame.display.get_surface() is None
+
+
+def test_same_seed_and_actions_give_the_same_game():
+    inputs = random.Random(3)
+    frames = []
+    for i in range(1500):
+        if not frames or inputs.random() < 0.05:
+            actions = {inputs.choice(("left", "right", "up", "down")) : True, "fire" : inputs.random() < 0.8}
+        # Frames of uneven length, as on a busy computer:
+        frames.append((actions, inputs.choice((8, 17, 17, 17, 40))))
+    states = []
+    for run in range(2):
+        simulation = pyqueex.Simulation(42)
+        simulation.reset()
+        states.append([])
+        for (actions, elapsed) in frames:
+            simulation.advance(actions, elapsed)
+            states[-1].append(getState(simulation))
+    assert states[0] == states[1]
+    # Something has happened on the playfield:
+    assert any(state[0] != states[0][0][0] for state in states[0])
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pygame
+import pytest
+
+import pyqueex
+
+
+SOUNDDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sounds")
+
+
+@pytest.fixture
+def sounddir(tmp_path):
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        pytest.skip("No mixer: " + str(e))
+    shutil.copy(os.path.join(SOUNDDIR, "wall.mp3"), str(tmp_path))
+    yield str(tmp_path)
+    pygame.mixer.quit()
+
+def loadSounds(sounddir):
+    loader = pyqueex.SoundLoader(sounddir)
+    loader.thread.join()
+    return loader.sounds
+
+
+def test_sounds_are_decoded_and_cached(sounddir):
+    sounds = loadSounds(sounddir)
+    # The other sounds are missing in the directory:
+    assert list(sounds) == ["wall"]
+    cachename = os.path.join(sounddir, "cache", "wall.pcm")
+    with open(cachename, "rb") as fh:
+        assert fh.read().endswith(sounds["wall"].get_raw())
+    assert os.listdir(os.path.join(sounddir, "cache")) == ["wall.pcm"]
+
+
+def test_cache_is_used_only_while_it_matches(sounddir):
+    raw = loadSounds(sounddir)["wall"].get_raw()
+    # Other samples in the cache are taken, as long as the header matches:
+    cachename = os.path.join(sounddir, "cache", "wall.pcm")
+    with open(cachename, "rb") as fh:
+        header = fh.read(os.path.getsize(cachename) - len(raw))
+    with open(cachename, "wb") as fh:
+        fh.write(header + bytes(64))
+    assert loadSounds(sounddir)["wall"].get_raw() == bytes(64)
+    # A changed MP3-file is decoded again, and the cache is rewritten:
+    mp3name = os.path.join(sounddir, "wall.mp3")
+    stat = os.stat(mp3name)
+    os.utime(mp3name, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert loadSounds(sounddir)["wall"].get_raw() == raw
+    assert os.path.getsize(cachename) == len(header) + len(raw)
@@ -0,0 +1,37 @@
+import random
+
+import pygame
+
+import pyqueex
+
+
+def getCollisions(rects, rect):
+    return sorted(key for key in rects if rects[key].colliderect(rect))
+
+
+def test_queries_are_the_same_as_all_rects():
+    random.seed(3)
+    spatialhash = pyqueex.SpatialHash(40)
+    rects = {}
+    for key in range(50):
+        rects[key] = pygame.Rect(random.randrange(800), random.randrange(500),
+                                 random.randint(1, 40), random.randint(1, 40))
+        spatialhash.move(key, rects[key])
+    for i in range(500):
+        # The rects are moved in place, as the sprites do it:
+        keys = random.sample(sorted(rects), 10)
+        for key in keys:
+            rects[key].move_ip(random.randint(-30, 30), random.randint(-30, 30))
+        spatialhash.moveAll(keys, [rects[key] for key in keys])
+        if i % 50 == 0:
+            key = random.choice(sorted(rects))
+            spatialhash.remove(key)
+            del rects[key]
+        rect = pygame.Rect(random.randrange(-20, 800), random.randrange(-20, 500),
+                           random.randint(1, 40), random.randint(1, 40))
+        assert sorted(spatialhash.query(rect)) == getCollisions(rects, rect)
+    # Empty buckets aren't kept:
+    for key in list(rects):
+        spatialhash.remove(key)
+    assert spatialhash.buckets == {}
+    assert spatialhash.query(pygame.Rect(0, 0, 800, 500)) == []
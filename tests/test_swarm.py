@@ -0,0 +1,49 @@
+import random
+
+import pyqueex
+
+
+def addLineRunners(simulation, count):
+    # Like Simulation.addLineRunner(), with the starting points in turn:
+    linerunners = simulation.linerunners
+    for i in range(len(linerunners), count):
+        (initside, initdirection) = linerunners.lrdata[i % len(linerunners.lrdata)]
+        l = pyqueex.LineRunner(simulation, initside, initdirection)
+        linerunners.add(l)
+        for state in ("level", "getready", "playerexplosion"):
+            simulation.spritegroups[state].add(l)
+    linerunners.initPositions()
+
+def getRunners(simulation):
+    swarm = simulation.linerunners.swarm
+    if swarm is not None:
+        return [(swarm.xs[i], swarm.ys[i], tuple(swarm.rects[i])) for i in range(swarm.count)]
+    return [(l.spos_x, l.spos_y, tuple(l.rect)) for l in simulation.linerunners]
+
+
+def test_swarm_walks_like_the_linerunners(monkeypatch):
+    count = 50
+    inputs = random.Random(1)
+    frames = []
+    for i in range(1500):
+        if not frames or inputs.random() < 0.05:
+            frames.append({inputs.choice(("left", "right", "up", "down")) : True, "fire" : inputs.random() < 0.8})
+        else:
+            frames.append(frames[-1])
+    runs = []
+    for swarmsize in (0, count):
+        monkeypatch.setattr(pyqueex, "LINERUNNERSWARM", swarmsize)
+        simulation = pyqueex.Simulation(9)
+        simulation.reset()
+        if not swarmsize:
+            addLineRunners(simulation, count)
+        runs.append([])
+        for actions in frames:
+            simulation.step(actions, pyqueex.TICKLENGTH)
+            player = simulation.player
+            runs[-1].append((simulation.state, player.lives, player.getPosition(), getRunners(simulation),
+                             bool(simulation.spatialhash.query(player.rect))))
+    assert len(runs[1][0][3]) == count
+    assert runs[0] == runs[1]
+    # The LineRunners have caught the Player:
+    assert any(frame[4] for frame in runs[0])
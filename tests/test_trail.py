@@ -0,0 +1,60 @@
+import random
+
+import pyqueex
+
+
+def test_trail_spans_and_queries():
+    trail = pyqueex.Trail()
+    r = random.Random(5)
+    cells = set()
+    for i in range(300):
+        (x, y) = (r.randrange(40), r.randrange(10))
+        trail.add(x, y)
+        cells.add((x, y))
+    # Cells, that were already there, aren't added twice:
+    assert len(trail) == len(cells)
+    assert set(trail.cells) == cells
+    # The spans of every row are sorted and don't touch each other:
+    for y in trail.rows:
+        (starts, ends) = trail.rows[y]
+        assert starts == sorted(starts)
+        for i in range(len(starts)):
+            assert starts[i] <= ends[i]
+            if i > 0:
+                assert starts[i] > ends[i - 1] + 1
+    for x in range(-1, 41):
+        for y in range(-1, 11):
+            assert trail.contains(x, y) == ((x, y) in cells)
+    for i in range(500):
+        (x, y, width, height) = (r.randrange(-5, 40), r.randrange(-5, 10), r.randrange(1, 8), r.randrange(1, 5))
+        inside = any((cx, cy) in cells for cx in range(x, x + width) for cy in range(y, y + height))
+        assert trail.intersectsRect(x, y, width, height) == inside
+
+def test_trail_is_erased_from_the_playfield():
+    trail = pyqueex.Trail()
+    playfield = pyqueex.Playfield()
+    # Down, right and up again:
+    cells = [(5, y) for y in range(1, 20)] + [(x, 19) for x in range(6, 30)] + [(29, y) for y in range(18, 0, -1)]
+    for (x, y) in cells:
+        trail.add(x, y)
+        playfield.setColorNr(x, y, pyqueex.COLORNRS["magenta"])
+    assert trail.getBoundingBox() == (5, 1, 29, 19)
+    playfield.deleteMagentaInPlayfield(trail)
+    assert playfield.getCount("magenta") == 0
+    assert all(playfield.getColorNr(x, y) == pyqueex.COLORNRS["black"] for (x, y) in cells)
+    trail.clear()
+    assert len(trail) == 0
+    assert not trail.intersectsRect(0, 0, 40, 40)
+
+def test_trail_regions_cover_the_line():
+    trail = pyqueex.Trail()
+    # Down, right and up again:
+    cells = [(5, y) for y in range(20)] + [(x, 19) for x in range(6, 30)] + [(29, y) for y in range(18, 0, -1)]
+    for (x, y) in cells:
+        trail.add(x, y)
+    covered = set()
+    for (x0, y0, x1, y1) in trail.getRegions():
+        covered |= set((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    assert covered == set(cells)
+    # The vertical parts are one region each:
+    assert len(trail.getRegions()) == 3
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+import pyqueex
+
+numpy = pytest.importorskip("numpy")
+
+
+def getCells(playfield):
+    return numpy.array([[playfield.getColorNr(x, y) for x in range(pyqueex.SCREENSIZE_X)]
+                        for y in range(pyqueex.SCREENSIZE_Y)], dtype = numpy.uint8)
+
+
+def test_observations_are_the_playfields(gridsize):
+    gridsize(80, 50, 1)
+    random.seed(8)
+    vector = pyqueex.VectorSimulation(3, seed = 100)
+    observations = vector.reset()
+    assert observations.shape == (3, 50, 80)
+    assert observations.dtype == numpy.uint8
+    gained = 0
+    actions = [random.randrange(len(vector.actions)) for i in range(3)]
+    for step in range(600):
+        # The Players go on in one direction for a while, holding "fire":
+        for i in range(3):
+            if random.random() < 0.1:
+                actions[i] = random.randrange(len(vector.actions))
+        percentages = list(vector.percentages)
+        (result, rewards, dones) = vector.step([dict(vector.actions[a], fire = True) for a in actions])
+        assert result is observations
+        gained += rewards.sum()
+        for i in range(3):
+            simulation = vector.simulations[i]
+            assert vector.percentages[i] == simulation.playfield.getFilledPercentage()
+            if not dones[i] and vector.levels[i] == simulation.level:
+                assert rewards[i] == pytest.approx(max(0, vector.percentages[i] - percentages[i]))
+        if step % 50 == 0:
+            for i in range(3):
+                assert numpy.array_equal(observations[i], getCells(vector.simulations[i].playfield))
+    # Some areas were filled:
+    assert gained > 0
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+import pyqueex
+
+
+def checkDistances(playfield):
+    # Kept up to date, the distances are the same as calculated anew:
+    walldistances = playfield.walldistances
+    (right, down) = (walldistances.right, walldistances.down)
+    walldistances.rebuild()
+    assert right == walldistances.right
+    assert down == walldistances.down
+
+@pytest.mark.parametrize("backend", ("Playfield", "NumpyPlayfield"))
+def test_incremental_distances_are_the_same_as_rebuilt(backend):
+    if backend == "NumpyPlayfield":
+        pytest.importorskip("numpy")
+        pyqueex.importNumpy()
+    playfield = getattr(pyqueex, backend)()
+    # The empty board:
+    checkDistances(playfield)
+    r = random.Random(7)
+    colornrs = [pyqueex.COLORNRS[i] for i in ("black", "white", "blue", "magenta")]
+    for i in range(300):
+        (x, y) = (r.randrange(pyqueex.SCREENSIZE_X), r.randrange(pyqueex.SCREENSIZE_Y))
+        playfield.setColorNr(x, y, r.choice(colornrs))
+        if i % 30 == 0:
+            checkDistances(playfield)
+    playfield.deleteMagentaInPlayfield()
+    checkDistances(playfield)
+    playfield.fillArea((80, 50))
+    checkDistances(playfield)
+
+def test_opponent_queries():
+    playfield = pyqueex.Playfield()
+    walldistances = playfield.walldistances
+    assert walldistances.isRowFree(1, 5, 158)
+    assert not walldistances.isRowFree(1, 5, 159)
+    assert walldistances.isColumnFree(10, 1, 98)
+    playfield.setColorNr(10, 50, pyqueex.COLORNRS["blue"])
+    assert not walldistances.isColumnFree(10, 1, 98)
+    assert walldistances.isColumnFree(10, 51, 48)
+    assert walldistances.isRowFree(11, 50, 148)
+    assert not walldistances.isRowFree(9, 50, 2)